@@ -0,0 +1,302 @@
+"""基准测试：在离线替身模型上跑整局和单个阶段。
+
+统计每个阶段的墙钟耗时、模型调用次数、QueuedChatCompletionClient 内的排队等待和每次调用的 token，
+结果写成 JSON，方便和上一次的结果比对：
+
+    python bench.py --games 3 --repeat 5 --out bench_results.json
+    python bench.py --baseline bench_results.json --out bench_new.json
+
+带 --baseline 时，调用次数、token 或耗时超过容差即以非 0 退出码结束。
+另外用同一批种子分别在工具 schema 的 off / enum / branches 三种约束下跑整局，
+对比 rules 拒绝的非法行动数，看 schema 端的约束挡掉了多少次无效调用。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# 确保导入本地模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ["wolf", "ida", "laura", "mary", "day_debate", "vote"]
+
+
+def _silent(_: str = "") -> None:
+    pass
+
+
+def _p95(values):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+class CallRecorder:
+    """挂在 QueuedChatCompletionClient 上收集每次调用的记录。"""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record: dict):
+        self.records.append(record)
+
+    def summarize(self, records=None) -> dict:
+        records = self.records if records is None else records
+        if not records:
+            return {"calls": 0}
+        waits = [r["queue_wait"] for r in records]
+        latencies = [r["latency"] for r in records]
+        return {
+            "calls": len(records),
+            "attempts": sum(r["attempts"] for r in records),
+            "failed": sum(1 for r in records if not r["ok"]),
+            "rate_limited": sum(r["rate_limited"] for r in records),
+            "queue_wait_total": round(sum(waits), 4),
+            "queue_wait_p95": round(_p95(waits), 4),
+            "latency_mean": round(statistics.fmean(latencies), 4),
+            "latency_p95": round(_p95(latencies), 4),
+            "prompt_tokens_per_call": round(statistics.fmean(r["prompt_tokens"] for r in records), 1),
+            "cached_prompt_tokens_per_call": round(statistics.fmean(r["cached_prompt_tokens"] for r in records), 1),
+            "completion_tokens_per_call": round(statistics.fmean(r["completion_tokens"] for r in records), 1),
+        }
+
+    def by_phase(self) -> dict:
+        groups = {}
+        for record in self.records:
+            groups.setdefault(record["tags"].get("phase", "untagged"), []).append(record)
+        return {phase: self.summarize(records) for phase, records in sorted(groups.items())}
+
+
+def _build_table(seed: int, role_name: str | None = None):
+    import main
+
+    while True:
+        table = main.build_table(my_no=None, rng=random.Random(seed), announce=_silent)
+        if role_name is None or role_name in table["role_to_player"]:
+            return table
+        seed += 1000
+
+
+async def bench_full_games(games: int, seed: int, parallel: int, recorder: CallRecorder) -> dict:
+    import main
+
+    durations = []
+    semaphore = asyncio.Semaphore(max(1, parallel))
+
+    async def _one(game_seed: int):
+        async with semaphore:
+            table = _build_table(game_seed)
+            started = time.perf_counter()
+            await main.play_game(table)
+            durations.append(time.perf_counter() - started)
+
+    recorder.records.clear()
+    started = time.perf_counter()
+    await asyncio.gather(*(_one(seed + i) for i in range(games)))
+    return {
+        "games": games,
+        "wall_seconds": round(time.perf_counter() - started, 4),
+        "game_seconds_mean": round(statistics.fmean(durations), 4),
+        "calls_per_game": round(len(recorder.records) / games, 2),
+        "overall": recorder.summarize(),
+        "phases": recorder.by_phase(),
+    }
+
+
+async def bench_phase(phase: str, repeat: int, seed: int, recorder: CallRecorder) -> dict:
+    import main
+    import rules
+    from config import tag_calls
+
+    runners = {
+        "wolf": (None, main.run_wolf_phase),
+        "ida": ("Ida", main.run_ida_phase),
+        "laura": ("Laura", main.run_laura_phase),
+        "mary": ("Mary", main.run_mary_phase),
+        "day_debate": (None, main.run_day_debate),
+        "vote": (None, main.collect_ballots),
+    }
+    role_name, run = runners[phase]
+    durations = []
+    recorder.records.clear()
+    for i in range(repeat):
+        table = _build_table(seed + i, role_name)
+        state = table["state"]
+        rules.start_night(state)
+        if phase == "laura":
+            # 女巫阶段依赖狼人的结果，这里直接给出一个合法的献祭目标
+            _, light_alive = rules.victory_state(state)
+            rules.set_night_kill(state, light_alive[0])
+        if phase in ("day_debate", "vote"):
+            rules.start_day(state)
+        tag_calls(phase=phase)
+        started = time.perf_counter()
+        await run(table)
+        durations.append(time.perf_counter() - started)
+    return {
+        "repeat": repeat,
+        "wall_seconds_mean": round(statistics.fmean(durations), 4),
+        "wall_seconds_p95": round(_p95(durations), 4),
+        "calls_per_run": round(len(recorder.records) / repeat, 2),
+        "overall": recorder.summarize(),
+    }
+
+
+async def bench_rejections(games: int, seed: int) -> dict:
+    """同一批种子在每种工具 schema 约束下各跑 games 局，统计被规则拒绝的行动次数。"""
+    import main
+    import regis
+
+    previous = regis.schema_mode()
+    result = {}
+    try:
+        for mode in regis.SCHEMA_MODES:
+            regis.set_schema_mode(mode)
+            by_action = {}
+            for i in range(games):
+                table = _build_table(seed + i)
+                await main.play_game(table)
+                for action, count in table["state"].rejections.items():
+                    by_action[action] = by_action.get(action, 0) + count
+            result[mode] = {"rejections": sum(by_action.values()), "by_action": dict(sorted(by_action.items()))}
+    finally:
+        regis.set_schema_mode(previous)
+    result["avoided_by_enum"] = result["off"]["rejections"] - result["enum"]["rejections"]
+    result["avoided_by_branches"] = result["enum"]["rejections"] - result["branches"]["rejections"]
+    return {"games": games, **result}
+
+
+def bench_rules(iterations: int, seed: int) -> dict:
+    """resolve_night / resolve_day 的纯 Python 开销，单位微秒。"""
+    import rules
+
+    rng = random.Random(seed)
+    seats = [f"P{i}" for i in range(1, 7)]
+
+    def _state():
+        teams = dict(zip(seats, rng.sample(["dark", "dark", "light", "light", "light", "light"], 6)))
+        state = rules.GameState(alive_players=seats, player_teams=teams)
+        rules.start_night(state)
+        rules.set_night_kill(state, rng.choice([s for s in seats if teams[s] == "light"]))
+        rules.set_poison_target(state, rng.choice(seats))
+        rules.set_cursed_player(state, rng.choice(seats))
+        for voter in seats:
+            rules.record_vote(state, voter, rng.choice(seats))
+        return state
+
+    states = [_state() for _ in range(iterations)]
+    started = time.perf_counter()
+    for state in states:
+        rules.resolve_night(state)
+    night = time.perf_counter() - started
+    for state in states:
+        state.votes = {v: t for v, t in state.votes.items() if rules.is_alive(state, v) and rules.is_alive(state, t)}
+    started = time.perf_counter()
+    for state in states:
+        rules.resolve_day(state)
+    day = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "resolve_night_us": round(night / iterations * 1e6, 3),
+        "resolve_day_us": round(day / iterations * 1e6, 3),
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float, time_tolerance: float):
+    """返回超出容差的回归项列表。调用次数和 token 是确定的，耗时有抖动，两者分开给容差。"""
+    regressions = []
+
+    def _check(name, key, now, before):
+        limit = time_tolerance if "seconds" in key else tolerance
+        if before and now > before * (1 + limit):
+            regressions.append(f"{name}.{key}: {before} -> {now}")
+
+    for name, result in current["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous:
+            continue
+        for key in ("calls_per_game", "calls_per_run", "game_seconds_mean", "wall_seconds_mean"):
+            if key in result and key in previous:
+                _check(name, key, result[key], previous[key])
+        for key in ("prompt_tokens_per_call",):
+            if key in result.get("overall", {}) and key in previous.get("overall", {}):
+                _check(name, key, result["overall"][key], previous["overall"][key])
+    return regressions
+
+
+async def run_benchmarks(args) -> dict:
+    from config import model_client
+
+    recorder = CallRecorder()
+    model_client.add_listener(recorder)
+    benchmarks = {}
+    try:
+        if args.games:
+            benchmarks["full_game"] = await bench_full_games(args.games, args.seed, args.parallel, recorder)
+        for phase in PHASES:
+            benchmarks[f"phase_{phase}"] = await bench_phase(phase, args.repeat, args.seed, recorder)
+        if args.rejection_games:
+            benchmarks["rejections"] = await bench_rejections(args.rejection_games, args.seed)
+    finally:
+        model_client.remove_listener(recorder)
+        await model_client.close()
+    benchmarks["rules"] = bench_rules(args.rule_iterations, args.seed)
+    return benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="锈湖狼人杀基准测试（离线替身模型）")
+    parser.add_argument("--games", type=int, default=3, help="整局基准的对局数，0 表示跳过")
+    parser.add_argument("--parallel", type=int, default=1, help="整局基准同时进行的对局数")
+    parser.add_argument("--repeat", type=int, default=5, help="单阶段基准的重复次数")
+    parser.add_argument("--rejection-games", type=int, default=3, help="每种工具 schema 约束下统计拒绝次数的对局数，0 表示跳过")
+    parser.add_argument("--rule-iterations", type=int, default=20000, help="规则结算基准的迭代次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", default="fixed:0.01", help="替身模型的延迟分布，格式见 mock_client.parse_latency")
+    parser.add_argument("--concurrency", type=int, default=1, help="LLM_MAX_CONCURRENCY")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="用来比对的历史结果文件")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="调用次数和 token 允许的相对增长")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="耗时允许的相对增长")
+    args = parser.parse_args(argv)
+
+    # 必须在导入 config 之前设置：基准只跑离线替身模型
+    os.environ["LLM_MOCK"] = "1"
+    os.environ["LLM_MOCK_SEED"] = str(args.seed)
+    os.environ["LLM_MOCK_LATENCY"] = args.latency
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.concurrency)
+
+    started = time.perf_counter()
+    benchmarks = asyncio.run(run_benchmarks(args))
+    result = {
+        "meta": {
+            "seed": args.seed,
+            "latency": args.latency,
+            "concurrency": args.concurrency,
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+        },
+        "benchmarks": benchmarks,
+    }
+    with open(args.out, "w", encoding="utf-8") as out:
+        json.dump(result, out, ensure_ascii=False, indent=2)
+    print(f"📈 基准结果已写入 {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance, args.time_tolerance)
+        if regressions:
+            print("⚠️ 发现回归：")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("✅ 与基线相比没有回归。")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""模型响应的录制与回放。
+
+每次 create / create_stream 的请求按消息、工具和参数的规范化 JSON 取哈希作为键，
+同一键在一次运行里第 n 次出现时对应第 n 条录制，保证重复请求也能按原顺序回放。
+
+存储分两层：内存里一个 LRU，磁盘上每条响应一个 JSON 文件；磁盘总大小超过上限时
+按最近访问时间淘汰最旧的文件。
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from autogen_core.models import CreateResult
+
+
+class CassetteMissError(LookupError):
+    """回放模式下找不到对应的录制。"""
+
+
+def _canonical(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "schema") and isinstance(getattr(value, "schema"), dict):
+        return value.schema
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def request_key(messages, tools=(), **params) -> str:
+    """消息、工具 schema 与其余参数的规范化哈希。cancellation_token 不参与。"""
+    params.pop("cancellation_token", None)
+    payload = {
+        "messages": _canonical(list(messages)),
+        "tools": _canonical(list(tools)),
+        "params": _canonical(params),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResponseCassette:
+    """按请求键存取 CreateResult 的两级缓存。"""
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024, memory_items: int = 256):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._memory_items = max(0, memory_items)
+        self._memory = OrderedDict()
+        self._occurrences = {}
+        self._index = {}
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                self._index[path] = stat.st_size
+                self._total_bytes += stat.st_size
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def next_key(self, base_key: str) -> str:
+        """返回本次运行中该请求第 n 次出现时的键。"""
+        occurrence = self._occurrences.get(base_key, 0)
+        self._occurrences[base_key] = occurrence + 1
+        return f"{base_key}-{occurrence}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.json")
+
+    def _remember(self, key: str, result: CreateResult):
+        if not self._memory_items:
+            return
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        path = self._path(key)
+        if path not in self._index:
+            return None
+        with open(path, encoding="utf-8") as f:
+            result = CreateResult.model_validate(json.load(f)["result"])
+        os.utime(path)
+        self._remember(key, result)
+        return result
+
+    def get(self, key: str):
+        """按键读取；第 n 次出现没有录制时退回第一次出现的录制。"""
+        result = self._load(key)
+        if result is None and not key.endswith("-0"):
+            result = self._load(key.rsplit("-", 1)[0] + "-0")
+        self.stats["hits" if result is not None else "misses"] += 1
+        return result
+
+    def put(self, key: str, result: CreateResult, tags=None):
+        path = self._path(key)
+        payload = {"key": key, "recorded_at": time.time(), "tags": tags or {}, "result": result.model_dump(mode="json")}
+        raw = json.dumps(payload, ensure_ascii=False).encode()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+        self._total_bytes += len(raw) - self._index.get(path, 0)
+        self._index[path] = len(raw)
+        self._remember(key, result)
+        self.stats["writes"] += 1
+        self._evict()
+
+    def _evict(self):
+        if self._total_bytes <= self._max_bytes:
+            return
+        by_age = sorted(self._index, key=lambda path: os.stat(path).st_mtime)
+        for path in by_age:
+            if self._total_bytes <= self._max_bytes:
+                break
+            size = self._index.pop(path)
+            self._total_bytes -= size
+            key = os.path.basename(path)[:-len(".json")]
+            self._memory.pop(key, None)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.stats["evictions"] += 1
@@ -0,0 +1,86 @@
+"""对局的事件日志与断点续跑。
+
+EventLog 挂在 GameState.listeners 上，把每次状态转移（发身份、献祭、查验、用药、诅咒、投票、结算）
+追加写进 JSONL。文件一直开着，每行写完只 flush 到操作系统，进程崩溃不丢事件；
+fsync 留到阶段边界和快照一起做，放在线程里，不让并发的夜晚阶段和同进程的其他对局等磁盘。
+掉电时最多丢掉最后一个阶段的事件，与快照的粒度一致。
+
+每个阶段结束时把 GameState、历史、事件流游标和各 AI 座位的模型上下文整体写进 checkpoint.json，
+先写临时文件再 os.replace，任何时刻磁盘上都是一份完整的快照。
+python main.py --resume <目录> 读回快照，从最后一个完成的阶段之后继续。
+"""
+import json
+import os
+import time
+
+EVENT_LOG_NAME = "events.jsonl"
+CHECKPOINT_NAME = "checkpoint.json"
+
+# 需要随快照保存的 GameState 字段
+STATE_FIELDS = (
+    "kill",
+    "protected",
+    "poisoned",
+    "cursed",
+    "laura_used_heal",
+    "laura_used_poison",
+    "how_died",
+    "player_teams",
+    "alive_players",
+    "votes",
+    "inspections",
+    "rejections",
+)
+
+
+class EventLog:
+    """只追加的 JSONL 事件日志。作为 rules 的监听者时，每次状态转移写一行。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def append(self, kind: str, **data):
+        line = json.dumps({"t": round(time.time(), 3), "kind": kind, **data}, ensure_ascii=False)
+        self._file.write(line + "\n")
+        self._file.flush()
+
+    def sync(self):
+        """把已经写出的事件落盘。只做 fsync，可以交给 asyncio.to_thread。"""
+        if not self._file.closed:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __call__(self, kind: str, data: dict):
+        self.append(kind, **data)
+
+
+def snapshot_state(state) -> dict:
+    return {field: getattr(state, field) for field in STATE_FIELDS}
+
+
+def restore_state(state, snapshot: dict):
+    for field in STATE_FIELDS:
+        setattr(state, field, snapshot[field])
+    # JSON 把元组存成了列表
+    state.inspections = [tuple(item) for item in state.inspections]
+
+
+def save_checkpoint(path: str, snapshot: dict):
+    raw = json.dumps(snapshot, ensure_ascii=False)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
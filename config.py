@@ -1,10 +1,21 @@
 import os
+import time
 import asyncio
+import contextvars
 from dotenv import load_dotenv
 import openai
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 from autogen_core.models import ModelInfo
 
+from cassette import CassetteMissError, ResponseCassette, request_key
+from prefix_cache import PrefixCacheEstimator, estimate_tokens, request_text
+from endpoints import CircuitBreaker, Endpoint, load_endpoint_specs, pick_endpoint
+from ratelimit import AdaptiveRateLimiter
+import regis
+from roles import LIGHT_ROLES, WOLF_ROLE
+from routing import DEFAULT_CLIENT, ModelRouter, load_model_specs, load_routes
+from telemetry import JsonlExporter, PrometheusMetrics
+
 load_dotenv()
 
 System_Prompt= """
@@ -80,74 +91,452 @@ model_id = os.getenv("LLM_MODEL_ID")
 max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "1"))
 max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
 retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "2"))
+# 限流预算：每分钟请求数 / token 数，0 表示不限；遇到 429 时并发最低降到 LLM_MIN_CONCURRENCY
+requests_per_minute = float(os.getenv("LLM_RPM", "0"))
+tokens_per_minute = float(os.getenv("LLM_TPM", "0"))
+min_concurrency = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+retry_jitter = float(os.getenv("LLM_RETRY_JITTER", "0.2"))
+# 端点熔断：连续失败多少次后摘除，多少秒后放一个探测请求
+breaker_failures = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+breaker_reset = float(os.getenv("LLM_BREAKER_RESET", "30"))
+# 单次请求（一次尝试）的时限秒数，0 表示不限；超时按可重试错误处理
+call_timeout = float(os.getenv("LLM_CALL_TIMEOUT", "0"))
+
+# LLM_MOCK=1 时改用离线替身模型，不需要网络和 API key
+use_mock = os.getenv("LLM_MOCK", "0") == "1"
+
+# 响应录制/回放：off / record / replay / auto（有录制就回放，没有就请求并录制）
+cassette_mode = os.getenv("LLM_CASSETTE", "off").strip().lower()
+cassette_dir = os.getenv("LLM_CASSETTE_DIR", ".cassette")
+cassette_max_mb = float(os.getenv("LLM_CASSETTE_MAX_MB", "512"))
+cassette_memory_items = int(os.getenv("LLM_CASSETTE_MEMORY", "256"))
+
+# 工具参数 schema 的约束：off / enum（默认）/ branches（oneOf 分支，部分后端不接受，需确认后再开）
+regis.set_schema_mode(os.getenv("LLM_TOOL_SCHEMA", "enum"))
+
+# 按调用类别 / 身份分流到不同模型：LLM_MODELS 定义具名客户端，LLM_ROUTES 把路由键映射到客户端名，见 routing.py
+model_specs_raw = os.getenv("LLM_MODELS", "")
+routes_raw = os.getenv("LLM_ROUTES", "")
+
+# 调用记录导出：JSON Lines 文件和 Prometheus 文本格式，留空表示不导出；路径里的 {pid} 换成进程号
+metrics_jsonl = os.getenv("LLM_METRICS_JSONL", "")
+metrics_prom = os.getenv("LLM_METRICS_PROM", "")
+
+# 真实模型与离线替身共用同一份能力声明，autogen 会据此决定消息的组织方式
+MODEL_INFO = ModelInfo(
+    vision=True,
+    function_calling=True,
+    json_output=True,
+    family="gpt-4o",
+    structured_output=True,
+)
 
 RETRYABLE_ERRORS = (
     openai.RateLimitError,
     openai.APITimeoutError,
     openai.APIConnectionError,
     openai.InternalServerError,
+    # LLM_CALL_TIMEOUT 到期；asyncio.timeout 在 3.11 起抛出内置的 TimeoutError
+    TimeoutError,
 )
+# 只和某个端点自身有关的错误：直接熔断该端点，有其他端点时换一个重试
+ENDPOINT_ERRORS = (
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.NotFoundError,
+)
+FAILOVER_ERRORS = RETRYABLE_ERRORS + ENDPOINT_ERRORS
 
 
-class QueuedChatCompletionClient:
-    """为共享模型客户端增加全局并发控制与简单重试。"""
+# 当前模型调用所属的标签（阶段、回合等）。随 asyncio 任务复制，并发阶段互不干扰。
+CALL_TAGS = contextvars.ContextVar("llm_call_tags", default={})
+
+
+def tag_calls(**tags):
+    """在当前任务里追加调用标签，之后发出的模型调用都会带上它们。"""
+    CALL_TAGS.set({**CALL_TAGS.get(), **tags})
+
 
-    def __init__(self, client, max_concurrency: int = 1, max_retries: int = 2, retry_base_delay: float = 2.0):
-        self._client = client
-        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+async def _with_idle_timeout(stream, timeout: float | None):
+    """逐个转发流式分片；等待下一个分片超过 timeout 秒时抛出 TimeoutError。"""
+    iterator = stream.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+
+class QueuedChatCompletionClient:
+    """为共享模型客户端增加全局限流、重试和多端点路由。
+
+    每个端点的并发、RPM/TPM 和 429 后的冷却都交给它自己的 AdaptiveRateLimiter；
+    重试优先遵守响应头里的 Retry-After，没有时按指数退避加抖动。
+    有多个端点时，每次尝试都选负载最低且没被熔断的端点，失败后换一个端点重试。
+
+    每次调用结束后把一条记录交给 add_listener 注册的回调：
+    排队等待、占用并发槽的时长、总耗时、流式请求的首个分片耗时、尝试次数和每次重试的原因、
+    token 用量（含估算的前缀缓存命中）、端点和当前的调用标签（对局、回合、阶段、Agent）。
+    bind(agent=...) 返回一个给调用额外打标签的视图，交给各个 Agent 使用。
+
+    传入 cassette 后可以录制每次响应（record），或不联网地从录制中回放（replay）；
+    auto 模式有录制就回放，没有就请求并录制。
+
+    call_timeout 限制每次尝试的时长（流式请求限制首个和相邻两个分片之间的间隔），到期按超时重试。
+    """
+
+    def __init__(
+        self,
+        client=None,
+        max_concurrency: int = 1,
+        max_retries: int = 2,
+        retry_base_delay: float = 2.0,
+        cassette: ResponseCassette | None = None,
+        cassette_mode: str = "off",
+        limiter: AdaptiveRateLimiter | None = None,
+        endpoints=None,
+        call_timeout: float | None = None,
+    ):
+        self._endpoints = list(endpoints or [
+            Endpoint("default", client, limiter or AdaptiveRateLimiter(max_concurrency=max_concurrency)),
+        ])
+        self._client = self._endpoints[0].client
         self._max_retries = max(0, max_retries)
         self._retry_base_delay = max(0.1, retry_base_delay)
+        self._listeners = []
+        self._prefix_cache = PrefixCacheEstimator()
+        self._cassette = cassette
+        self._cassette_mode = cassette_mode if cassette else "off"
+        self._call_timeout = call_timeout or None
 
     def __getattr__(self, name):
         return getattr(self._client, name)
 
-    async def _sleep_before_retry(self, attempt: int):
-        await asyncio.sleep(self._retry_base_delay * (2 ** attempt))
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def _emit(self, record: dict):
+        for callback in self._listeners:
+            callback(record)
+
+    @property
+    def endpoints(self) -> list:
+        return self._endpoints
+
+    def bind(self, **tags) -> "BoundChatCompletionClient":
+        return BoundChatCompletionClient(self, tags)
+
+    def _new_record(self, stream: bool, args, kwargs, tags=None) -> dict:
+        messages = kwargs.get("messages", args[0] if args else [])
+        text = request_text(messages, kwargs.get("tools", []))
+        return {
+            "tags": {**CALL_TAGS.get(), **(tags or {})},
+            "stream": stream,
+            "queue_wait": 0.0,
+            # 各次尝试占用并发槽的时长之和
+            "hold_time": 0.0,
+            "latency": 0.0,
+            # 流式请求从发起到收到首个分片的时长
+            "ttft": None,
+            "attempts": 0,
+            "retry_reasons": [],
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": self._prefix_cache.observe(text),
+            "completion_tokens": 0,
+            # TPM 预扣用的估算值，拿到实际用量后再校正
+            "estimated_tokens": estimate_tokens(text),
+            "rate_limited": 0,
+            "endpoint": None,
+            "replayed": False,
+            "ok": False,
+        }
+
+    @staticmethod
+    def _record_usage(record: dict, result):
+        usage = getattr(result, "usage", None)
+        if usage is not None:
+            record["prompt_tokens"] = usage.prompt_tokens
+            record["completion_tokens"] = usage.completion_tokens
+
+    def _cassette_key(self, args, kwargs):
+        if self._cassette_mode == "off":
+            return None
+        messages = kwargs.get("messages", args[0] if args else [])
+        params = {name: value for name, value in kwargs.items() if name not in ("messages", "tools")}
+        return self._cassette.next_key(request_key(messages, kwargs.get("tools", []), **params))
+
+    def _replay(self, key, record: dict):
+        if key is None or self._cassette_mode not in ("replay", "auto"):
+            return None
+        result = self._cassette.get(key)
+        if result is None:
+            if self._cassette_mode == "replay":
+                raise CassetteMissError(f"回放模式下没有找到录制：{key}")
+            return None
+        record["ok"] = True
+        record["replayed"] = True
+        self._record_usage(record, result)
+        return result.model_copy(update={"cached": True})
+
+    def _save(self, key, result, record: dict):
+        if key is not None and self._cassette_mode in ("record", "auto"):
+            self._cassette.put(key, result, tags=record["tags"])
+
+    async def _acquire(self, record: dict, exclude=()):
+        endpoint = pick_endpoint(self._endpoints, exclude)
+        probe = endpoint.breaker.on_dispatch()
+        waited_from = time.perf_counter()
+        try:
+            started = await endpoint.limiter.acquire(record["estimated_tokens"])
+        except BaseException:
+            if probe:
+                endpoint.breaker.on_probe_done(False)
+            raise
+        record["queue_wait"] += time.perf_counter() - waited_from
+        record["attempts"] += 1
+        record["endpoint"] = endpoint.name
+        endpoint.stats["calls"] += 1
+        return endpoint, started, probe
+
+    @staticmethod
+    def _probe_outcome(error) -> bool | None:
+        # 429 说明端点活着但很忙，不算探测成功也不算失败
+        return None if isinstance(error, openai.RateLimitError) else False
+
+    def _succeeded(self, endpoint: Endpoint, record: dict, result):
+        record["ok"] = True
+        self._record_usage(record, result)
+        used = record["prompt_tokens"] + record["completion_tokens"]
+        endpoint.limiter.on_success(used - record["estimated_tokens"] if used else 0)
+        endpoint.breaker.on_success()
+
+    def _failed(self, endpoint: Endpoint, record: dict, error, started: float):
+        endpoint.stats["failures"] += 1
+        record["retry_reasons"].append(type(error).__name__)
+        if isinstance(error, openai.RateLimitError):
+            # 限流说明端点是好的，只是太忙，交给限流器处理，不计入熔断
+            record["rate_limited"] += 1
+            endpoint.limiter.on_rate_limited(error, started)
+        else:
+            endpoint.breaker.on_failure(fatal=isinstance(error, ENDPOINT_ERRORS))
+
+    def _retryable(self, error) -> bool:
+        # key 失效、模型不存在这类错误只有换一个端点才有意义
+        return isinstance(error, RETRYABLE_ERRORS) or len(self._endpoints) > 1
+
+    async def _sleep_before_retry(self, endpoint: Endpoint, error, attempt: int):
+        spare = any(
+            other is not endpoint and other.breaker.available() and other.load() < 1
+            for other in self._endpoints
+        )
+        if not spare:
+            await asyncio.sleep(endpoint.limiter.backoff(error, attempt, self._retry_base_delay))
+
+    @staticmethod
+    def _release(endpoint: Endpoint, record: dict, started_at: float):
+        record["hold_time"] += time.monotonic() - started_at
+        endpoint.limiter.release()
 
     async def create(self, *args, **kwargs):
-        for attempt in range(self._max_retries + 1):
-            async with self._semaphore:
+        return await self._create(None, args, kwargs)
+
+    def create_stream(self, *args, **kwargs):
+        return self._create_stream(None, args, kwargs)
+
+    async def _create(self, tags, args, kwargs):
+        record = self._new_record(False, args, kwargs, tags)
+        started = time.perf_counter()
+        try:
+            key = self._cassette_key(args, kwargs)
+            replayed = self._replay(key, record)
+            if replayed is not None:
+                return replayed
+            failed = ()
+            for attempt in range(self._max_retries + 1):
+                endpoint, started_at, probe = await self._acquire(record, failed)
+                # 探测请求不论怎样结束（包括取消和非重试类错误）都要给熔断器一个结论
+                outcome = False
                 try:
-                    return await self._client.create(*args, **kwargs)
-                except RETRYABLE_ERRORS:
-                    if attempt >= self._max_retries:
+                    result = await asyncio.wait_for(endpoint.client.create(*args, **kwargs), self._call_timeout)
+                    self._succeeded(endpoint, record, result)
+                    self._save(key, result, record)
+                    return result
+                except FAILOVER_ERRORS as e:
+                    outcome = self._probe_outcome(e)
+                    self._failed(endpoint, record, e, started_at)
+                    if attempt >= self._max_retries or not self._retryable(e):
                         raise
-            await self._sleep_before_retry(attempt)
-
-    async def create_stream(self, *args, **kwargs):
-        for attempt in range(self._max_retries + 1):
-            yielded_chunk = False
-            await self._semaphore.acquire()
-            try:
-                async for chunk in self._client.create_stream(*args, **kwargs):
-                    yielded_chunk = True
-                    yield chunk
+                    error = e
+                finally:
+                    if probe:
+                        endpoint.breaker.on_probe_done(outcome)
+                    self._release(endpoint, record, started_at)
+                failed = (endpoint.name,)
+                await self._sleep_before_retry(endpoint, error, attempt)
+        finally:
+            record["latency"] = time.perf_counter() - started
+            self._emit(record)
+
+    async def _create_stream(self, tags, args, kwargs):
+        record = self._new_record(True, args, kwargs, tags)
+        started = time.perf_counter()
+        try:
+            key = self._cassette_key(args, kwargs)
+            replayed = self._replay(key, record)
+            if replayed is not None:
+                record["ttft"] = time.perf_counter() - started
+                if isinstance(replayed.content, str) and replayed.content:
+                    yield replayed.content
+                yield replayed
                 return
-            except RETRYABLE_ERRORS:
-                if yielded_chunk or attempt >= self._max_retries:
-                    raise
-            finally:
-                self._semaphore.release()
-            await self._sleep_before_retry(attempt)
+            failed = ()
+            for attempt in range(self._max_retries + 1):
+                yielded_chunk = False
+                endpoint, started_at, probe = await self._acquire(record, failed)
+                outcome = False
+                try:
+                    async for chunk in _with_idle_timeout(endpoint.client.create_stream(*args, **kwargs), self._call_timeout):
+                        if record["ttft"] is None:
+                            record["ttft"] = time.perf_counter() - started
+                        yielded_chunk = True
+                        if not isinstance(chunk, str):
+                            self._succeeded(endpoint, record, chunk)
+                            self._save(key, chunk, record)
+                        yield chunk
+                    return
+                except FAILOVER_ERRORS as e:
+                    outcome = self._probe_outcome(e)
+                    self._failed(endpoint, record, e, started_at)
+                    if yielded_chunk or attempt >= self._max_retries or not self._retryable(e):
+                        raise
+                    error = e
+                finally:
+                    if probe:
+                        # 调用方提前关掉流时，已经收到分片就说明端点是好的
+                        endpoint.breaker.on_probe_done(True if yielded_chunk else outcome)
+                    self._release(endpoint, record, started_at)
+                failed = (endpoint.name,)
+                await self._sleep_before_retry(endpoint, error, attempt)
+        finally:
+            record["latency"] = time.perf_counter() - started
+            self._emit(record)
 
     async def close(self):
-        await self._client.close()
-
-# 实例化模型客户端
-model_client = QueuedChatCompletionClient(
-    OpenAIChatCompletionClient(
-        model=model_id,
-        api_key=api_key,
-        base_url=base_url,
-        model_info=ModelInfo(
-            vision=True,
-            function_calling=True,
-            json_output=True,
-            family="gpt-4o",
-            structured_output=True,
-        )
-    ),
-    max_concurrency=max_concurrency,
-    max_retries=max_retries,
-    retry_base_delay=retry_base_delay,
+        for endpoint in self._endpoints:
+            await endpoint.client.close()
+
+
+class BoundChatCompletionClient:
+    """共享客户端的一个视图：经它发出的调用额外带上固定的标签（例如 agent），其余行为完全相同。"""
+
+    def __init__(self, client: QueuedChatCompletionClient, tags: dict):
+        self._queued = client
+        self._tags = dict(tags)
+
+    def __getattr__(self, name):
+        return getattr(self._queued, name)
+
+    async def create(self, *args, **kwargs):
+        return await self._queued._create(self._tags, args, kwargs)
+
+    def create_stream(self, *args, **kwargs):
+        return self._queued._create_stream(self._tags, args, kwargs)
+
+
+def build_mock_client(spec: dict | None = None):
+    from mock_client import MockChatCompletionClient
+
+    # 端点配置里的 mock_* 字段覆盖 LLM_MOCK_* 环境变量，方便模拟一个不稳定的 key
+    spec = spec or {}
+    return MockChatCompletionClient(
+        seed=int(spec.get("mock_seed", os.getenv("LLM_MOCK_SEED", "0"))),
+        latency=spec.get("mock_latency", os.getenv("LLM_MOCK_LATENCY", "fixed:0")),
+        chunk_delay=float(spec.get("mock_chunk_delay", os.getenv("LLM_MOCK_CHUNK_DELAY", "0"))),
+        rate_limit_rate=float(spec.get("mock_rate_limit", os.getenv("LLM_MOCK_RATE_LIMIT", "0"))),
+        server_error_rate=float(spec.get("mock_server_error", os.getenv("LLM_MOCK_SERVER_ERROR", "0"))),
+        timeout_rate=float(spec.get("mock_timeout", os.getenv("LLM_MOCK_TIMEOUT", "0"))),
+        stream_break_rate=float(spec.get("mock_stream_break", os.getenv("LLM_MOCK_STREAM_BREAK", "0"))),
+        retry_after=float(spec.get("mock_retry_after", os.getenv("LLM_MOCK_RETRY_AFTER", "1"))),
+        model_info=MODEL_INFO,
+        # 重试计数按对局隔离，同进程里其他对局不影响本局的回复
+        scope=lambda: CALL_TAGS.get().get("game"),
+    )
+
+
+def build_openai_client(spec: dict):
+    return OpenAIChatCompletionClient(
+        # 纯回放不会发出请求，没有配置模型和 key 时用占位值让客户端能构造出来
+        model=spec["model"] or ("replay-only" if cassette_mode == "replay" else None),
+        api_key=spec["api_key"] or ("replay-only" if cassette_mode == "replay" else None),
+        base_url=spec["base_url"],
+        model_info=MODEL_INFO,
+    )
+
+
+def build_endpoint(spec: dict) -> Endpoint:
+    client = build_mock_client(spec) if spec.get("mock") else build_openai_client(spec)
+    limiter = AdaptiveRateLimiter(
+        max_concurrency=int(spec["max_concurrency"]),
+        min_concurrency=int(spec["min_concurrency"]),
+        requests_per_minute=float(spec["rpm"]),
+        tokens_per_minute=float(spec["tpm"]),
+        jitter=retry_jitter,
+    )
+    breaker = CircuitBreaker(failure_threshold=breaker_failures, reset_timeout=breaker_reset)
+    return Endpoint(spec["name"], client, limiter, breaker)
+
+
+ENDPOINT_DEFAULTS = {
+    "base_url": base_url,
+    "api_key": api_key,
+    "model": model_id,
+    "mock": use_mock,
+    "max_concurrency": max_concurrency,
+    "min_concurrency": min_concurrency,
+    "rpm": requests_per_minute,
+    "tpm": tokens_per_minute,
+}
+ENDPOINT_SPECS = load_endpoint_specs(os.getenv("LLM_ENDPOINTS"), ENDPOINT_DEFAULTS)
+MODEL_SPECS = load_model_specs(model_specs_raw, ENDPOINT_DEFAULTS)
+
+cassette = (
+    ResponseCassette(
+        cassette_dir,
+        max_bytes=int(cassette_max_mb * 1024 * 1024),
+        memory_items=cassette_memory_items,
+    )
+    if cassette_mode != "off"
+    else None
 )
+
+
+def build_client(specs) -> QueuedChatCompletionClient:
+    return QueuedChatCompletionClient(
+        max_retries=max_retries,
+        retry_base_delay=retry_base_delay,
+        endpoints=[build_endpoint(spec) for spec in specs],
+        cassette=cassette,
+        cassette_mode=cassette_mode,
+        call_timeout=call_timeout,
+    )
+
+
+# 实例化模型客户端；配置了分流时换成按标签选客户端的 ModelRouter，用法不变
+model_client = build_client(ENDPOINT_SPECS)
+if MODEL_SPECS or routes_raw:
+    clients = {DEFAULT_CLIENT: model_client, **{name: build_client(specs) for name, specs in MODEL_SPECS.items()}}
+    model_client = ModelRouter(clients, load_routes(routes_raw, clients, [role["role_id"] for role in (WOLF_ROLE, *LIGHT_ROLES)]), current_tags=CALL_TAGS.get)
+
+if metrics_jsonl:
+    model_client.add_listener(JsonlExporter(metrics_jsonl))
+prometheus_metrics = PrometheusMetrics(metrics_prom) if metrics_prom else None
+if prometheus_metrics:
+    model_client.add_listener(prometheus_metrics)
@@ -0,0 +1,65 @@
+"""回合与阶段的时限。
+
+单次模型请求的时限由 QueuedChatCompletionClient(call_timeout) 负责；这里管更大的两层：
+- 回合：一个 Agent 的一次发言（可能含工具调用与多次请求），DeadlineAgent 到期后代为说出兜底发言；
+- 阶段：夜晚各身份阶段、白天辩论、密封投票，由 main 用 asyncio.timeout 包住，到期后提交规则允许的兜底行动。
+两层都到期即止，整局的墙钟时间因此有上限。
+"""
+import asyncio
+from typing import AsyncGenerator, Callable, Sequence
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage, TextMessage
+from autogen_core import CancellationToken
+
+
+class DeadlineAgent(BaseChatAgent):
+    """包住一个 Agent，每次发言限时 timeout 秒；超时放弃这次发言，改为 fallback_text。
+
+    流式发言的分片照常转发，到期时已经打出的半句作废，同样换成 fallback_text。
+    """
+
+    def __init__(self, agent: BaseChatAgent, timeout: float, fallback_text: str, on_timeout: Callable[[str], None] | None = None):
+        super().__init__(name=agent.name, description=agent.description)
+        self._agent = agent
+        self._timeout = timeout
+        self._fallback_text = fallback_text
+        self._on_timeout = on_timeout
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return self._agent.produced_message_types
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        try:
+            async with asyncio.timeout(self._timeout):
+                return await self._agent.on_messages(messages, cancellation_token)
+        except TimeoutError:
+            return self._fallback()
+
+    async def on_messages_stream(
+        self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken
+    ) -> AsyncGenerator[BaseAgentEvent | BaseChatMessage | Response, None]:
+        # 时限只包住等待下一项的那一步：yield 出去之后是调用方的代码，不能在那里被取消
+        deadline = asyncio.get_running_loop().time() + self._timeout
+        stream = self._agent.on_messages_stream(messages, cancellation_token).__aiter__()
+        try:
+            while True:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await stream.__anext__()
+                except StopAsyncIteration:
+                    return
+                yield item
+        except TimeoutError:
+            await stream.aclose()
+            yield self._fallback()
+
+    def _fallback(self) -> Response:
+        if self._on_timeout:
+            self._on_timeout(self.name)
+        return Response(chat_message=TextMessage(source=self.name, content=self._fallback_text))
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        await self._agent.on_reset(cancellation_token)
@@ -0,0 +1,125 @@
+"""多端点 / 多 key 的模型客户端池。
+
+每个端点有自己的客户端、限流器（并发、RPM、TPM）和熔断器。
+请求按“最空闲”选端点；连续失败的端点被熔断一段时间，到期后放一个探测请求，成功才恢复。
+
+LLM_ENDPOINTS 可以是 JSON 数组，也可以是指向 JSON 文件的路径：
+
+    [
+      {"name": "a", "base_url": "...", "api_key": "...", "model": "...", "max_concurrency": 2, "rpm": 60},
+      {"name": "b", "api_key": "...", "tpm": 200000},
+      {"name": "offline", "mock": true}
+    ]
+
+缺省的字段取 LLM_BASE_URL / LLM_API_KEY / LLM_MODEL_ID 等全局配置。
+"""
+import json
+import os
+import time
+
+from ratelimit import AdaptiveRateLimiter
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后熔断 reset_timeout 秒，之后只放一个探测请求。"""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.stats = {"opened": 0}
+
+    def retry_at(self) -> float:
+        if self.state == "open":
+            return self._opened_at + self.reset_timeout
+        # 已经有探测请求在路上的端点不再叠加探测
+        return float("inf") if self._probing else 0.0
+
+    def available(self) -> bool:
+        if self.state == "open" and time.monotonic() >= self.retry_at():
+            self.state = "half_open"
+        if self.state == "half_open":
+            return not self._probing
+        return self.state == "closed"
+
+    def on_dispatch(self) -> bool:
+        """派出一个请求；返回 True 表示它是本轮的探测请求，调用方结束时必须 on_probe_done。"""
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def on_probe_done(self, ok: bool | None):
+        """探测请求结束。ok 为 None 表示结果不说明问题（如 429），回到 half_open 等下一个探测；
+        取消、未知错误都按失败处理。on_success / on_failure 已经处理过时什么也不做。"""
+        if not self._probing:
+            return
+        self._probing = False
+        if ok:
+            self.on_success()
+        elif ok is not None:
+            self.on_failure()
+
+    def on_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def on_failure(self, fatal: bool = False):
+        self.failures += 1
+        self._probing = False
+        if fatal or self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class Endpoint:
+    """一个上游：客户端 + 自己的限流器 + 熔断器。"""
+
+    def __init__(self, name: str, client, limiter: AdaptiveRateLimiter, breaker: CircuitBreaker | None = None):
+        self.name = name
+        self.client = client
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"calls": 0, "failures": 0}
+
+    def load(self) -> float:
+        return self.limiter.load()
+
+
+def pick_endpoint(endpoints, exclude=()):
+    """在没被熔断的端点里选负载最低的；全都熔断时选最早可以探测的那个。
+
+    调用方要接着调 endpoint.breaker.on_dispatch()，并在它返回 True 时于请求结束后 on_probe_done。
+    """
+    candidates = [e for e in endpoints if e.name not in exclude] or list(endpoints)
+    healthy = [e for e in candidates if e.breaker.available()]
+    if healthy:
+        endpoint = min(healthy, key=lambda e: (e.load(), e.stats["calls"]))
+    else:
+        endpoint = min(candidates, key=lambda e: e.breaker.retry_at())
+    return endpoint
+
+
+def load_endpoint_specs(raw: str | None, defaults: dict) -> list:
+    """解析 LLM_ENDPOINTS；为空时只用全局配置组成一个端点。"""
+    if not raw or not raw.strip():
+        return [dict(defaults, name="default")]
+    raw = raw.strip()
+    if not raw.startswith("["):
+        with open(raw, encoding="utf-8") as f:
+            raw = f.read()
+    specs = []
+    for index, spec in enumerate(json.loads(raw)):
+        # 值形如 "$ENV_NAME" 时从环境变量读取，key 不必写进配置文件
+        spec = {
+            key: os.getenv(value[1:], "") if isinstance(value, str) and value.startswith("$") else value
+            for key, value in spec.items()
+        }
+        specs.append({**defaults, "name": f"endpoint{index + 1}", **spec})
+    return specs
@@ -0,0 +1,86 @@
+"""按座位过滤的增量事件流。
+
+rules 在状态转移时通知 GameState.listeners：献祭目标定下、诅咒落下、夜晚与白天结算。
+EventFeed 把这些转移渲染成一行事实，按可见范围存下；每个座位有自己的游标，
+since(seat) 只返回它上次取过之后、它有权看到的新事件。
+
+Agent 因此每次只收到几十个 token 的新事实，而不是反复重读整个广场；
+女巫得知献祭目标、乌鸦确认诅咒这类私有事实也只进对应座位的上下文。
+"""
+
+
+def _night_kill(data):
+    return f"今夜被献祭的目标是 {data['target']}。"
+
+
+def _curse(data):
+    return f"你的诅咒落在 {data['target']} 身上，白天放逐时额外计一票。"
+
+
+def _night_resolved(data):
+    if data["deaths"]:
+        return f"昨夜出局：{', '.join(data['deaths'])}。存活：{', '.join(data['alive'])}。"
+    return f"昨夜无人出局。存活：{', '.join(data['alive'])}。"
+
+
+def _day_started(data):
+    if not data["cursed"]:
+        return None
+    return f"{data['cursed']} 今天背着乌鸦的诅咒，放逐投票时额外计一票。"
+
+
+def _day_resolved(data):
+    if not data["tally"]:
+        return "今天无人投票，无人被放逐。"
+    tally = " / ".join(f"{target}:{count}" for target, count in sorted(data["tally"].items()))
+    return f"今天票型：{tally}，放逐：{data['eliminated'] or '无人'}。"
+
+
+# 各类事件的文案；返回 None 表示这次转移不值得告诉任何人。
+EVENT_TEXT = {
+    "night_kill": _night_kill,
+    "curse": _curse,
+    "night_resolved": _night_resolved,
+    "day_started": _day_started,
+    "day_resolved": _day_resolved,
+}
+
+
+class EventFeed:
+    """一局的事件流。audiences 为 {事件类型: 可见座位}，没列出的类型对所有人公开。"""
+
+    def __init__(self, audiences=None):
+        self.events = []
+        self._audiences = {kind: frozenset(seats) for kind, seats in (audiences or {}).items()}
+        self._cursors = {}
+
+    def __call__(self, kind: str, data: dict):
+        render = EVENT_TEXT.get(kind)
+        text = render(data) if render else None
+        if text:
+            self.events.append({"kind": kind, "text": text, "audience": self._audiences.get(kind)})
+
+    def attach(self, state):
+        state.listeners.append(self)
+        return self
+
+    def save_state(self) -> dict:
+        events = [dict(event, audience=sorted(event["audience"]) if event["audience"] is not None else None) for event in self.events]
+        return {"events": events, "cursors": dict(self._cursors)}
+
+    def load_state(self, saved: dict):
+        self.events = [
+            dict(event, audience=frozenset(event["audience"]) if event["audience"] is not None else None)
+            for event in saved["events"]
+        ]
+        self._cursors = dict(saved["cursors"])
+
+    def since(self, seat: str):
+        """seat 上次取过之后新出现、且对它可见的事件文案，取完游标前移。"""
+        start = self._cursors.get(seat, 0)
+        self._cursors[seat] = len(self.events)
+        return [
+            event["text"]
+            for event in self.events[start:]
+            if event["audience"] is None or seat in event["audience"]
+        ]
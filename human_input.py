@@ -0,0 +1,61 @@
+"""真人输入的异步读取。
+
+读取放到守护线程里阻塞，事件循环照常推进模型请求、重试和并发的 AI 阶段。
+线程里直接 os.read 标准输入的文件描述符，不经过 sys.stdin 的缓冲锁，进程退出时不会卡住。
+同一时刻只有一个提示在等输入；超时后返回调用方给的默认值，
+仍在等待的那次读取留给下一个提示复用，不会有两个线程同时抢 stdin。
+"""
+import asyncio
+import os
+import sys
+import threading
+
+_pending = None
+_lock = None
+# 已经读到但还没交出去的字节，只有读线程会访问
+_buffer = bytearray()
+
+
+def _read_line(loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+    while b"\n" not in _buffer:
+        chunk = os.read(sys.stdin.fileno(), 4096)
+        if not chunk:
+            break
+        _buffer.extend(chunk)
+    if _buffer:
+        raw, _, rest = bytes(_buffer).partition(b"\n")
+        _buffer[:] = rest
+        line = raw.decode("utf-8", errors="replace").rstrip("\r")
+    else:
+        line = None
+
+    def _deliver():
+        if not future.done():
+            future.set_result(line)
+
+    try:
+        loop.call_soon_threadsafe(_deliver)
+    except RuntimeError:
+        # 事件循环已经关闭，这一行没有人要了
+        pass
+
+
+async def ainput(prompt: str, timeout: float | None = None, default: str = "") -> str:
+    """读一行输入。timeout 秒内没有输入、或 stdin 已关闭时返回 default。"""
+    global _pending, _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        loop = asyncio.get_running_loop()
+        print(prompt, end="", flush=True)
+        # 上一次超时的读取还在等就接着用；如果已经拿到了迟到的输入，丢掉它，重新读
+        if _pending is None or _pending.done():
+            _pending = loop.create_future()
+            threading.Thread(target=_read_line, args=(loop, _pending), daemon=True).start()
+        try:
+            line = await asyncio.wait_for(asyncio.shield(_pending), timeout)
+        except asyncio.TimeoutError:
+            print(f"\n⏰ 输入超时，按默认处理：{default or '跳过'}")
+            return default
+        _pending = None
+        return default if line is None else line
@@ -1,52 +1,95 @@
+import argparse
 import asyncio
+import itertools
+import json
+import random
 import sys
 import os
+import time
 
 # 确保导入本地模块
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from autogen_agentchat.agents import AssistantAgent, UserProxyAgent
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.conditions import ExternalTermination
+from autogen_agentchat.messages import ModelClientStreamingChunkEvent, TextMessage
+from autogen_core.models import SystemMessage, UserMessage
 from autogen_agentchat.teams import RoundRobinGroupChat, SelectorGroupChat
-from config import model_client, RUSTY_STYLE
-from personas import get_role_persona
-from roles import build_standard_role_pool
+from checkpoint import (
+    CHECKPOINT_NAME,
+    EVENT_LOG_NAME,
+    EventLog,
+    load_checkpoint,
+    restore_state,
+    save_checkpoint,
+    snapshot_state,
+)
+from config import model_client, prometheus_metrics, tag_calls
+from deadlines import DeadlineAgent
+from events import EventFeed
+from human_input import ainput
+from moderator import GOD_NAME, ModeratorAgent
+from policies import ScriptedPolicy
+from prompts import (
+    build_ballot_task,
+    build_god_prompt,
+    build_player_prompt,
+    build_private_knowledge,
+    build_public_record,
+    speech_digest,
+)
+from roles import TABLE_LAYOUTS, build_role_pool, get_role
+from rolling_context import RollingSummaryContext
+from routing import DEFAULT_CLIENT
+from streaming import SpeechPrinter, StreamingAgent
+from terminations import PASS_WORD, PhaseCommitTermination, phase_max_turns
 import rules
 import regis
 
 
-def make_user_input_func(player_name: str):
-    def _input(_: str) -> str:
-        return input(f"🎤 你现在以 {player_name} 的身份发言，请输入你的回复：")
+# 同一进程内每桌的编号，用来给模型调用打标签。
+_GAME_IDS = itertools.count(1)
 
-    return _input
-
-
-def build_vote_tool(voter_name: str):
-    def cast_vote(target: str):
-        """白天投票给一名存活玩家。示例：P3。"""
-        return regis.cast_vote(voter_name, target)
+# 结局文案按获胜阵营区分。
+ENDINGS = {
+    "light": "锈湖还会迎来下一次光辉",
+    "dark": "There will be Blood",
+}
 
-    cast_vote.__name__ = "cast_vote"
-    cast_vote.__doc__ = "白天投票给一名存活玩家。示例：P3。"
-    return cast_vote
 
+# 真人超时未发言时代为说出的话
+SILENT_SPEECH = "（沉默）"
 
-def is_alive(player_name: str) -> bool:
-    return rules.is_alive(player_name)
 
+def make_user_input_func(player_name: str, timeout: float | None = None):
+    async def _input(_: str, cancellation_token=None) -> str:
+        return await ainput(
+            f"🎤 你现在以 {player_name} 的身份发言，请输入你的回复：",
+            timeout=timeout,
+            default=SILENT_SPEECH,
+        )
 
-def alive_players():
-    return rules.alive_players()
+    return _input
 
 
-def prompt_user_target(prompt: str, excluded=None, allow_skip: bool = True, actor_name: str | None = None):
+async def prompt_user_target(
+    table,
+    prompt: str,
+    excluded=None,
+    allow_skip: bool = True,
+    actor_name: str | None = None,
+):
+    """等真人输入一个存活玩家编号。等待期间其他 AI 阶段照常运行；超时视为跳过。"""
+    state = table["state"]
     excluded = set(excluded or [])
     while True:
-        options = [name for name in alive_players() if name not in excluded]
+        options = [name for name in rules.alive_players(state) if name not in excluded]
         if not options:
             return None
         actor_prefix = f"🎯 你现在以 {actor_name} 的身份执行：" if actor_name else ""
-        raw = input(f"{actor_prefix}{prompt} ({', '.join(options)})：").strip()
+        raw = await ainput(f"{actor_prefix}{prompt} ({', '.join(options)})：", timeout=table["input_timeout"])
+        raw = raw.strip()
         if not raw and allow_skip:
             return None
         if raw in options:
@@ -54,242 +97,899 @@ def prompt_user_target(prompt: str, excluded=None, allow_skip: bool = True, acto
         print("⚠️ 请输入存活玩家编号。")
 
 
-def print_alive_banner():
-    print(f"🕯️ 当前存活：{', '.join(alive_players())}")
+def announce(table, text: str = "") -> None:
+    """输出一行桌面旁白。无人值守的对局把 table["announce"] 换成空操作。"""
+    if table["printer"]:
+        table["printer"].break_line()
+    table["announce"](text)
 
 
-def display_chat_message(prefix: str, msg, system_label: str = "系统任务") -> None:
-    if not msg.content:
+def print_alive_banner(table):
+    announce(table, f"🕯️ 当前存活：{', '.join(rules.alive_players(table['state']))}")
+
+
+def display_chat_message(table, prefix: str, msg, system_label: str = "系统任务", spaced: bool = False) -> None:
+    """打印一条小组消息。流式模式下分片边到边打，整条到达时不再重复；spaced 为真时每条发言前空一行。"""
+    printer = table["printer"]
+    if isinstance(msg, ModelClientStreamingChunkEvent):
+        if printer:
+            printer.chunk(prefix, msg, spaced=spaced)
+        return
+    if isinstance(msg, TaskResult) or not msg.content:
+        return
+    if printer and printer.finish(msg):
         return
+    if spaced:
+        announce(table)
     source = system_label if msg.source == "user" else msg.source
-    print(f"{prefix} {source}: {msg.content}")
-
-
-def build_player_prompt(seat_no: str, role_info: dict, teammates=None) -> str:
-    persona = get_role_persona(role_info["role_name"])
-    prompt_lines = [
-        RUSTY_STYLE.strip(),
-        f"你是座位 {seat_no}。",
-        f"你的身份是【{role_info['role_name']}】。阵营：{role_info['team']}。{role_info['desc']}",
-        f"你的个体底色：{persona['persona']}",
-        f"你的行为原则：{persona['behavior']}",
-        "你要像真实狼人杀玩家一样发言、推理、误导、自保和投票，不要把自己当成助手。",
-    ]
-    if teammates:
-        prompt_lines.append(
-            f"你的狼人队友是：{', '.join(teammates)}。夜晚请在密谈中合谋，并由其中一人执行工具。"
+    announce(table, f"{prefix} {source}: {msg.content}")
+
+
+def seat_kind(table, seat_no: str) -> str:
+    """座位的控制方：human / ai / scripted。"""
+    return table["seat_kinds"][seat_no]
+
+
+def note_timeout(table, phase: str, scope: str, seat: str | None = None):
+    """记一次时限到期：scope 为 turn（某个座位的一次发言）或 phase（整个阶段）。"""
+    table["timeouts"][phase] = table["timeouts"].get(phase, 0) + 1
+    who = f"{seat} 的发言" if seat else "本阶段"
+    announce(table, f"⏱️ {who}超时，按兜底行动继续。")
+    if table["event_log"]:
+        table["event_log"].append("deadline", phase=phase, scope=scope, seat=seat)
+
+
+def note_budget_stop(table, spent: int):
+    """当天辩论的 token 预算用尽，提前进入投票。"""
+    table["budget_stops"] += 1
+    announce(table, f"💰 今天的辩论已用掉 {spent} token，超出预算，直接进入投票。")
+    if table["event_log"]:
+        table["event_log"].append("day_budget", spent=spent, budget=table["scaling"]["day_token_budget"])
+
+
+def with_deadline(table, agent, phase: str, fallback_text: str):
+    """AI 座位的每次发言限时 table["deadlines"]["turn"] 秒，超时代为说出 fallback_text。"""
+    timeout = table["deadlines"]["turn"]
+    if not timeout or seat_kind(table, agent.name) != "ai":
+        return agent
+    return DeadlineAgent(agent, timeout, fallback_text, on_timeout=lambda seat: note_timeout(table, phase, "turn", seat))
+
+
+def build_god(table, phase: str):
+    """每个并发阶段各自持有一个上帝，避免同一 Agent 同时出现在多个团队里。
+
+    默认是按模板播报的规则主持人；table["llm_god"] 为真时换回模型驱动的叙事上帝。
+    """
+    if not table["llm_god"]:
+        return ModeratorAgent(table["state"], phase)
+    return AssistantAgent(
+        name=GOD_NAME,
+        model_client=model_client.bind(agent=GOD_NAME, kind="god"),
+        system_message=build_god_prompt()
+    )
+
+
+def build_night_team(table, phase: str, actors, max_turns: int | None = None, count_text: bool = True):
+    """行动者 + 主持人组成的夜晚小组。阶段声明的 writes 一旦落进 GameState 就结束，不再跑满轮数。"""
+    writes = next(night_phase["writes"] for night_phase in NIGHT_PHASES if night_phase["name"] == phase)
+    termination = PhaseCommitTermination(
+        table["state"],
+        writes,
+        [agent.name for agent in actors],
+        count_text=count_text,
+    )
+    # 单人阶段超时等于放弃本夜行动；狼人密谈超时只是沉默，轮到下一位队友
+    fallback_text = PASS_WORD if count_text else SILENT_SPEECH
+    return RoundRobinGroupChat(
+        [with_deadline(table, agent, phase, fallback_text) for agent in actors] + [build_god(table, phase)],
+        termination_condition=termination,
+        max_turns=max_turns or phase_max_turns(len(actors)),
+    )
+
+
+async def run_wolf_phase(table):
+    state = table["state"]
+    dark_alive, _ = rules.victory_state(state)
+    if not dark_alive:
+        return
+    my_no = table["my_no"]
+    council = [table["agents_by_name"][name] for name in dark_alive if seat_kind(table, name) != "scripted"]
+    if council:
+        # 狼人可以先商量，普通发言不算失误，轮数上限仍是 5
+        dark_team = build_night_team(table, "wolf", council, max_turns=5, count_text=False)
+        wolf_task = (
+            f"商议献祭目标，可选：{', '.join(rules.legal_targets(state, 'night_kill'))}。"
+            "达成一致后由一人执行 extract_memory。"
+        )
+        if my_no in dark_alive:
+            async for msg in dark_team.run_stream(task=wolf_task):
+                display_chat_message(table, "🔒 [低语]", msg, system_label="密谋规则")
+            wolf_target = await prompt_user_target(
+                table,
+                "🌘 输入你最终要献祭的目标，留空沿用狼群决定，示例：p1",
+                excluded=dark_alive,
+                actor_name=my_no,
+            )
+            if wolf_target:
+                print(regis.extract_memory(state, wolf_target))
+        else:
+            await dark_team.run(task=wolf_task)
+            announce(table, " (你听到了墙壁里齿轮转动的声音...)")
+
+    # 没有 AI 或真人定下目标时，由存活的脚本狼补位
+    scripted_wolves = [name for name in dark_alive if seat_kind(table, name) == "scripted"]
+    if state.kill is None and scripted_wolves:
+        target = table["policy"].choose_night_kill(state, scripted_wolves[0])
+        if target:
+            regis.extract_memory(state, target)
+
+
+async def run_ida_phase(table):
+    state = table["state"]
+    ida_no = table["role_to_player"].get("Ida")
+    if not ida_no or not rules.is_alive(state, ida_no):
+        return
+    kind = seat_kind(table, ida_no)
+    if kind == "human":
+        target = await prompt_user_target(table, "🔮 输入你要查验的目标，示例：p1", excluded={ida_no}, actor_name=ida_no)
+        if target:
+            print(regis.gaze_into_crystal(state, target))
+    elif kind == "scripted":
+        target = table["policy"].choose_inspect(state, ida_no)
+        if target:
+            regis.gaze_into_crystal(state, target)
+    else:
+        ida_phase = build_night_team(table, "ida", [table["agents_by_name"][ida_no]])
+        await ida_phase.run(
+            task=f"从 {', '.join(rules.legal_targets(state, 'inspect'))} 中选择一名，使用 gaze_into_crystal 查验其阵营。"
         )
-    return "\n".join(prompt_lines)
 
 
-def build_god_prompt() -> str:
-    return f"{RUSTY_STYLE}\n你是上帝 Mr. Owl。负责主持夜晚、计票和判定。"
+async def run_laura_phase(table):
+    state = table["state"]
+    laura_no = table["role_to_player"].get("Laura")
+    if not laura_no or not rules.is_alive(state, laura_no):
+        return
+    kind = seat_kind(table, laura_no)
+    if kind == "human":
+        night_target = state.kill
+        print(f"🧪 今夜被献祭的目标，示例：P1：{state.night_kill}")
+        choice = await ainput("输入 heal / poison / skip：", timeout=table["input_timeout"], default="skip")
+        choice = choice.strip().lower()
+        if choice == "heal" and night_target:
+            print(regis.laura_shift(state, night_target, "heal"))
+        elif choice == "poison":
+            poison_target = await prompt_user_target(table, "☠️ 输入你要毒杀的目标", excluded=None, actor_name=laura_no)
+            if poison_target:
+                print(regis.laura_shift(state, poison_target, "poison"))
+    elif kind == "scripted":
+        form, target = table["policy"].choose_laura(state, laura_no)
+        if form:
+            regis.laura_shift(state, target, form)
+    else:
+        moves = rules.legal_moves(state, laura_no, ("heal", "poison"))
+        if not moves:
+            # 两瓶药都用不了，不必再问模型
+            return
+        laura_phase = build_night_team(table, "laura", [table["agents_by_name"][laura_no]])
+        options = "".join(
+            f"可{label}：{', '.join(moves[form])}，用 laura_shift(target, '{form}')。"
+            for form, label in (("heal", "救"), ("poison", "毒"))
+            if form in moves
+        )
+        await laura_phase.run(task=f"{options}不行动则只回复 {PASS_WORD}。")
 
 
-async def main():
-    try:
-        # --- 1. 标准 6 人局身份池 ---
-        player_count = 6
-        selected_chars = build_standard_role_pool()
-        
-        positions = [f"P{i}" for i in range(1, player_count + 1)]
-        my_no = positions[0] # 你固定在 P1
-        
-        all_players_dict = {}
-        agents_by_name = {}
-        all_agents = []
-        my_info = {}
-        role_to_player = {}
-
-        # 预先找出所有狼人的名字，方便注入
-        dark_names = [positions[i] for i, c in enumerate(selected_chars) if c['team'] == 'dark']
-
-        # --- 3. 实例化 Agent ---
-        for no, char in zip(positions, selected_chars):
-            is_me = (no == my_no)
-            teammates = [n for n in dark_names if n != no] if char["team"] == "dark" else []
-
-            if is_me:
-                player = UserProxyAgent(name=no, input_func=make_user_input_func(no))
-                my_info = char
-            else:
-                tools = list(char["tools"]) + [build_vote_tool(no)]
-                player = AssistantAgent(
-                    name=no, 
-                    model_client=model_client,
-                    system_message=build_player_prompt(no, char, teammates),
-                    tools=tools
-                )
-            
-            all_players_dict[no] = char
-            agents_by_name[no] = player
-            role_to_player[char["role_name"]] = no
-            all_agents.append(player)
-        
-        rules.reset_ritual_state(
-            alive_players=[p.name for p in all_agents],
-            player_teams={name: info["team"] for name, info in all_players_dict.items()},
+async def run_mary_phase(table):
+    state = table["state"]
+    mary_no = table["role_to_player"].get("Mary")
+    if not mary_no or not rules.is_alive(state, mary_no):
+        return
+    kind = seat_kind(table, mary_no)
+    if kind == "human":
+        curse_target = await prompt_user_target(table, "🪶 输入你要诅咒的目标", excluded={mary_no}, actor_name=mary_no)
+        if curse_target:
+            print(regis.mary_curse(state, curse_target))
+    elif kind == "scripted":
+        curse_target = table["policy"].choose_curse(state, mary_no)
+        if curse_target:
+            regis.mary_curse(state, curse_target)
+    else:
+        mary_phase = build_night_team(table, "mary", [table["agents_by_name"][mary_no]])
+        await mary_phase.run(
+            task=f"从 {', '.join(rules.legal_targets(state, 'curse'))} 中选择一名，使用 mary_curse 为其追加一票诅咒。"
         )
 
-        god = AssistantAgent(
-            name="Mr_Owl",
-            model_client=model_client,
-            system_message=build_god_prompt()
+
+def fallback_night_kill(table):
+    """狼人阶段超时仍未定下目标时，按脚本策略在存活好人里随机献祭一名。"""
+    state = table["state"]
+    dark_alive, _ = rules.victory_state(state)
+    if state.kill is not None or not dark_alive:
+        return
+    target = table["policy"].choose_night_kill(state, dark_alive[0])
+    if target:
+        regis.extract_memory(state, target)
+
+
+# 夜晚各身份阶段对 GameState 字段的读写声明，顺序即规则上的行动顺序。
+# 调度器据此推导依赖：读写冲突的阶段按顺序执行，其余阶段并发。
+# fallback 是阶段内有时限到期后提交的兜底行动；None 表示不行动（不查验、不用药、不诅咒）。
+NIGHT_PHASES = [
+    {"name": "wolf", "reads": (), "writes": ("kill",), "run": run_wolf_phase, "fallback": fallback_night_kill},
+    {"name": "ida", "reads": (), "writes": ("inspections",), "run": run_ida_phase, "fallback": None},
+    {
+        "name": "laura",
+        "reads": ("kill", "laura_used_heal", "laura_used_poison"),
+        "writes": ("protected", "poisoned", "laura_used_heal", "laura_used_poison"),
+        "run": run_laura_phase,
+        "fallback": None,
+    },
+    {"name": "mary", "reads": (), "writes": ("cursed",), "run": run_mary_phase, "fallback": None},
+]
+
+
+def night_phase_dependencies(phases):
+    """返回 {阶段名: 必须先完成的阶段名集合}。"""
+    deps = {}
+    for index, phase in enumerate(phases):
+        reads, writes = set(phase["reads"]), set(phase["writes"])
+        deps[phase["name"]] = {
+            earlier["name"]
+            for earlier in phases[:index]
+            if set(earlier["writes"]) & (reads | writes) or set(earlier["reads"]) & writes
+        }
+    return deps
+
+
+async def run_night_phases(phases, table):
+    """按依赖关系调度夜晚阶段，互不依赖的阶段并发执行。"""
+    deps = night_phase_dependencies(phases)
+    tasks = {}
+
+    async def _run(phase):
+        if deps[phase["name"]]:
+            await asyncio.gather(*(tasks[name] for name in deps[phase["name"]]))
+        tag_calls(phase=phase["name"])
+        timeouts_before = table["timeouts"].get(phase["name"], 0)
+        try:
+            async with asyncio.timeout(table["deadlines"]["phase"]):
+                await phase["run"](table)
+        except TimeoutError:
+            note_timeout(table, phase["name"], "phase")
+        if phase["fallback"] and table["timeouts"].get(phase["name"], 0) > timeouts_before:
+            phase["fallback"](table)
+
+    for phase in phases:
+        tasks[phase["name"]] = asyncio.create_task(_run(phase))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+
+# 白天辩论的发言调度：ordered 按座位轮转各发言一次、主持人收尾；selector 每轮先问模型下一个由谁发言。
+DEBATE_MODES = ("ordered", "selector")
+
+# 各桌型白天的成本控制，build_table 对应参数未给出时取这里的值；0 / None 表示不限。
+# group_size：辩论按发言顺序分组进行，每组单独成队，组内发言原文才进入彼此的上下文；
+# transcript_window：后面的组和密封投票只看到最近这么多条发言，更早的略去；
+# day_token_budget：当天辩论累计的输入 + 输出 token 达到后，辩论在当前发言结束后收尾，直接投票。
+DAY_SCALING = {
+    6: {"group_size": None, "transcript_window": None, "day_token_budget": None},
+    9: {"group_size": 5, "transcript_window": 8, "day_token_budget": 25000},
+    12: {"group_size": 4, "transcript_window": 8, "day_token_budget": 30000},
+    18: {"group_size": 6, "transcript_window": 8, "day_token_budget": 45000},
+}
+
+
+def build_debate_team(table, speakers, termination=None, final: bool = True):
+    """一组发言者 + 主持人。分组辩论里非最后一组由规则主持人收尾，只交代下一组接着发言，不提前宣布投票。"""
+    god = table["god"] if final else ModeratorAgent(table["state"], "day_debate_group")
+    if table["debate_mode"] == "selector":
+        return SelectorGroupChat(
+            speakers + [god],
+            model_client=model_client.bind(agent="selector", kind="selector"),
+            termination_condition=termination,
+            max_turns=max(10, len(speakers) * 2),
         )
+    # 轮数固定为 存活发言者 + 主持人，成本可预期，也不再为选人调用模型
+    return RoundRobinGroupChat(speakers + [god], termination_condition=termination, max_turns=len(speakers) + 1)
 
-        # --- 4. 游戏流程 ---
-        print("\n" + "█" * 45)
-        print(f"  🎭 你的编号：{my_no} | 化身：【{my_info['role_name']}】")
-        if my_info['team'] == "dark":
-            print(f"  🐺 你的队友：{', '.join([n for n in dark_names if n != my_no])}")
-        print(f"  📜 你的宿命：{my_info['desc']}")
-        print("█" * 45 + "\n")
 
-        round_no = 1
-        while True:
-            dark_alive, light_alive = rules.victory_state()
-            if not dark_alive:
-                print("\n🏆 【达成结局：There will be Blood】")
-                break
-            if len(dark_alive) >= len(light_alive):
-                print("\n🏆 【达成结局：锈湖还会迎来下一次光辉】")
-                break
-
-            rules.start_night()
-            print(f"\n🌑 第 {round_no} 夜：湖边小屋再度沉入黑暗。")
-
-            # [狼人行动]
-            dark_alive_agents = [agents_by_name[name] for name in dark_alive]
-            if dark_alive_agents:
-                dark_team = RoundRobinGroupChat(dark_alive_agents + [god], max_turns=5)
-                wolf_task = "商议献祭目标，只能针对存活好人。达成一致后由一人执行 extract_memory。"
-                if my_info["team"] == "dark" and is_alive(my_no):
-                    async for msg in dark_team.run_stream(task=wolf_task):
-                        display_chat_message("🔒 [低语]", msg, system_label="密谋规则")
-                    wolf_target = prompt_user_target(
-                        "🌘 输入你最终要献祭的目标，留空沿用狼群决定，示例：p1",
-                        excluded=dark_alive,
-                        actor_name=my_no,
-                    )
-                    if wolf_target:
-                        print(regis.extract_memory(wolf_target))
-                else:
-                    await dark_team.run(task=wolf_task)
-                    print(" (你听到了墙壁里齿轮转动的声音...)")
-
-            # [预言家行动]
-            ida_no = role_to_player.get("Ida")
-            if ida_no and is_alive(ida_no):
-                if ida_no == my_no:
-                    target = prompt_user_target("🔮 输入你要查验的目标，示例：p1", excluded={my_no}, actor_name=my_no)
-                    if target:
-                        print(regis.gaze_into_crystal(target))
-                else:
-                    ida_phase = RoundRobinGroupChat([agents_by_name[ida_no], god], max_turns=2)
-                    await ida_phase.run(task="选择一名存活玩家，并使用 gaze_into_crystal 查验其阵营。")
-
-            # [女巫行动]
-            laura_no = role_to_player.get("Laura")
-            if laura_no and is_alive(laura_no):
-                night_target = rules.RITUAL_STATE["night_kill"]
-                if laura_no == my_no:
-                    print(f"🧪 今夜被献祭的目标，示例：P1：{night_target}")
-                    choice = input("输入 heal / poison / skip：").strip().lower()
-                    if choice == "heal" and night_target != "无":
-                        print(regis.laura_shift(night_target, "heal"))
-                    elif choice == "poison":
-                        poison_target = prompt_user_target("☠️ 输入你要毒杀的目标", excluded=None, actor_name=my_no)
-                        if poison_target:
-                            print(regis.laura_shift(poison_target, "poison"))
-                else:
-                    laura_phase = RoundRobinGroupChat([agents_by_name[laura_no], god], max_turns=3)
-                    await laura_phase.run(
-                        task=(
-                            f"今夜被献祭的目标是 {night_target}。"
-                            "若要救人，只能对该目标使用 laura_shift(target, 'heal')。"
-                            "若要毒人，使用 laura_shift(target, 'poison')。不行动则保持沉默。"
-                        )
-                    )
-
-            # [乌鸦行动]
-            mary_no = role_to_player.get("Mary")
-            if mary_no and is_alive(mary_no):
-                if mary_no == my_no:
-                    curse_target = prompt_user_target("🪶 输入你要诅咒的目标", excluded={my_no}, actor_name=my_no)
-                    if curse_target:
-                        print(regis.mary_curse(curse_target))
-                else:
-                    mary_phase = RoundRobinGroupChat([agents_by_name[mary_no], god], max_turns=2)
-                    await mary_phase.run(task="选择一名存活玩家，并使用 mary_curse 为其追加一票诅咒。")
+def speaking_groups(speakers, group_size: int | None):
+    """按发言顺序把发言者切成每组至多 group_size 人；不分组时整天只有一组。"""
+    if not group_size:
+        return [speakers]
+    return [speakers[start:start + group_size] for start in range(0, len(speakers), group_size)]
 
-            # [黎明结算]
-            protected_target = rules.RITUAL_STATE["protected_target"]
-            night_deaths = rules.resolve_night()
-            if night_deaths:
-                print(f"\n☀️ 天亮了。昨晚牺牲的是：{', '.join(night_deaths)}")
-            elif rules.RITUAL_STATE["night_kill"] != "无" and protected_target == rules.RITUAL_STATE["night_kill"]:
-                print("\n☀️ 天亮了。白光降临，被献祭者被挽回，无人死亡。")
-            else:
-                print("\n☀️ 天亮了。昨夜无人死亡。")
-            print_alive_banner()
-
-            dark_alive, light_alive = rules.victory_state()
-            if not dark_alive:
-                print("\n🏆 【达成结局：锈湖还会迎来下一次光辉】")
-                break
-            if len(dark_alive) >= len(light_alive):
-                print("\n🏆 【达成结局：There will be Blood】")
-                break
-
-            # [白天辩论与投票]
-            rules.start_day()
-            alive_agents = [agents_by_name[name] for name in rules.RITUAL_STATE["alive_players"]]
-            public_square = SelectorGroupChat(
-                alive_agents + [god],
-                model_client=model_client,
-                max_turns=max(10, len(alive_agents) * 2),
-            )
 
-            cursed_player = rules.RITUAL_STATE["cursed_player"]
-            if cursed_player != "无":
-                print(f"📍 提示：{cursed_player} 被诅咒，白天将额外承受一票。开始辩论。")
-            else:
-                print("📍 提示：今日没有诅咒加票。开始辩论。")
+def spent_tokens(table) -> int:
+    usage = table["usage"]
+    return usage["prompt_tokens"] + usage["completion_tokens"]
 
-            debate_task = (
-                "我是 Mr. Owl。请每位存活者依次发言。"
-                "在自己发言末尾，使用 cast_vote 给一名存活玩家投票。"
-                "只能投给存活者，每人仅有一票。"
+
+async def run_day_debate(table):
+    """白天公开辩论，只发言不投票。返回冻结的发言记录，供随后的密封投票使用。"""
+    state = table["state"]
+    speakers = [
+        with_deadline(table, table["agents_by_name"][name], "day_debate", SILENT_SPEECH)
+        for name in rules.speaking_order(state)
+        if name in table["agents_by_name"]
+    ]
+
+    if state.cursed:
+        announce(table, f"📍 提示：{state.cursed} 被诅咒，白天将额外承受一票。开始辩论。")
+    else:
+        announce(table, "📍 提示：今日没有诅咒加票。开始辩论。")
+
+    if not any(seat_kind(table, agent.name) == "ai" for agent in speakers):
+        return ()
+    scaling = table["scaling"]
+    budget = scaling["day_token_budget"]
+    spent_before = spent_tokens(table)
+    speaker_names = {agent.name for agent in speakers}
+    transcript = []
+    over_budget = False
+    try:
+        # 阶段到期时辩论就此结束，已有的发言照常进入密封投票
+        async with asyncio.timeout(table["deadlines"]["phase"]):
+            groups = speaking_groups(speakers, scaling["group_size"])
+            for index, group in enumerate(groups):
+                if over_budget:
+                    break
+                debate_task = (
+                    f"我是 Mr. Owl。请每位存活者依次发言，顺序：{', '.join(agent.name for agent in group)}。"
+                    "发言时不要投票，辩论结束后所有人同时密封投票。"
+                )
+                if transcript:
+                    debate_task += f"\n此前各组的发言摘要：\n{speech_digest(transcript, scaling['transcript_window'])}"
+                stop = ExternalTermination()
+                final = index == len(groups) - 1
+                async for msg in build_debate_team(table, group, stop, final).run_stream(task=debate_task):
+                    display_chat_message(table, "📢 [广场]", msg, system_label="仪式规则", spaced=True)
+                    if isinstance(msg, TextMessage) and msg.source in speaker_names:
+                        transcript.append(f"{msg.source}: {msg.content}")
+                    if budget and not over_budget and spent_tokens(table) - spent_before >= budget:
+                        over_budget = True
+                        stop.set()
+    except TimeoutError:
+        note_timeout(table, "day_debate", "phase")
+    if over_budget:
+        note_budget_stop(table, spent_tokens(table) - spent_before)
+    return tuple(transcript)
+
+
+async def ask_ballot(table, seat: str, transcript) -> str | None:
+    """一个 AI 座位的密封投票：系统提示词 + 冻结的发言记录，只给 cast_vote 一个工具。"""
+    state = table["state"]
+    char = table["players"][seat]
+    teammates = [name for name in table["dark_names"] if name != seat] if char["team"] == "dark" else []
+    vote_tool = regis.build_vote_tool(state, seat)
+    options = regis.vote_options(state, seat)
+    messages = [SystemMessage(content=build_player_prompt(seat, char, teammates))]
+    facts = "\n".join(
+        text
+        for text in (build_private_knowledge(state, seat, char, teammates), build_public_record(state, table["history"]))
+        if text
+    )
+    if facts:
+        messages.append(SystemMessage(content=facts))
+    task = build_ballot_task(transcript, options, table["scaling"]["transcript_window"])
+    messages.append(UserMessage(content=task, source=GOD_NAME))
+    result = await model_client.bind(agent=seat, role=char["role_id"], kind="vote").create(
+        messages,
+        tools=[vote_tool],
+        tool_choice="required",
+    )
+    calls = result.content if isinstance(result.content, list) else []
+    for call in calls:
+        if call.name != "cast_vote":
+            continue
+        try:
+            target = json.loads(call.arguments).get("target")
+        except (json.JSONDecodeError, AttributeError):
+            continue
+        return regis.cast_vote(state, seat, target)
+    return None
+
+
+def fallback_vote(table, seat: str):
+    """投票超时的座位按脚本策略随机投给一名合法目标。"""
+    target = table["policy"].choose_vote(table["state"], seat)
+    return regis.cast_vote(table["state"], seat, target) if target else None
+
+
+async def ask_ballot_in_time(table, seat: str, transcript):
+    try:
+        async with asyncio.timeout(table["deadlines"]["turn"]):
+            return await ask_ballot(table, seat, transcript)
+    except TimeoutError:
+        note_timeout(table, "vote", "turn", seat)
+        return fallback_vote(table, seat)
+
+
+async def collect_ballots(table, transcript=()):
+    """密封投票：AI 座位并发各问一次模型，真人同时在另一个线程里输入，脚本座位直接出票。
+
+    单张选票或整个投票阶段超时的 AI 座位改投一名随机的合法目标；真人超时视为弃权。
+    """
+    state = table["state"]
+    my_no = table["my_no"]
+    ai_seats = [seat for seat in rules.alive_players(state) if seat_kind(table, seat) == "ai"]
+    ballots = [ask_ballot_in_time(table, seat, transcript) for seat in ai_seats]
+
+    async def _human_ballot():
+        vote_target = await prompt_user_target(table, "🗳️ 输入你的投票目标，留空弃权", actor_name=my_no)
+        if vote_target:
+            print(regis.cast_vote(state, my_no, vote_target))
+
+    if my_no and rules.is_alive(state, my_no):
+        ballots.append(_human_ballot())
+
+    for seat in rules.alive_players(state):
+        if seat_kind(table, seat) == "scripted":
+            vote_target = table["policy"].choose_vote(state, seat)
+            if vote_target:
+                regis.cast_vote(state, seat, vote_target)
+
+    try:
+        async with asyncio.timeout(table["deadlines"]["phase"]):
+            await asyncio.gather(*ballots)
+    except TimeoutError:
+        note_timeout(table, "vote", "phase")
+        for seat in ai_seats:
+            if seat not in state.votes:
+                fallback_vote(table, seat)
+
+
+def build_model_context(state, feed, seat_no, char, teammates, context_window):
+    return RollingSummaryContext(
+        keep_last=context_window,
+        knowledge=lambda: build_private_knowledge(state, seat_no, char, teammates),
+        observations=lambda: feed.since(seat_no),
+    )
+
+
+def build_table(
+    player_count: int = 6,
+    my_no: str | None = "P1",
+    scripted_seats=(),
+    policy=None,
+    rng=None,
+    announce=print,
+    llm_god: bool = False,
+    debate_mode: str = "ordered",
+    input_timeout: float | None = None,
+    context_window: int | None = 12,
+    roles=None,
+    turn_timeout: float | None = None,
+    phase_timeout: float | None = None,
+    debate_group_size: int | None = None,
+    transcript_window: int | None = None,
+    day_token_budget: int | None = None,
+    stream: bool = False,
+):
+    """发身份并实例化一桌。每桌持有独立的 GameState，工具按桌绑定。
+
+    my_no 为真人座位，传 None 时整桌无人值守；scripted_seats 里的座位由脚本策略接管，不调用模型。
+    llm_god 为真时由模型扮演上帝做叙事主持，否则用不调用模型的规则主持人。
+    debate_mode 见 DEBATE_MODES。input_timeout 为真人每次输入的等待秒数，超时按默认行动（跳过或沉默）处理。
+    context_window 为每个 AI 座位保留原文的最近消息条数，更早的折叠成摘要；None 表示不折叠。
+    死亡、票型、诅咒等事实经 table["events"] 按座位过滤后，在各 AI 座位下一次请求前增量送达。
+    roles 为按座位排列的化身名，给定时按它发牌而不是随机发牌，续跑存档时使用。
+    turn_timeout / phase_timeout 为 AI 单次发言和整个阶段的时限秒数，到期提交兜底行动，None 表示不限。
+    player_count 见 roles.TABLE_LAYOUTS；debate_group_size / transcript_window / day_token_budget 见 DAY_SCALING，
+    None 时取该桌型的默认值，0 表示不限。
+    stream 为真时 AI 座位流式生成，发言边生成边打到终端，见 streaming.py。
+    """
+    if debate_mode not in DEBATE_MODES:
+        raise ValueError(f"未知的辩论模式：{debate_mode}")
+    selected_chars = [get_role(name) for name in roles] if roles else build_role_pool(player_count, rng)
+    defaults = DAY_SCALING.get(player_count, DAY_SCALING[6])
+    scaling = {
+        "group_size": defaults["group_size"] if debate_group_size is None else debate_group_size,
+        "transcript_window": defaults["transcript_window"] if transcript_window is None else transcript_window,
+        "day_token_budget": defaults["day_token_budget"] if day_token_budget is None else day_token_budget,
+    }
+    positions = [f"P{i}" for i in range(1, player_count + 1)]
+    state = rules.GameState(
+        alive_players=positions,
+        player_teams={no: char["team"] for no, char in zip(positions, selected_chars)},
+    )
+    scripted_seats = set(scripted_seats)
+    seat_kinds = {
+        no: "human" if no == my_no else "scripted" if no in scripted_seats else "ai"
+        for no in positions
+    }
+
+    agents_by_name = {}
+    history = []
+    roles_by_seat = {no: char["role_name"] for no, char in zip(positions, selected_chars)}
+    # 献祭目标只告诉女巫，诅咒只告诉乌鸦本人；其余事件公开
+    feed = EventFeed({
+        "night_kill": [no for no, role in roles_by_seat.items() if role == "Laura"],
+        "curse": [no for no, role in roles_by_seat.items() if role == "Mary"],
+    }).attach(state)
+    all_players_dict = {}
+    role_to_player = {}
+    my_info = {}
+
+    # 预先找出所有狼人的名字，方便注入
+    dark_names = [no for no, char in zip(positions, selected_chars) if char["team"] == "dark"]
+
+    for no, char in zip(positions, selected_chars):
+        teammates = [n for n in dark_names if n != no] if char["team"] == "dark" else []
+
+        if seat_kinds[no] == "human":
+            agents_by_name[no] = UserProxyAgent(name=no, input_func=make_user_input_func(no, input_timeout))
+            my_info = char
+        elif seat_kinds[no] == "ai":
+            # 投票走单独的密封投票阶段，这里只挂身份技能
+            tools = [build_tool(state) for build_tool in char["tools"]]
+            agent = AssistantAgent(
+                name=no,
+                model_client=model_client.bind(agent=no, role=char["role_id"]),
+                system_message=build_player_prompt(no, char, teammates),
+                tools=tools,
+                model_context=build_model_context(state, feed, no, char, teammates, context_window),
+                model_client_stream=stream,
             )
-            async for msg in public_square.run_stream(task=debate_task):
-                if msg.content:
-                    print()
-                display_chat_message("📢 [广场]", msg, system_label="仪式规则")
+            agents_by_name[no] = StreamingAgent(agent) if stream else agent
+
+        all_players_dict[no] = char
+        role_to_player[char["role_name"]] = no
+
+    table = {
+        "state": state,
+        "players": all_players_dict,
+        "seat_kinds": seat_kinds,
+        "agents_by_name": agents_by_name,
+        "role_to_player": role_to_player,
+        "dark_names": dark_names,
+        "my_no": my_no,
+        "my_info": my_info,
+        "llm_god": llm_god,
+        "debate_mode": debate_mode,
+        "input_timeout": input_timeout,
+        "policy": policy or ScriptedPolicy(),
+        "announce": announce,
+        "history": history,
+        "events": feed,
+        "printer": SpeechPrinter() if stream else None,
+        # 重建同一桌所需的参数，随快照保存
+        "options": {
+            "player_count": player_count,
+            "my_no": my_no,
+            "scripted_seats": sorted(scripted_seats),
+            "llm_god": llm_god,
+            "debate_mode": debate_mode,
+            "input_timeout": input_timeout,
+            "context_window": context_window,
+            "roles": [char["role_name"] for char in selected_chars],
+            "turn_timeout": turn_timeout,
+            "phase_timeout": phase_timeout,
+            "debate_group_size": scaling["group_size"],
+            "transcript_window": scaling["transcript_window"],
+            "day_token_budget": scaling["day_token_budget"],
+            "stream": stream,
+        },
+        "deadlines": {"turn": turn_timeout, "phase": phase_timeout},
+        "scaling": scaling,
+        # 各阶段时限到期的次数
+        "timeouts": {},
+        # 辩论因 token 预算提前结束的天数
+        "budget_stops": 0,
+        # 下一个要执行的步骤；新开的一局从第 1 夜开始
+        "progress": {"round": 1, "next": "night", "transcript": []},
+        "run_dir": None,
+        "event_log": None,
+        "game_id": next(_GAME_IDS),
+        "usage": {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "uncached_prompt_tokens": 0,
+            "completion_tokens": 0,
+            # {阶段: {calls, prompt_tokens, completion_tokens}}
+            "by_phase": {},
+            # {客户端名: 同上}；没配 LLM_MODELS / LLM_ROUTES 时只有 default
+            "by_client": {},
+        },
+    }
+    table["god"] = build_god(table, "day_debate")
+    return table
+
+
+def track_usage(table):
+    """统计本桌的模型调用与输入 token（含估算的前缀缓存命中），返回注册到客户端的监听器。"""
+    usage = table["usage"]
+
+    def _count(record: dict):
+        if record["tags"].get("game") != table["game_id"]:
+            return
+        usage["calls"] += 1
+        usage["prompt_tokens"] += record["prompt_tokens"]
+        usage["cached_prompt_tokens"] += min(record["cached_prompt_tokens"], record["prompt_tokens"])
+        usage["completion_tokens"] += record["completion_tokens"]
+        usage["uncached_prompt_tokens"] = usage["prompt_tokens"] - usage["cached_prompt_tokens"]
+        tags = record["tags"]
+        for group, key in (("by_phase", tags.get("phase", "untagged")), ("by_client", tags.get("client", DEFAULT_CLIENT))):
+            stats = usage[group].setdefault(key, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            stats["calls"] += 1
+            stats["prompt_tokens"] += record["prompt_tokens"]
+            stats["completion_tokens"] += record["completion_tokens"]
+
+    return _count
+
+
+async def play_game(table):
+    """推进一整局直到分出胜负，返回对局结果摘要。"""
+    listener = track_usage(table)
+    tag_calls(game=table["game_id"])
+    model_client.add_listener(listener)
+    try:
+        winner, round_no = await play_rounds(table)
+    finally:
+        model_client.remove_listener(listener)
+        if prometheus_metrics:
+            prometheus_metrics.dump()
+
+    usage = table["usage"]
+    announce(table, f"\n🏆 【达成结局：{ENDINGS[winner]}】")
+    announce(
+        table,
+        f"🧾 模型调用 {usage['calls']} 次；输入 token {usage['prompt_tokens']}"
+        f"（估算缓存命中 {usage['cached_prompt_tokens']}，未命中 {usage['uncached_prompt_tokens']}）；"
+        f"输出 token {usage['completion_tokens']}",
+    )
+    by_phase = sorted(usage["by_phase"].items(), key=lambda item: -item[1]["prompt_tokens"])
+    if by_phase:
+        announce(
+            table,
+            "🧾 各阶段：" + "；".join(
+                f"{phase} {stats['calls']} 次 / 输入 {stats['prompt_tokens']} / 输出 {stats['completion_tokens']}"
+                for phase, stats in by_phase
+            ),
+        )
+    if len(usage["by_client"]) > 1:
+        announce(
+            table,
+            "🧾 各模型：" + "；".join(
+                f"{name} {stats['calls']} 次 / 输入 {stats['prompt_tokens']} / 输出 {stats['completion_tokens']}"
+                for name, stats in sorted(usage["by_client"].items())
+            ),
+        )
+    return {
+        "winner": winner,
+        "rounds": round_no,
+        "roles": {no: char["role_name"] for no, char in table["players"].items()},
+        "how_died": dict(table["state"].how_died),
+        "days": table["history"],
+        "usage": dict(usage),
+        "timeouts": dict(table["timeouts"]),
+        "budget_stops": table["budget_stops"],
+        "rejections": dict(table["state"].rejections),
+    }
+
+
+def open_run(table, run_dir: str, resumed: bool = False):
+    """把本桌的事件日志和快照放进 run_dir。新开的一局先记下座位与身份。"""
+    os.makedirs(run_dir, exist_ok=True)
+    table["run_dir"] = run_dir
+    table["event_log"] = EventLog(os.path.join(run_dir, EVENT_LOG_NAME))
+    table["state"].listeners.append(table["event_log"])
+    if resumed:
+        table["event_log"].append("resume", **table["progress"])
+    else:
+        table["event_log"].append(
+            "table",
+            roles={no: char["role_name"] for no, char in table["players"].items()},
+            teams=dict(table["state"].player_teams),
+            seat_kinds=dict(table["seat_kinds"]),
+        )
+
 
-            if is_alive(my_no):
-                vote_target = prompt_user_target("🗳️ 输入你的投票目标，留空弃权", excluded=None, actor_name=my_no)
-                if vote_target:
-                    print(regis.cast_vote(my_no, vote_target))
+async def save_progress(table):
+    """阶段边界的快照：GameState、历史、事件流、各 AI 座位的上下文和脚本策略的随机状态。"""
+    if not table["run_dir"]:
+        return
+    agents = {
+        seat: await agent.save_state()
+        for seat, agent in table["agents_by_name"].items()
+        if seat_kind(table, seat) == "ai"
+    }
+    policy_rng = getattr(table["policy"], "rng", None)
+    snapshot = {
+        "options": table["options"],
+        "progress": table["progress"],
+        "state": snapshot_state(table["state"]),
+        "history": table["history"],
+        "usage": table["usage"],
+        "events": table["events"].save_state(),
+        "agents": agents,
+        "policy_rng": policy_rng.getstate() if policy_rng else None,
+    }
+    # 写快照和 fsync 都放到线程里，阶段边界不阻塞同一事件循环上的其他对局
+    await asyncio.to_thread(save_checkpoint, os.path.join(table["run_dir"], CHECKPOINT_NAME), snapshot)
+    table["event_log"].append("checkpoint", **table["progress"])
+    await asyncio.to_thread(table["event_log"].sync)
+
+
+async def resume_table(run_dir: str, policy=None, announce=print):
+    """按 run_dir 里的快照重建一桌，play_game 会从快照记录的下一步继续。"""
+    snapshot = load_checkpoint(os.path.join(run_dir, CHECKPOINT_NAME))
+    table = build_table(**snapshot["options"], policy=policy, announce=announce)
+    restore_state(table["state"], snapshot["state"])
+    table["history"][:] = snapshot["history"]
+    table["usage"].update(snapshot["usage"])
+    table["events"].load_state(snapshot["events"])
+    table["progress"] = snapshot["progress"]
+    for seat, agent_state in snapshot["agents"].items():
+        await table["agents_by_name"][seat].load_state(agent_state)
+    policy_rng = getattr(table["policy"], "rng", None)
+    if policy_rng and snapshot["policy_rng"]:
+        version, internal, gauss_next = snapshot["policy_rng"]
+        policy_rng.setstate((version, tuple(internal), gauss_next))
+    open_run(table, run_dir, resumed=True)
+    return table
+
+
+def rounds_played(table) -> int:
+    """已经进行的回合数：每个夜晚开始一回合，结束在夜里或投票后都算这一回合。"""
+    return len(table["history"])
+
+
+async def play_rounds(table):
+    """昼夜交替直到分出胜负，返回 (获胜阵营, 回合数)。
+
+    一回合分三步：夜晚（含黎明结算）、白天辩论、密封投票。每步结束都更新 table["progress"] 并写快照，
+    续跑时从记录的下一步开始。
+    """
+    state = table["state"]
+    progress = table["progress"]
+    round_no = progress["round"]
+
+    while True:
+        winner = rules.winner(state)
+        if winner:
+            break
+
+        if progress["next"] == "night":
+            tag_calls(round=round_no, phase="night")
+            rules.start_night(state)
+            announce(table, f"\n🌑 第 {round_no} 夜：湖边小屋再度沉入黑暗。")
+
+            await run_night_phases(NIGHT_PHASES, table)
 
-            eliminated, tally = rules.resolve_day()
+            # [黎明结算]
+            night_deaths = rules.resolve_night(state)
+            if night_deaths:
+                announce(table, f"\n☀️ 天亮了。昨晚牺牲的是：{', '.join(night_deaths)}")
+            elif state.kill is not None and state.protected == state.kill:
+                announce(table, "\n☀️ 天亮了。白光降临，被献祭者被挽回，无人死亡。")
+            else:
+                announce(table, "\n☀️ 天亮了。昨夜无人死亡。")
+            print_alive_banner(table)
+            # 白天的票型和放逐在天真正开始时才补上，夜里结束的对局没有这两项
+            table["history"].append({"round": round_no, "night_deaths": night_deaths})
+            progress.update(next="debate")
+
+        elif progress["next"] == "debate":
+            # [白天辩论]
+            tag_calls(round=round_no, phase="day_debate")
+            rules.start_day(state)
+            table["history"][-1].update(tally={}, eliminated=None)
+            transcript = await run_day_debate(table)
+            progress.update(next="vote", transcript=list(transcript))
+
+        else:
+            # [密封投票]
+            tag_calls(round=round_no, phase="vote")
+            await collect_ballots(table, tuple(progress["transcript"]))
+
+            eliminated, tally = rules.resolve_day(state)
+            day_record = table["history"][-1]
+            day_record["tally"] = dict(tally)
+            day_record["eliminated"] = eliminated
             if tally:
                 tally_text = " / ".join(f"{target}:{count}" for target, count in sorted(tally.items()))
-                print(f"\n📊 票型：{tally_text}")
+                announce(table, f"\n📊 票型：{tally_text}")
             else:
-                print("\n📊 今日无人投票。")
+                announce(table, "\n📊 今日无人投票。")
 
             if eliminated:
-                print(f"⚖️ 放逐结果：{eliminated}")
+                announce(table, f"⚖️ 放逐结果：{eliminated}")
             else:
-                print("⚖️ 放逐结果：平票或无票，今天无人被放逐。")
-            print_alive_banner()
+                announce(table, "⚖️ 放逐结果：平票或无票，今天无人被放逐。")
+            print_alive_banner(table)
 
             round_no += 1
+            progress.update(round=round_no, next="night", transcript=[])
+
+        await save_progress(table)
+
+    if table["event_log"]:
+        table["event_log"].append("game_over", winner=winner, rounds=rounds_played(table))
+        table["event_log"].close()
+    return winner, rounds_played(table)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="锈湖狼人杀")
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="固定发牌和脚本座位的随机种子；回放录制的对局时要与录制时一致",
+    )
+    parser.add_argument("--llm-god", action="store_true", help="由模型扮演 Mr. Owl 做叙事主持，每轮多出若干次模型调用")
+    parser.add_argument(
+        "--debate-mode",
+        choices=DEBATE_MODES,
+        default="ordered",
+        help="白天发言调度：ordered 按座位轮转，selector 由模型挑选下一位发言者",
+    )
+    parser.add_argument("--players", type=int, choices=sorted(TABLE_LAYOUTS), default=6, help="每桌人数，你固定在 P1")
+    parser.add_argument("--debate-group-size", type=int, help="辩论每组人数，组与组之间只传递最近的发言；0 表示不分组，默认按桌型")
+    parser.add_argument("--transcript-window", type=int, help="后续发言组和投票能看到的最近发言条数，0 表示全部；默认按桌型")
+    parser.add_argument("--day-token-budget", type=int, help="每天辩论的 token 预算，用尽直接投票，0 表示不限；默认按桌型")
+    parser.add_argument("--no-stream", action="store_true", help="AI 发言生成完整后再整条显示，而不是边生成边显示")
+    parser.add_argument("--input-timeout", type=float, help="每次等待你输入的秒数，超时视为跳过或沉默；默认一直等待")
+    parser.add_argument("--turn-timeout", type=float, help="AI 每次发言或投票的时限秒数，超时按兜底行动处理")
+    parser.add_argument("--phase-timeout", type=float, help="每个夜晚阶段、白天辩论和投票的时限秒数，超时提交兜底行动")
+    parser.add_argument(
+        "--run-dir",
+        help=f"事件日志 {EVENT_LOG_NAME} 和快照 {CHECKPOINT_NAME} 的存放目录；默认 runs/<开局时间>",
+    )
+    parser.add_argument("--resume", metavar="RUN_DIR", help="读取该目录里的快照，从最后一个完成的阶段之后继续")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    run_dir = args.resume or args.run_dir or os.path.join("runs", time.strftime("%Y%m%d-%H%M%S"))
+    try:
+        if args.resume:
+            table = await resume_table(run_dir, policy=ScriptedPolicy(args.seed))
+            print(f"⏯️ 从第 {table['progress']['round']} 回合的 {table['progress']['next']} 阶段继续。")
+        else:
+            # 你固定在 P1
+            table = build_table(
+                player_count=args.players,
+                my_no="P1",
+                policy=ScriptedPolicy(args.seed),
+                rng=random.Random(args.seed) if args.seed is not None else None,
+                llm_god=args.llm_god,
+                debate_mode=args.debate_mode,
+                input_timeout=args.input_timeout,
+                turn_timeout=args.turn_timeout,
+                phase_timeout=args.phase_timeout,
+                debate_group_size=args.debate_group_size,
+                transcript_window=args.transcript_window,
+                day_token_budget=args.day_token_budget,
+                stream=not args.no_stream,
+            )
+            open_run(table, run_dir)
+        my_no = table["my_no"]
+        my_info = table["my_info"]
+
+        print("\n" + "█" * 45)
+        print(f"  🎭 你的编号：{my_no} | 化身：【{my_info['role_name']}】")
+        if my_info['team'] == "dark":
+            print(f"  🐺 你的队友：{', '.join([n for n in table['dark_names'] if n != my_no])}")
+        print(f"  📜 你的宿命：{my_info['desc']}")
+        print("█" * 45 + "\n")
+
+        await play_game(table)
 
     except Exception as e:
         print(f"\n⚠️ 仪式中断：{e}")
         import traceback
         traceback.print_exc()
+        if os.path.exists(os.path.join(run_dir, CHECKPOINT_NAME)):
+            print(f"💾 进度保存在 {run_dir}，用 python main.py --resume {run_dir} 从最后一个完成的阶段继续。")
 
 if __name__ == "__main__":
     asyncio.run(main())
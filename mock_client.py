@@ -0,0 +1,378 @@
+"""离线的 OpenAI 兼容模型替身。
+
+不联网、不需要 LLM_API_KEY，可以直接放在 QueuedChatCompletionClient 后面：
+- 按工具 schema 生成看起来合理的工具调用（extract_memory、cast_vote 等），目标取自 schema 的 enum 或存活名单；
+- SelectorGroupChat 选人时只回一个候选名字；
+- 延迟分布、429 / 5xx / 超时 / 流中断都可配置；
+- 按请求内容派生随机数，同一请求第 n 次出现用第 n 个随机源；计数按作用域（默认是对局）隔离，
+  一局的结果不受同进程里先跑了哪些对局、各局如何交错的影响。
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, Callable, Hashable, Mapping, Optional, Sequence, Union
+
+import openai
+from autogen_core import CancellationToken, FunctionCall
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    CreateResult,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    ModelInfo,
+    RequestUsage,
+    SystemMessage,
+)
+from autogen_core.tools import Tool, ToolSchema
+
+try:
+    import httpx
+except ImportError:  # 部分 openai 发行版改用 httpx2，错误响应要用它的 Request / Response 构造
+    import httpx2 as httpx
+
+from prefix_cache import estimate_tokens
+
+
+MOCK_URL = "http://mock.local/v1/chat/completions"
+
+SPEECH_TEMPLATES = [
+    "{target} 的影子不对。湖面在他身后起了波纹。",
+    "我一直在岸上。水没有碰过我。{target} 从水里出来过。",
+    "黑色方块在 {target} 的口袋里。今夜的票，不该落在别处。",
+    "{target} 的影子还在。湖没有接纳他。",
+    "血迹一路延到 {target} 的门前。钟声停了。",
+]
+GOD_TEMPLATES = [
+    "夜色合拢。仪式继续。",
+    "湖面记下了这一切。下一位。",
+    "猫头鹰在看。说出你的判断。",
+]
+
+
+def parse_latency(spec: str):
+    """把延迟描述转成 rng -> 秒 的函数。
+
+    支持 fixed:0.2、uniform:0.1,0.6、exp:0.5（均值）、lognormal:mu,sigma（ln 秒）。
+    """
+    kind, _, raw = (spec or "fixed:0").partition(":")
+    args = [float(x) for x in raw.split(",") if x.strip()] or [0.0]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        low, high = args[0], args[1] if len(args) > 1 else args[0]
+        return lambda rng: rng.uniform(low, high)
+    if kind == "exp":
+        mean = args[0]
+        return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+    if kind == "lognormal":
+        mu, sigma = args[0], args[1] if len(args) > 1 else 0.0
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"未知的延迟分布：{spec}")
+
+
+def _message_text(message: LLMMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(item if isinstance(item, str) else str(item) for item in content)
+    return str(content)
+
+
+def _tool_schema(tool: Tool | ToolSchema) -> ToolSchema:
+    return tool.schema if hasattr(tool, "schema") else tool
+
+
+class MockChatCompletionClient(ChatCompletionClient):
+    """离线替身模型，行为由种子和请求内容决定。"""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency: str = "fixed:0",
+        chunk_delay: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        stream_break_rate: float = 0.0,
+        retry_after: float = 1.0,
+        timeout_seconds: float = 0.0,
+        player_count: int = 6,
+        max_tokens: int = 128000,
+        model_info: Optional[ModelInfo] = None,
+        scope: Optional[Callable[[], Hashable]] = None,
+        max_scopes: int = 256,
+    ):
+        self._seed = seed
+        self._latency = parse_latency(latency)
+        self._chunk_delay = max(0.0, chunk_delay)
+        self._rate_limit_rate = rate_limit_rate
+        self._server_error_rate = server_error_rate
+        self._timeout_rate = timeout_rate
+        self._stream_break_rate = stream_break_rate
+        self._retry_after = retry_after
+        self._timeout_seconds = timeout_seconds
+        self._seats = [f"P{i}" for i in range(1, player_count + 1)]
+        self._max_tokens = max_tokens
+        # scope() 给出当前调用所属的作用域（如对局编号）；{作用域: {请求摘要: 出现次数}}，只保留最近 max_scopes 个
+        self._scope = scope or (lambda: None)
+        self._max_scopes = max(1, max_scopes)
+        self._occurrences = OrderedDict()
+        self._cur_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        # 默认按 gpt-4o 家族声明能力，autogen 组织消息的方式与真实模型一致，录制可以互通
+        self._model_info = model_info or ModelInfo(
+            vision=True,
+            function_calling=True,
+            json_output=True,
+            family="gpt-4o",
+            structured_output=True,
+        )
+        self.stats = {"calls": 0, "tool_calls": 0, "rate_limited": 0, "server_errors": 0, "timeouts": 0, "stream_breaks": 0}
+
+    # --- 随机性 ---
+
+    def _request_rng(self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema]) -> random.Random:
+        """同一请求第 n 次出现时使用同一个随机源，重试因此能拿到不同的结果。"""
+        digest = hashlib.sha256()
+        for message in messages:
+            digest.update(type(message).__name__.encode())
+            digest.update(_message_text(message).encode())
+        for tool in tools:
+            digest.update(_tool_schema(tool)["name"].encode())
+        key = digest.hexdigest()
+        counts = self._scope_counts(self._scope())
+        occurrence = counts.get(key, 0)
+        counts[key] = occurrence + 1
+        return random.Random(f"{self._seed}:{key}:{occurrence}")
+
+    def _scope_counts(self, scope) -> dict:
+        counts = self._occurrences.pop(scope, None)
+        if counts is None:
+            counts = {}
+            while len(self._occurrences) >= self._max_scopes:
+                self._occurrences.popitem(last=False)
+        self._occurrences[scope] = counts
+        return counts
+
+    def reset(self, scope=None):
+        """清掉某个作用域的出现计数，之后同样的请求序列从头重放。"""
+        self._occurrences.pop(scope, None)
+
+    # --- 故障注入 ---
+
+    def _status_error(self, error_cls, status: int, message: str, headers=None):
+        request = httpx.Request("POST", MOCK_URL)
+        response = httpx.Response(status, request=request, headers=headers or {})
+        return error_cls(message, response=response, body=None)
+
+    async def _wait_or_fail(self, rng: random.Random):
+        await asyncio.sleep(max(0.0, self._latency(rng)))
+        roll = rng.random()
+        if roll < self._rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            raise self._status_error(
+                openai.RateLimitError,
+                429,
+                "mock rate limit",
+                headers={
+                    "retry-after": f"{self._retry_after:g}",
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": f"{self._retry_after:g}s",
+                },
+            )
+        roll -= self._rate_limit_rate
+        if roll < self._server_error_rate:
+            self.stats["server_errors"] += 1
+            raise self._status_error(openai.InternalServerError, rng.choice([500, 502, 503]), "mock server error")
+        roll -= self._server_error_rate
+        if roll < self._timeout_rate:
+            self.stats["timeouts"] += 1
+            await asyncio.sleep(self._timeout_seconds)
+            raise openai.APITimeoutError(request=httpx.Request("POST", MOCK_URL))
+
+    # --- 回复生成 ---
+
+    def _pending_tool(self, messages: Sequence[LLMMessage], schemas: list) -> Optional[ToolSchema]:
+        """从最近的消息往前找：任务里点名了某个工具、且之后自己还没调用过，就调用它。"""
+        for message in reversed(messages):
+            if isinstance(message, FunctionExecutionResultMessage):
+                return None
+            if isinstance(message, AssistantMessage) and isinstance(message.content, list):
+                return None
+            if isinstance(message, SystemMessage):
+                continue
+            text = _message_text(message)
+            for schema in schemas:
+                if schema["name"] in text:
+                    return schema
+        return None
+
+    @staticmethod
+    def _enum(schema: ToolSchema, param: str) -> list:
+        return list(schema.get("parameters", {}).get("properties", {}).get(param, {}).get("enum", []))
+
+    @staticmethod
+    def _moves(schema: ToolSchema) -> dict:
+        """schema 的 oneOf 分支里每种动作（form）的合法目标：{动作: 目标}。"""
+        moves = {}
+        for branch in schema.get("parameters", {}).get("oneOf", []):
+            properties = branch.get("properties", {})
+            for form in properties.get("form", {}).get("enum", []):
+                moves[form] = list(properties.get("target", {}).get("enum", []))
+        return moves
+
+    def _candidates(self, messages: Sequence[LLMMessage], schema: ToolSchema) -> list:
+        """合法目标：工具 schema 里的 enum；没有 enum 时取消息里最近一份存活名单，去掉自己和狼人队友。"""
+        if self._enum(schema, "target"):
+            return self._enum(schema, "target")
+
+        alive = []
+        for message in reversed(messages):
+            listed = re.findall(r"存活：([^。\n]+)", _message_text(message))
+            if listed:
+                alive = re.findall(r"\bP\d+\b", listed[-1])
+                break
+        system_text = " ".join(_message_text(m) for m in messages if isinstance(m, SystemMessage))
+        me = re.search(r"你是座位 (P\d+)", system_text)
+        excluded = {me.group(1)} if me else set()
+        if schema["name"] == "extract_memory":
+            teammates = re.search(r"你的狼人队友是：([^。]+)", system_text)
+            if teammates:
+                excluded |= set(re.findall(r"P\d+", teammates.group(1)))
+        return sorted(set(alive) - excluded, key=lambda seat: int(seat[1:]))
+
+    def _tool_arguments(self, rng: random.Random, messages: Sequence[LLMMessage], schema: ToolSchema):
+        candidates = self._candidates(messages, schema)
+        if schema["name"] == "laura_shift":
+            # 没有分支约束时，两种药都只能在合并的目标里选；schema 不带约束时两种药都会试
+            forms = self._enum(schema, "form") or ["heal", "poison"]
+            moves = self._moves(schema) or {form: candidates for form in forms}
+            if moves.get("heal") and rng.random() < 0.6:
+                return {"target": rng.choice(moves["heal"]), "form": "heal"}
+            if moves.get("poison") and rng.random() < 0.3:
+                return {"target": rng.choice(moves["poison"]), "form": "poison"}
+            return None
+        if not candidates:
+            return None
+        return {"target": rng.choice(candidates)}
+
+    def _select_speaker(self, rng: random.Random, text: str) -> Optional[str]:
+        match = re.search(r"select the next role from (\[.*?\])", text)
+        if not match:
+            return None
+        try:
+            names = json.loads(match.group(1).replace("'", '"'))
+        except json.JSONDecodeError:
+            names = re.findall(r"[\w-]+", match.group(1))
+        return rng.choice(names) if names else None
+
+    def _speak(self, rng: random.Random, messages: Sequence[LLMMessage]) -> str:
+        last = _message_text(messages[-1]) if messages else ""
+        speaker = self._select_speaker(rng, last)
+        if speaker:
+            return speaker
+        system_text = " ".join(_message_text(m) for m in messages if isinstance(m, SystemMessage))
+        if "Mr. Owl" in system_text:
+            return rng.choice(GOD_TEMPLATES)
+        me = re.search(r"你是座位 (P\d+)", system_text)
+        targets = [seat for seat in self._seats if not me or seat != me.group(1)]
+        return rng.choice(SPEECH_TEMPLATES).format(target=rng.choice(targets))
+
+    def _respond(self, rng: random.Random, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema]):
+        schemas = [_tool_schema(tool) for tool in tools]
+        schema = self._pending_tool(messages, schemas) if schemas else None
+        arguments = self._tool_arguments(rng, messages, schema) if schema else None
+        prompt_tokens = self.count_tokens(messages, tools=tools)
+        if arguments is not None:
+            raw = json.dumps(arguments, ensure_ascii=False)
+            content = [FunctionCall(id=f"call_{rng.getrandbits(48):012x}", name=schema["name"], arguments=raw)]
+            finish_reason = "function_calls"
+            completion_tokens = estimate_tokens(schema["name"] + raw)
+            self.stats["tool_calls"] += 1
+        elif schema and any("PASS" in _message_text(m) for m in messages[-3:]):
+            # 点名了工具但决定不行动，任务允许时明确放弃
+            content = "PASS"
+            finish_reason = "stop"
+            completion_tokens = 1
+        else:
+            content = self._speak(rng, messages)
+            finish_reason = "stop"
+            completion_tokens = estimate_tokens(content)
+        self._cur_usage = RequestUsage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        self._total_usage = RequestUsage(
+            prompt_tokens=self._total_usage.prompt_tokens + prompt_tokens,
+            completion_tokens=self._total_usage.completion_tokens + completion_tokens,
+        )
+        return CreateResult(finish_reason=finish_reason, content=content, usage=self._cur_usage, cached=False)
+
+    # --- ChatCompletionClient 接口 ---
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        self.stats["calls"] += 1
+        rng = self._request_rng(messages, tools)
+        await self._wait_or_fail(rng)
+        return self._respond(rng, messages, tools)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        tool_choice: Any = "auto",
+        json_output: Optional[Any] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        self.stats["calls"] += 1
+        rng = self._request_rng(messages, tools)
+        await self._wait_or_fail(rng)
+        result = self._respond(rng, messages, tools)
+        if isinstance(result.content, str):
+            text = result.content
+            for index in range(0, len(text), 8):
+                yield text[index:index + 8]
+                if index == 0 and rng.random() < self._stream_break_rate:
+                    self.stats["stream_breaks"] += 1
+                    raise openai.APIConnectionError(message="mock stream dropped", request=httpx.Request("POST", MOCK_URL))
+                await asyncio.sleep(self._chunk_delay)
+        yield result
+
+    async def close(self) -> None:
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._cur_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        total = sum(estimate_tokens(_message_text(message)) + 4 for message in messages)
+        total += sum(estimate_tokens(json.dumps(_tool_schema(tool), ensure_ascii=False)) for tool in tools)
+        return total
+
+    def remaining_tokens(self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []) -> int:
+        return max(0, self._max_tokens - self.count_tokens(messages, tools=tools))
+
+    @property
+    def capabilities(self):  # type: ignore
+        return self._model_info
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self._model_info
@@ -0,0 +1,83 @@
+"""规则驱动的主持人。
+
+Mr_Owl 在夜晚小组和白天广场里只是复述代码已经知道的事：目标定了没有、谁还没投票。
+ModeratorAgent 直接读本局的 GameState 套模板发言，不调用模型。
+需要锈湖风格的叙事时，build_table(llm_god=True) 仍可换回模型驱动的上帝。
+"""
+from typing import Sequence
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import BaseChatMessage, TextMessage
+from autogen_core import CancellationToken
+
+import rules
+from terminations import PASS_WORD
+
+GOD_NAME = "Mr_Owl"
+GOD_DESCRIPTION = "上帝 Mr. Owl，主持夜晚、计票和判定，不参与推理。"
+
+
+def _wolf(state: rules.GameState) -> str:
+    if state.kill is None:
+        return "湖面还在等。商定一个存活的好人，由一人执行 extract_memory。"
+    return f"献祭目标已记下：{state.kill}。夜色合拢。"
+
+
+def _ida(state: rules.GameState) -> str:
+    return "水晶球只回应一次。选择一名存活者，使用 gaze_into_crystal。"
+
+
+def _laura(state: rules.GameState) -> str:
+    if state.protected:
+        return f"白光落在 {state.protected} 身上。"
+    if state.poisoned:
+        return f"毒已经下了：{state.poisoned}。"
+    if state.kill is None:
+        return f"今夜没有献祭。可以用 laura_shift 毒人，不行动则回复 {PASS_WORD}。"
+    return f"今夜被献祭的目标是 {state.kill}。救人或毒人用 laura_shift，不行动则回复 {PASS_WORD}。"
+
+
+def _mary(state: rules.GameState) -> str:
+    if state.cursed:
+        return f"诅咒已经落下：{state.cursed}。"
+    return "选择一名存活者，使用 mary_curse 追加一票诅咒。"
+
+
+def _day_debate(state: rules.GameState) -> str:
+    return f"发言到此为止。存活：{', '.join(rules.alive_players(state))}。接下来密封投票，每人一票。"
+
+
+def _day_debate_group(state: rules.GameState) -> str:
+    return "本组发言到此为止。下一组接着发言，全部发言结束后才密封投票。"
+
+
+# 各阶段的模板；键与 main.NIGHT_PHASES 的阶段名和 "day_debate" 一致，
+# "day_debate_group" 是大桌分组辩论里非最后一组的收尾。
+ANNOUNCEMENTS = {
+    "wolf": _wolf,
+    "ida": _ida,
+    "laura": _laura,
+    "mary": _mary,
+    "day_debate": _day_debate,
+    "day_debate_group": _day_debate_group,
+}
+
+
+class ModeratorAgent(BaseChatAgent):
+    """按阶段模板播报 GameState 的主持人，零模型调用。"""
+
+    def __init__(self, state: rules.GameState, phase: str, name: str = GOD_NAME):
+        super().__init__(name=name, description=GOD_DESCRIPTION)
+        self._state = state
+        self._announce = ANNOUNCEMENTS[phase]
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage,)
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        return Response(chat_message=TextMessage(source=self.name, content=self._announce(self._state)))
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        pass
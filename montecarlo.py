@@ -0,0 +1,288 @@
+"""批量规则模拟：用 NumPy 数组同时推进成千上万局纯脚本对局，不调用模型。
+
+每局的状态按列存放：
+- alive / dark：[局数, 座位] 的布尔矩阵（存活掩码、阵营）；
+- role：[局数, 座位] 的身份编号，0 为狼人，其余为 roles.LIGHT_ROLES 的下标 + 1；
+- heal_used / poison_used：[局数] 的药剂标记；cursed：[局数] 的被诅咒座位，-1 表示没有；
+- votes：[局数, 座位] 的投票矩阵，值为目标座位，-1 表示没投。
+
+夜晚与白天结算逐条对应 rules.resolve_night / rules.resolve_day：献祭未被救回才死、毒杀总会生效、
+诅咒只给存活目标加一票、最高票唯一才放逐、平票无人出局。行动选择与 policies.ScriptedPolicy 同分布。
+cross_check 把同一批决策逐局喂给标量的 rules 函数，逐步比对死亡、票型、放逐、存活和胜负。
+
+    python montecarlo.py --games 1000000
+    python montecarlo.py --games 1000000 --no-curse   # 对比乌鸦诅咒对胜率的影响
+    python montecarlo.py --check 2000                 # 与 rules 逐局交叉校验
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import rules
+from roles import LIGHT_ROLES, WOLF_ROLE
+
+# 身份编号：0 为狼人，i 为 LIGHT_ROLES[i - 1]
+ROLE_NAMES = [WOLF_ROLE["role_name"]] + [role["role_name"] for role in LIGHT_ROLES]
+WITCH = 1 + [role["role_id"] for role in LIGHT_ROLES].index("witch")
+CROW = 1 + [role["role_id"] for role in LIGHT_ROLES].index("crow")
+
+# winner 数组的取值
+ONGOING, LIGHT, DARK = 0, 1, 2
+WINNER_NAMES = {LIGHT: "light", DARK: "dark"}
+
+
+def deal_layouts(rng: np.random.Generator, games: int) -> np.ndarray:
+    """与 roles.build_standard_role_pool 同分布：2 狼 + 随机 4 张好人身份牌，整体洗牌。"""
+    light = np.argsort(rng.random((games, len(LIGHT_ROLES))), axis=1)[:, :4] + 1
+    pool = np.concatenate([np.zeros((games, 2), dtype=light.dtype), light], axis=1)
+    order = np.argsort(rng.random(pool.shape), axis=1)
+    return np.take_along_axis(pool, order, axis=1).astype(np.int8)
+
+
+def random_choice(rng: np.random.Generator, mask: np.ndarray) -> np.ndarray:
+    """每行在 mask 为真的列里等概率选一个，返回列下标；整行都为假时返回 -1。"""
+    keys = np.where(mask, rng.random(mask.shape), -1.0)
+    choice = keys.argmax(axis=-1)
+    return np.where(mask.any(axis=-1), choice, -1)
+
+
+class BatchState:
+    """games 局同时进行的规则状态，字段含义见模块说明。"""
+
+    def __init__(self, roles: np.ndarray):
+        games, seats = roles.shape
+        self.role = roles
+        self.dark = roles == 0
+        self.alive = np.ones((games, seats), dtype=bool)
+        self.heal_used = np.zeros(games, dtype=bool)
+        self.poison_used = np.zeros(games, dtype=bool)
+        self.cursed = np.full(games, -1)
+        self.winner = np.full(games, ONGOING, dtype=np.int8)
+        # 已经开始的夜晚数，与 main.rounds_played 的口径一致
+        self.rounds = np.zeros(games, dtype=np.int32)
+
+    @property
+    def games(self) -> int:
+        return self.role.shape[0]
+
+    def seat_of(self, role_id: int) -> np.ndarray:
+        """每局里持有该身份的座位，没有时为 -1。"""
+        present = self.role == role_id
+        return np.where(present.any(axis=1), present.argmax(axis=1), -1)
+
+    def is_alive(self, seats: np.ndarray) -> np.ndarray:
+        rows = np.arange(self.games)
+        return (seats >= 0) & self.alive[rows, np.maximum(seats, 0)]
+
+
+def update_winner(state: BatchState, active: np.ndarray):
+    """对应 rules.winner：狼人全灭好人胜，狼人数不少于好人数狼人胜。只更新 active 的局。"""
+    dark_alive = (state.alive & state.dark).sum(axis=1)
+    light_alive = (state.alive & ~state.dark).sum(axis=1)
+    winner = np.where(dark_alive == 0, LIGHT, np.where(dark_alive >= light_alive, DARK, ONGOING))
+    state.winner = np.where(active & (state.winner == ONGOING), winner, state.winner).astype(np.int8)
+
+
+def resolve_night(state: BatchState, active, kill, protected, poison) -> np.ndarray:
+    """对应 rules.resolve_night，返回本夜死亡掩码 [局数, 座位]。kill / protected / poison 为座位下标，-1 表示无。"""
+    rows = np.arange(state.games)
+    deaths = np.zeros_like(state.alive)
+    wolf_hits = active & (kill >= 0) & (kill != protected)
+    deaths[rows[wolf_hits], kill[wolf_hits]] = True
+    poisoned = active & (poison >= 0)
+    deaths[rows[poisoned], poison[poisoned]] = True
+    deaths &= state.alive
+    state.alive &= ~deaths
+    return deaths
+
+
+def resolve_day(state: BatchState, active, votes):
+    """对应 rules.resolve_day，返回 (票型 [局数, 座位], 放逐座位 [局数]，-1 表示无人)。"""
+    games, seats = state.alive.shape
+    rows = np.arange(games)
+    tally = np.zeros((games, seats), dtype=np.int32)
+    voted = active[:, None] & (votes >= 0)
+    np.add.at(tally, (np.broadcast_to(rows[:, None], votes.shape)[voted], votes[voted]), 1)
+    cursed_alive = active & state.is_alive(state.cursed)
+    tally[rows[cursed_alive], state.cursed[cursed_alive]] += 1
+
+    top = tally.max(axis=1)
+    unique_top = (tally == top[:, None]).sum(axis=1) == 1
+    eliminated = np.where(active & (top > 0) & unique_top, tally.argmax(axis=1), -1)
+    hit = eliminated >= 0
+    state.alive[rows[hit], eliminated[hit]] = False
+    state.cursed = np.where(active, -1, state.cursed)
+    return tally, eliminated
+
+
+# --- 与 ScriptedPolicy 同分布的批量行动选择 ---
+
+
+def choose_night_kill(rng, state: BatchState, active):
+    return np.where(active, random_choice(rng, state.alive & ~state.dark), -1)
+
+
+def choose_laura(rng, state: BatchState, active, kill):
+    """返回 (是否救人, 毒杀目标)。先以 1/2 概率救回献祭目标，不救时以 1/5 概率毒杀一名其他存活者。"""
+    games, seats = state.alive.shape
+    witch = state.seat_of(WITCH)
+    acting = active & state.is_alive(witch)
+    heal = acting & (kill >= 0) & ~state.heal_used & (rng.random(games) < 0.5)
+    others = state.alive & (np.arange(seats)[None, :] != witch[:, None])
+    may_poison = acting & ~heal & ~state.poison_used & others.any(axis=1)
+    poison = np.where(may_poison & (rng.random(games) < 0.2), random_choice(rng, others), -1)
+    state.heal_used |= heal
+    state.poison_used |= poison >= 0
+    return heal, poison
+
+
+def choose_curse(rng, state: BatchState, active):
+    seats = state.alive.shape[1]
+    crow = state.seat_of(CROW)
+    acting = active & state.is_alive(crow)
+    others = state.alive & (np.arange(seats)[None, :] != crow[:, None])
+    return np.where(acting, random_choice(rng, others), -1)
+
+
+def choose_votes(rng, state: BatchState, active):
+    """每个存活座位投一票：只投其他存活者；狼人优先投好人，没有好人可投时投任意其他人。"""
+    games, seats = state.alive.shape
+    others = state.alive[:, None, :] & ~np.eye(seats, dtype=bool)[None, :, :]
+    light_others = others & ~state.dark[:, None, :]
+    prefer_light = state.dark[:, :, None] & light_others.any(axis=2, keepdims=True)
+    options = np.where(prefer_light, light_others, others)
+    votes = random_choice(rng, options)
+    return np.where(active[:, None] & state.alive, votes, -1)
+
+
+def simulate(games: int, seed: int = 0, curse: bool = True, max_rounds: int = 20, trace=None) -> BatchState:
+    """推进 games 局直到全部分出胜负（或达到 max_rounds），返回最终状态。
+
+    trace(step, state, **arrays) 在每次夜晚 / 白天结算后被调用，arrays 是本步的决策与结果，供交叉校验使用。
+    """
+    rng = np.random.default_rng(seed)
+    state = BatchState(deal_layouts(rng, games))
+    update_winner(state, np.ones(games, dtype=bool))
+    for _ in range(max_rounds):
+        active = state.winner == ONGOING
+        if not active.any():
+            break
+        state.rounds += active
+        # 夜晚：狼人献祭、女巫用药、乌鸦诅咒；预言家的查验不改变胜负相关的状态
+        kill = choose_night_kill(rng, state, active)
+        heal, poison = choose_laura(rng, state, active, kill)
+        if curse:
+            cursed = choose_curse(rng, state, active)
+            state.cursed = np.where(cursed >= 0, cursed, state.cursed)
+        else:
+            cursed = np.full(games, -1)
+        protected = np.where(heal, kill, -1)
+        deaths = resolve_night(state, active, kill, protected, poison)
+        update_winner(state, active)
+        if trace:
+            trace("night", state, active=active, kill=kill, heal=heal, poison=poison, cursed=cursed, deaths=deaths)
+
+        # 白天：全员投票后结算
+        active = state.winner == ONGOING
+        votes = choose_votes(rng, state, active)
+        tally, eliminated = resolve_day(state, active, votes)
+        update_winner(state, active)
+        if trace:
+            trace("day", state, active=active, votes=votes, tally=tally, eliminated=eliminated)
+    return state
+
+
+def summarize(state: BatchState) -> dict:
+    finished = state.winner != ONGOING
+    # 6 人局从 5 张好人牌里抽 4 张，布局由缺的那张牌决定
+    layouts = {}
+    for index, role in enumerate(LIGHT_ROLES, start=1):
+        missing = ~(state.role == index).any(axis=1)
+        if missing.any():
+            layouts[f"无{role['role_name']}"] = round(float((state.winner[missing] == LIGHT).mean()), 4)
+    return {
+        "games": int(state.games),
+        "unfinished": int((~finished).sum()),
+        "light_win_rate": round(float((state.winner == LIGHT).mean()), 4),
+        "dark_win_rate": round(float((state.winner == DARK).mean()), 4),
+        "avg_rounds": round(float(state.rounds[finished].mean()), 3) if finished.any() else 0,
+        "light_win_rate_by_layout": layouts,
+    }
+
+
+def cross_check(games: int = 2000, seed: int = 0, curse: bool = True) -> dict:
+    """用同一批决策逐局驱动标量 rules，逐步比对结算结果，返回比对次数和不一致的记录。"""
+    scalar = {}
+    mismatches = []
+    checks = {"night": 0, "day": 0}
+
+    def _names(state: BatchState, game: int):
+        return [f"P{seat + 1}" for seat in range(state.alive.shape[1])]
+
+    def _compare(step, game, field, batch_value, scalar_value):
+        if batch_value != scalar_value:
+            mismatches.append({"step": step, "game": game, "field": field, "batch": batch_value, "scalar": scalar_value})
+
+    def _trace(step, state: BatchState, active, **arrays):
+        for game in np.flatnonzero(active):
+            names = _names(state, game)
+            if game not in scalar:
+                scalar[game] = rules.GameState(
+                    alive_players=names,
+                    player_teams={name: "dark" if dark else "light" for name, dark in zip(names, state.dark[game])},
+                )
+            s = scalar[game]
+            if step == "night":
+                rules.start_night(s)
+                if arrays["kill"][game] >= 0:
+                    rules.set_night_kill(s, names[arrays["kill"][game]])
+                if arrays["heal"][game]:
+                    rules.set_protected_target(s, s.night_kill)
+                if arrays["poison"][game] >= 0:
+                    rules.set_poison_target(s, names[arrays["poison"][game]])
+                if arrays["cursed"][game] >= 0:
+                    rules.set_cursed_player(s, names[arrays["cursed"][game]])
+                deaths = rules.resolve_night(s)
+                _compare(step, game, "deaths", sorted(names[i] for i in np.flatnonzero(arrays["deaths"][game])), sorted(deaths))
+            else:
+                rules.start_day(s)
+                for voter, target in enumerate(arrays["votes"][game]):
+                    if target >= 0:
+                        rules.record_vote(s, names[voter], names[target])
+                eliminated, tally = rules.resolve_day(s)
+                batch_tally = {names[i]: int(count) for i, count in enumerate(arrays["tally"][game]) if count}
+                _compare(step, game, "tally", batch_tally, tally)
+                batch_eliminated = names[arrays["eliminated"][game]] if arrays["eliminated"][game] >= 0 else None
+                _compare(step, game, "eliminated", batch_eliminated, eliminated)
+            _compare(step, game, "alive", [names[i] for i in np.flatnonzero(state.alive[game])], list(rules.alive_players(s)))
+            _compare(step, game, "winner", WINNER_NAMES.get(int(state.winner[game])), rules.winner(s))
+            checks[step] += 1
+
+    simulate(games, seed=seed, curse=curse, trace=_trace)
+    return {"checks": checks, "mismatches": len(mismatches), "examples": mismatches[:5]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量规则模拟（纯脚本，不调用模型）")
+    parser.add_argument("--games", type=int, default=100000, help="模拟的局数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-curse", action="store_true", help="关闭乌鸦诅咒，对比它对胜率的影响")
+    parser.add_argument("--check", type=int, metavar="GAMES", help="改为与 rules 逐局交叉校验这么多局")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        report = cross_check(args.check, seed=args.seed, curse=not args.no_curse)
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+        raise SystemExit(1 if report["mismatches"] else 0)
+
+    started = time.perf_counter()
+    state = simulate(args.games, seed=args.seed, curse=not args.no_curse)
+    summary = summarize(state)
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
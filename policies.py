@@ -0,0 +1,40 @@
+import random
+
+import rules
+
+
+class ScriptedPolicy:
+    """不调用模型的脚本座位：只在规则允许的目标里做简单随机选择。"""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def _others(self, state: rules.GameState, seat: str):
+        return [name for name in rules.alive_players(state) if name != seat]
+
+    def choose_night_kill(self, state: rules.GameState, seat: str):
+        options = [name for name in rules.alive_players(state) if state.player_teams.get(name) != "dark"]
+        return self.rng.choice(options) if options else None
+
+    def choose_inspect(self, state: rules.GameState, seat: str):
+        options = self._others(state, seat)
+        return self.rng.choice(options) if options else None
+
+    def choose_laura(self, state: rules.GameState, seat: str):
+        """返回 (form, target)，不行动时返回 (None, None)。"""
+        if state.kill and not state.laura_used_heal and self.rng.random() < 0.5:
+            return "heal", state.kill
+        options = self._others(state, seat)
+        if options and not state.laura_used_poison and self.rng.random() < 0.2:
+            return "poison", self.rng.choice(options)
+        return None, None
+
+    def choose_curse(self, state: rules.GameState, seat: str):
+        options = self._others(state, seat)
+        return self.rng.choice(options) if options else None
+
+    def choose_vote(self, state: rules.GameState, seat: str):
+        options = self._others(state, seat)
+        if state.player_teams.get(seat) == "dark":
+            options = [name for name in options if state.player_teams.get(name) != "dark"] or options
+        return self.rng.choice(options) if options else None
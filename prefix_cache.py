@@ -0,0 +1,61 @@
+"""输入 token 的估算与前缀缓存模拟。
+
+autogen 的 RequestUsage 只有 prompt/completion 两项，拿不到提供方返回的缓存命中数，
+这里在客户端一侧按提供方的前缀缓存规则做估算。
+"""
+import hashlib
+import json
+import math
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符各算 1 个，其余字符约 4 个算 1 个。"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "　" <= ch <= "鿿" or "＀" <= ch <= "￯")
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def request_text(messages, tools=()) -> str:
+    """把一次请求按发送顺序拼成文本，用来比较请求之间的公共前缀。"""
+    parts = []
+    for message in messages:
+        content = message.content
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        parts.append(f"<{type(message).__name__}:{getattr(message, 'source', '')}>{content}")
+    for tool in tools:
+        schema = tool.schema if hasattr(tool, "schema") else tool
+        parts.append(json.dumps(schema, ensure_ascii=False, sort_keys=True))
+    return "\n".join(parts)
+
+
+class PrefixCacheEstimator:
+    """模拟提供方的前缀缓存，估算每次请求里能命中缓存的输入 token。
+
+    请求文本按固定长度切块，逐块做链式哈希；开头连续命中过的块视为缓存命中。
+    命中长度不足 min_tokens 时按未命中计，与常见提供方的规则一致。
+    """
+
+    def __init__(self, block_chars: int = 128, min_tokens: int = 1024, max_blocks: int = 200000):
+        self._block_chars = block_chars
+        self._min_tokens = min_tokens
+        self._max_blocks = max_blocks
+        self._seen = set()
+
+    def observe(self, text: str) -> int:
+        """记录一次请求，返回估算的缓存命中 token 数。"""
+        chain = hashlib.sha256()
+        cached_chars = 0
+        hit = True
+        for start in range(0, len(text) - self._block_chars + 1, self._block_chars):
+            chain.update(text[start:start + self._block_chars].encode())
+            key = chain.digest()
+            if hit and key in self._seen:
+                cached_chars = start + self._block_chars
+            else:
+                hit = False
+                if len(self._seen) < self._max_blocks:
+                    self._seen.add(key)
+        cached = estimate_tokens(text[:cached_chars])
+        return cached if cached >= self._min_tokens else 0
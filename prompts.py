@@ -0,0 +1,114 @@
+"""系统提示词的编排与缓存。
+
+提供方的自动前缀缓存只命中逐字节相同的开头，所以所有提示词都按“越共享越靠前”排列：
+1. 锈湖风格块，所有 Agent 完全相同；
+2. 玩家通用守则；
+3. 身份与人设，同一身份牌的座位相同；
+4. 座位号、狼队友等每个座位独有的信息，放在最后。
+
+身份层按 role/persona 编译一次并缓存，token 数也一并缓存。
+"""
+from functools import lru_cache
+
+from config import RUSTY_STYLE
+from personas import get_role_persona
+from prefix_cache import estimate_tokens
+import rules
+
+
+# 所有提示词共享的开头，末尾统一带一个换行，保证后续拼接不改变这一段的字节。
+STYLE_PREFIX = RUSTY_STYLE.strip() + "\n"
+
+PLAYER_CODE = "你要像真实狼人杀玩家一样发言、推理、误导、自保和投票，不要把自己当成助手。"
+
+
+@lru_cache(maxsize=None)
+def prompt_tokens(text: str) -> int:
+    return estimate_tokens(text)
+
+
+@lru_cache(maxsize=None)
+def compile_role_prompt(role_name: str, team: str, desc: str) -> str:
+    """风格块 + 通用守则 + 身份人设。同一身份牌的所有座位共用这一段。"""
+    persona = get_role_persona(role_name)
+    return STYLE_PREFIX + "\n".join([
+        PLAYER_CODE,
+        f"你的身份是【{role_name}】。阵营：{team}。{desc}",
+        f"你的个体底色：{persona['persona']}",
+        f"你的行为原则：{persona['behavior']}",
+    ])
+
+
+def build_player_prompt(seat_no: str, role_info: dict, teammates=None) -> str:
+    prompt_lines = [
+        compile_role_prompt(role_info["role_name"], role_info["team"], role_info["desc"]),
+        f"你是座位 {seat_no}。",
+    ]
+    if teammates:
+        prompt_lines.append(
+            f"你的狼人队友是：{', '.join(teammates)}。夜晚请在密谈中合谋，并由其中一人执行工具。"
+        )
+    return "\n".join(prompt_lines)
+
+
+@lru_cache(maxsize=None)
+def build_god_prompt() -> str:
+    return STYLE_PREFIX + "你是上帝 Mr. Owl。负责主持夜晚、计票和判定。"
+
+
+def _one_line(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def recent_speeches(transcript, window: int | None = None, line_chars: int = 48) -> str:
+    """当日发言记录：最近 window 条保留原文，更早的每条截成 line_chars 字的一行；window 为空表示全部原文。"""
+    if not transcript:
+        return "（今天没有人发言）"
+    if not window or len(transcript) <= window:
+        return "\n".join(transcript)
+    older = [_one_line(line, line_chars) for line in transcript[:-window]]
+    return "\n".join([*older, *transcript[-window:]])
+
+
+def speech_digest(transcript, window: int | None = None, line_chars: int = 48) -> str:
+    """给后面发言组的前情：最近 window 条发言，每条截成一行；window 为空表示全部。"""
+    lines = transcript[-window:] if window else transcript
+    skipped = len(transcript) - len(lines)
+    head = [f"（更早的 {skipped} 条略）"] if skipped else []
+    return "\n".join(head + [_one_line(line, line_chars) for line in lines])
+
+
+def build_ballot_task(transcript, options, window: int | None = None) -> str:
+    """密封投票的任务：冻结的当日发言 + 可投目标。发言记录放在前面，各座位共用同一段。"""
+    lines = recent_speeches(transcript, window)
+    return f"今天的发言记录：\n{lines}\n\n现在密封投票。只调用 cast_vote，从 {', '.join(options)} 中选择一名。"
+
+
+def build_private_knowledge(state: rules.GameState, seat_no: str, role_info: dict, teammates=None) -> str:
+    """只有这个座位知道的信息，每次请求时按 GameState 现算，不会被上下文折叠掉。"""
+    lines = []
+    if role_info["role_id"] == "seer" and state.inspections:
+        lines.append("你查验过：" + "；".join(f"{target} 属于 {team}" for target, team in state.inspections) + "。")
+    if role_info["role_id"] == "witch":
+        heal = "已用" if state.laura_used_heal else "未用"
+        poison = "已用" if state.laura_used_poison else "未用"
+        lines.append(f"解药{heal}，毒药{poison}。")
+    if teammates:
+        alive = [name for name in teammates if rules.is_alive(state, name)]
+        lines.append(f"存活的狼人队友：{', '.join(alive)}。" if alive else "你的狼人队友都已出局。")
+    return "\n".join(lines)
+
+
+def build_public_record(state: rules.GameState, history) -> str:
+    """所有人都看得到的事实：每夜死亡、每天票型与放逐、当前存活。"""
+    lines = []
+    for day in history:
+        deaths = ", ".join(day["night_deaths"]) or "无人"
+        lines.append(f"第 {day['round']} 夜出局：{deaths}。")
+        if day.get("tally"):
+            tally = " / ".join(f"{target}:{count}" for target, count in sorted(day["tally"].items()))
+            lines.append(f"第 {day['round']} 天票型：{tally}，放逐：{day['eliminated'] or '无人'}。")
+    if lines:
+        lines.append(f"当前存活：{', '.join(rules.alive_players(state))}。")
+    return "\n".join(lines)
@@ -0,0 +1,213 @@
+"""模型调用的自适应限流。
+
+- RPM / TPM 两个令牌桶，请求按估算 token 预扣，拿到实际用量后再多退少补；
+- 429 / 5xx 带的 Retry-After、retry-after-ms、x-ratelimit-reset-* 头决定冷却多久，
+  冷却期间所有请求一起等，而不是各自盲目退避；
+- 并发上限按 AIMD 调整：每成功约一个窗口的请求加 1，遇到 429 减半。
+"""
+import asyncio
+import email.utils
+import random
+import re
+import time
+import weakref
+from typing import Optional
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(raw) -> Optional[float]:
+    """解析 "1.5"、"200ms"、"6m0s" 这类时长，单位秒；无法识别时返回 None。"""
+    if raw is None:
+        return None
+    raw = str(raw).strip()
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        pass
+    parts = _DURATION.findall(raw)
+    if not parts or "".join(f"{n}{u}" for n, u in parts) != raw:
+        return None
+    return sum(float(number) * _UNITS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(error) -> Optional[float]:
+    """从错误响应头里读出服务端建议的等待时间。"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        delay = parse_duration(headers["retry-after-ms"])
+        if delay is not None:
+            return delay / 1000
+    raw = headers.get("retry-after")
+    if raw:
+        delay = parse_duration(raw)
+        if delay is None:
+            try:
+                delay = max(0.0, email.utils.parsedate_to_datetime(raw).timestamp() - time.time())
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return delay
+    resets = [
+        parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+        for kind in ("requests", "tokens")
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0"
+    ]
+    resets = [delay for delay in resets if delay is not None]
+    return max(resets) if resets else None
+
+
+class TokenBucket:
+    """每分钟补充 per_minute 个令牌，最多攒 burst 个；per_minute <= 0 表示不限。"""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.per_minute = per_minute
+        self._rate = per_minute / 60
+        self._capacity = burst or per_minute
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """还要等多少秒才够 amount 个令牌。超过桶容量的请求只要求桶是满的。"""
+        if self.per_minute <= 0:
+            return 0.0
+        self._refill()
+        missing = min(amount, self._capacity) - self._tokens
+        return max(0.0, missing / self._rate)
+
+    def take(self, amount: float):
+        """扣掉 amount 个令牌；amount 为负是退还多扣的部分，最多退到桶满。"""
+        if self.per_minute > 0:
+            self._refill()
+            self._tokens = min(self._capacity, self._tokens - amount)
+
+    def drain(self):
+        """服务端已经限流时清空余量，避免冷却结束后一口气把攒下的令牌用掉。"""
+        if self.per_minute > 0:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+
+class AdaptiveRateLimiter:
+    """RPM/TPM 令牌桶 + 服务端冷却 + AIMD 并发上限。"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        min_concurrency: int = 1,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        jitter: float = 0.2,
+        rng: Optional[random.Random] = None,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._jitter = max(0.0, jitter)
+        self._rng = rng or random.Random()
+        self._cooldown_until = 0.0
+        self._last_decrease = 0.0
+        # 每个事件循环一把锁：模块级的限流器会被多次 asyncio.run 复用（bench、批量对局的进程）
+        self._gates = weakref.WeakKeyDictionary()
+        self._waiters = []
+        self.stats = {"rate_limited": 0, "decreases": 0, "increases": 0, "throttled_seconds": 0.0}
+
+    def load(self) -> float:
+        """占用和排队的请求相对并发上限的比例；冷却中的限流器视为满载。"""
+        busy = (self.in_flight + len(self._waiters)) / self.limit
+        return busy + (1.0 if self._cooldown_until > time.monotonic() else 0.0)
+
+    def _gate(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        gate = self._gates.get(loop)
+        if gate is None:
+            gate = self._gates[loop] = asyncio.Lock()
+        return gate
+
+    def _wake(self):
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    async def acquire(self, cost: float = 0) -> float:
+        """拿到一个并发名额并扣掉 1 个请求和 cost 个 token，返回开始时刻。"""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                # 排队时被取消的请求不能继续算在 load() 里
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+        try:
+            # 串行通过令牌桶，先来的请求先拿到额度
+            async with self._gate():
+                while True:
+                    wait = max(
+                        self._cooldown_until - time.monotonic(),
+                        self._requests.delay(1),
+                        self._tokens.delay(cost),
+                    )
+                    if wait <= 0:
+                        break
+                    self.stats["throttled_seconds"] += wait
+                    await asyncio.sleep(wait)
+                self._requests.take(1)
+                self._tokens.take(cost)
+        except BaseException:
+            self.release()
+            raise
+        return time.monotonic()
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def on_success(self, token_correction: float = 0):
+        """加性增：大约每成功 limit 次，并发上限加 1。token_correction 为实际用量与预扣之差。"""
+        self._tokens.take(token_correction)
+        if self.limit < self.max_concurrency:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.stats["increases"] += 1
+            self._wake()
+
+    def on_rate_limited(self, error, started: float):
+        """乘性减：并发上限减半，并按响应头设置所有请求共用的冷却时间。"""
+        self.stats["rate_limited"] += 1
+        # 同一轮拥塞里，比上次减半更早发出的请求不再重复减半
+        if started >= self._last_decrease:
+            self.limit = max(self.min_concurrency, self.limit / 2)
+            self._last_decrease = time.monotonic()
+            self.stats["decreases"] += 1
+        self._requests.drain()
+        self._tokens.drain()
+        delay = retry_after_seconds(error)
+        if delay is not None:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+
+    def backoff(self, error, attempt: int, base_delay: float) -> float:
+        """重试前等待的秒数：有 Retry-After 就照办，否则指数退避，都加抖动。"""
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = base_delay * (2 ** attempt)
+            # equal jitter：至少等一半，另一半随机，避免并发请求同时重试
+            return delay / 2 + self._rng.uniform(0, delay / 2)
+        return self._with_jitter(delay)
+
+    def _with_jitter(self, delay: float) -> float:
+        return delay * (1 + self._rng.uniform(0, self._jitter))
@@ -1,50 +1,191 @@
+import copy
+from typing import Callable
+
+from autogen_core.tools import FunctionTool
+
 import rules
 
+# 工具 schema 带多少约束：off 不带，enum 给每个参数列出合法取值（默认），
+# branches 再把同一工具的几种动作写成 oneOf 分支。部分 OpenAI 兼容后端和 strict 模式不接受 parameters 顶层的 oneOf，
+# 会把整次调用判为错误，所以 branches 要显式打开（LLM_TOOL_SCHEMA=branches）。
+SCHEMA_MODES = ("off", "enum", "branches")
+_schema_mode = "enum"
+
+
+def set_schema_mode(mode: str):
+    global _schema_mode
+    if mode not in SCHEMA_MODES:
+        raise ValueError(f"未知的工具 schema 模式：{mode}，可选：{', '.join(SCHEMA_MODES)}")
+    _schema_mode = mode
+
 
-def extract_memory(target: str):
+def schema_mode() -> str:
+    return _schema_mode
+
+
+def extract_memory(state: rules.GameState, target: str):
     """【腐败灵魂】夜晚引诱一名存活的好人一起沉入锈湖。"""
-    ok, msg = rules.set_night_kill(target)
+    ok, msg = rules.set_night_kill(state, target)
     if not ok:
         return msg
     return f"【系统】：{target} 已被列为今夜的献祭目标。"
 
 
-def laura_shift(target: str, form: str):
+def laura_shift(state: rules.GameState, target: str, form: str):
     """【Laura】form 支持 heal/poison，可救回狼人目标或毒杀一名存活者。"""
     form = (form or "").strip().lower()
     if form in {"laura", "heal"}:
-        ok, msg = rules.set_protected_target(target)
+        ok, msg = rules.set_protected_target(state, target)
         if not ok:
             return msg
         return f"【繁花】：你守护了 {target}。"
 
     if form not in {"poison", "soul"}:
         return "未知的药剂形态。请使用 heal 或 poison。"
-    ok, msg = rules.set_poison_target(target)
+    ok, msg = rules.set_poison_target(state, target)
     if not ok:
         return msg
     return f"【腐败】：你杀掉了 {target}。"
 
 
-def gaze_into_crystal(target: str):
+def gaze_into_crystal(state: rules.GameState, target: str):
     """【Ida】查验一名存活玩家的阵营，结果只返回 light 或 dark。"""
-    ok, msg = rules.inspect_team(target)
+    ok, msg = rules.inspect_team(state, target)
     if not ok:
         return msg
     return f"【水晶球】：{target} 属于 {msg}。"
 
 
-def mary_curse(target: str):
+def mary_curse(state: rules.GameState, target: str):
     """【Mary】白天为一名存活玩家追加一票诅咒。"""
-    ok, msg = rules.set_cursed_player(target)
+    ok, msg = rules.set_cursed_player(state, target)
     if not ok:
         return msg
     return f"【天堂岛的诅咒】：诅咒已落在 {target} 身上。"
 
 
-def cast_vote(voter: str, target: str):
+def cast_vote(state: rules.GameState, voter: str, target: str):
     """白天投票。"""
-    ok, msg = rules.record_vote(voter, target)
+    ok, msg = rules.record_vote(state, voter, target)
     if not ok:
         return msg
     return f"【投票】：{voter} 把票投给了 {target}。"
+
+
+class LegalTargetTool(FunctionTool):
+    """参数 schema 里带上当前的合法取值（enum），模型只能在规则允许的目标里选。
+
+    enums 是无参函数，返回 {参数名: 合法取值}；每次请求读取 schema 时现算，目标随局势变化。
+    variants 可选，返回若干组 {参数名: 合法取值}，branches 模式下写成 oneOf 分支：同一个工具的几种动作各有各的
+    合法目标时，参数组合只能落在其中一个分支里（例如 Laura 的解药只能给今夜被献祭的人）。
+    """
+
+    def __init__(
+        self,
+        func,
+        name: str,
+        description: str,
+        enums: Callable[[], dict],
+        variants: Callable[[], list] | None = None,
+    ):
+        super().__init__(func, description=description, name=name)
+        self._enums = enums
+        self._variants = variants
+
+    @property
+    def schema(self):
+        schema = copy.deepcopy(super().schema)
+        if _schema_mode == "off":
+            return schema
+        properties = schema["parameters"]["properties"]
+        for param, values in self._enums().items():
+            # 没有合法取值时不加约束，空 enum 不是合法的 JSON Schema
+            if param in properties and values:
+                properties[param]["enum"] = list(values)
+        if self._variants and _schema_mode == "branches":
+            branches = [
+                {
+                    "properties": {param: {"enum": list(values)} for param, values in variant.items()},
+                    "required": list(variant),
+                }
+                for variant in self._variants()
+                if all(variant.values())
+            ]
+            if branches:
+                schema["parameters"]["oneOf"] = branches
+        return schema
+
+
+# 以下工厂把工具绑定到某一局的状态上，Agent 看到的签名里不含 state。
+
+
+def build_extract_memory_tool(state: rules.GameState):
+    def extract_memory_tool(target: str):
+        return extract_memory(state, target)
+
+    return LegalTargetTool(
+        extract_memory_tool,
+        "extract_memory",
+        extract_memory.__doc__,
+        lambda: {"target": rules.legal_targets(state, "night_kill")},
+    )
+
+
+def build_laura_shift_tool(state: rules.GameState):
+    def laura_shift_tool(target: str, form: str):
+        return laura_shift(state, target, form)
+
+    def enums():
+        heal = rules.legal_targets(state, "heal")
+        poison = rules.legal_targets(state, "poison")
+        return {
+            "target": list(dict.fromkeys(heal + poison)),
+            "form": (["heal"] if heal else []) + (["poison"] if poison else []),
+        }
+
+    def variants():
+        # 合并后的 enum 只说明目标在两种药的并集里，分支才约束“救谁 / 毒谁”
+        return [{"form": [form], "target": rules.legal_targets(state, form)} for form in ("heal", "poison")]
+
+    return LegalTargetTool(laura_shift_tool, "laura_shift", laura_shift.__doc__, enums, variants)
+
+
+def build_gaze_into_crystal_tool(state: rules.GameState):
+    def gaze_into_crystal_tool(target: str):
+        return gaze_into_crystal(state, target)
+
+    return LegalTargetTool(
+        gaze_into_crystal_tool,
+        "gaze_into_crystal",
+        gaze_into_crystal.__doc__,
+        lambda: {"target": rules.legal_targets(state, "inspect")},
+    )
+
+
+def build_mary_curse_tool(state: rules.GameState):
+    def mary_curse_tool(target: str):
+        return mary_curse(state, target)
+
+    return LegalTargetTool(
+        mary_curse_tool,
+        "mary_curse",
+        mary_curse.__doc__,
+        lambda: {"target": rules.legal_targets(state, "curse")},
+    )
+
+
+def vote_options(state: rules.GameState, voter_name: str):
+    """投票可选的目标：合法目标里去掉自己。"""
+    return [name for name in rules.legal_targets(state, "vote", voter_name) if name != voter_name]
+
+
+def build_vote_tool(state: rules.GameState, voter_name: str):
+    def cast_vote_tool(target: str):
+        return cast_vote(state, voter_name, target)
+
+    return LegalTargetTool(
+        cast_vote_tool,
+        "cast_vote",
+        "白天投票给一名存活玩家。示例：P3。",
+        lambda: {"target": vote_options(state, voter_name)},
+    )
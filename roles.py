@@ -6,11 +6,12 @@ import regis
 
 # `role_id` 是狼人杀规则身份。
 # `role_name` 是这张身份牌在锈湖世界里的化身名字。
+# `tools` 是工具工厂，开局时按桌绑定到该局的 GameState。
 WOLF_ROLE = {
     "role_id": "wolf",
     "role_name": "腐败灵魂",
     "team": "dark",
-    "tools": [regis.extract_memory],
+    "tools": [regis.build_extract_memory_tool],
     "desc": "狼人。目标杀光好人。",
 }
 
@@ -20,21 +21,21 @@ LIGHT_ROLES = [
         "role_id": "witch",
         "role_name": "Laura",
         "team": "light",
-        "tools": [regis.laura_shift],
+        "tools": [regis.build_laura_shift_tool],
         "desc": "女巫。",
     },
     {
         "role_id": "seer",
         "role_name": "Ida",
         "team": "light",
-        "tools": [regis.gaze_into_crystal],
+        "tools": [regis.build_gaze_into_crystal_tool],
         "desc": "预言家。",
     },
     {
         "role_id": "crow",
         "role_name": "Mary",
         "team": "light",
-        "tools": [regis.mary_curse],
+        "tools": [regis.build_mary_curse_tool],
         "desc": "乌鸦。",
     },
     {
@@ -54,9 +55,43 @@ LIGHT_ROLES = [
 ]
 
 
-def build_standard_role_pool():
-    """构造标准 6 人局身份池：2 狼 + 4 张随机好人身份牌。"""
-    role_pool = [deepcopy(WOLF_ROLE), deepcopy(WOLF_ROLE)]
-    role_pool.extend(deepcopy(role) for role in random.sample(LIGHT_ROLES, 4))
-    random.shuffle(role_pool)
+def get_role(role_name: str):
+    """按化身名取一张身份牌的副本，续跑时用来按存档重新发牌。"""
+    for role in [WOLF_ROLE, *LIGHT_ROLES]:
+        if role["role_name"] == role_name:
+            return deepcopy(role)
+    raise KeyError(role_name)
+
+
+# 各桌型的狼人数，好人补满其余座位。好人不超过 LIGHT_ROLES 张数时随机抽牌（标准 6 人局），
+# 更大的桌子发齐全部神职，剩下的座位都是平民。
+TABLE_LAYOUTS = {
+    6: {"wolves": 2},
+    9: {"wolves": 3},
+    12: {"wolves": 4},
+    18: {"wolves": 6},
+}
+
+
+def build_role_pool(player_count: int = 6, rng=None):
+    """按 TABLE_LAYOUTS 构造 player_count 人局的身份池，顺序已洗乱。"""
+    if player_count not in TABLE_LAYOUTS:
+        raise ValueError(f"不支持 {player_count} 人局，可选：{', '.join(map(str, TABLE_LAYOUTS))}")
+    rng = rng or random
+    wolves = TABLE_LAYOUTS[player_count]["wolves"]
+    lights = player_count - wolves
+    role_pool = [deepcopy(WOLF_ROLE) for _ in range(wolves)]
+    if lights <= len(LIGHT_ROLES):
+        role_pool.extend(deepcopy(role) for role in rng.sample(LIGHT_ROLES, lights))
+    else:
+        specials = [role for role in LIGHT_ROLES if role["role_id"] != "villager"]
+        villager = next(role for role in LIGHT_ROLES if role["role_id"] == "villager")
+        role_pool.extend(deepcopy(role) for role in specials)
+        role_pool.extend(deepcopy(villager) for _ in range(lights - len(specials)))
+    rng.shuffle(role_pool)
     return role_pool
+
+
+def build_standard_role_pool(rng=None):
+    """构造标准 6 人局身份池：2 狼 + 4 张随机好人身份牌。"""
+    return build_role_pool(6, rng)
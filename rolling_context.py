@@ -0,0 +1,171 @@
+"""有界的 Agent 上下文。
+
+AssistantAgent 默认把整局对话都带进每次请求，输入 token 随回合数和座位数一起增长。
+RollingSummaryContext 只保留最近 keep_last 条消息，更早的消息折叠成按发言者的摘要：
+每人发言几次、点到过哪些座位各几次、最近一句说了什么（截短）；自己的工具调用和结果逐条保留最近若干条。
+摘要的行数随座位数而不是回合数增长，早先的指认不会因为折叠被丢掉，只是失去原文措辞。
+私有信息（查验结果、药剂、狼队友存活情况）每次请求时现算，不会因为折叠而丢失。
+
+新发生的事件（死亡、票型、诅咒，见 events.EventFeed）在每次请求前以一条增量消息追加进来；
+折叠时这些事实原样并入“已知事件”，不截短也不计入摘要条数。
+
+折叠按批进行：消息攒到 keep_last + fold_every 条才折叠一次，两次折叠之间摘要不变，
+请求开头的字节保持稳定，提供方的前缀缓存仍能命中。
+"""
+import re
+from typing import Any, Callable, List, Mapping
+
+from autogen_core import FunctionCall
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    SystemMessage,
+    UserMessage,
+)
+
+# 增量事件消息的 source，折叠时据此把它们和普通发言区分开
+OBSERVATION_SOURCE = "events"
+OBSERVATION_TITLE = "【自你上次发言以来】"
+# 自己的发言在摘要里记在这个名字下
+SELF_SPEAKER = "我"
+
+_SEAT = re.compile(r"\bP\d+\b")
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def summarize_action(message: LLMMessage) -> str | None:
+    """自己的工具调用或工具结果压成一行；其他消息返回 None。"""
+    if isinstance(message, AssistantMessage) and isinstance(message.content, list):
+        calls = ", ".join(
+            f"{call.name}({_clip(call.arguments, 40)})" for call in message.content if isinstance(call, FunctionCall)
+        )
+        return f"我调用了 {calls}" if calls else None
+    if isinstance(message, FunctionExecutionResultMessage):
+        results = "；".join(_clip(result.content, 40) for result in message.content)
+        return f"工具结果：{results}" if results else None
+    return None
+
+
+def note_speech(digest: dict, speaker: str, text: str, line_chars: int = 48):
+    """把一条发言记进 digest：{发言者: {speeches, mentions: {座位: 次数}, last}}。"""
+    text = str(text)
+    entry = digest.setdefault(speaker, {"speeches": 0, "mentions": {}, "last": ""})
+    entry["speeches"] += 1
+    for seat in _SEAT.findall(text):
+        if seat != speaker:
+            entry["mentions"][seat] = entry["mentions"].get(seat, 0) + 1
+    entry["last"] = _clip(text, line_chars)
+
+
+def render_digest(digest: dict) -> List[str]:
+    """每个发言者一行：发言次数、点到的座位（多的在前）、最近一句。"""
+    lines = []
+    for speaker, entry in digest.items():
+        mentions = sorted(entry["mentions"].items(), key=lambda item: (-item[1], int(item[0][1:])))
+        named = "、".join(f"{seat}×{count}" if count > 1 else seat for seat, count in mentions)
+        line = f"{speaker}：发言 {entry['speeches']} 次"
+        if named:
+            line += f"，提到 {named}"
+        lines.append(f"{line}；最近：{entry['last']}")
+    return lines
+
+
+class RollingSummaryContext(ChatCompletionContext):
+    """最近 keep_last 条原文 + 更早发言的按人摘要 + 现算的私有信息 + 增量事件。
+
+    knowledge 是无参函数，返回要放进上下文开头的文本，空串表示没有；
+    observations 是无参函数，返回自上次调用以来的新事件文案列表。
+    keep_last 为 None 时从不折叠；max_actions 是摘要里保留的自己的行动条数。
+    """
+
+    def __init__(
+        self,
+        keep_last: int | None = 12,
+        fold_every: int = 8,
+        knowledge: Callable[[], str] | None = None,
+        observations: Callable[[], List[str]] | None = None,
+        max_actions: int = 12,
+        line_chars: int = 48,
+        initial_messages: List[LLMMessage] | None = None,
+    ) -> None:
+        super().__init__(initial_messages)
+        self._keep_last = None if keep_last is None else max(1, keep_last)
+        self._fold_every = max(1, fold_every)
+        self._knowledge = knowledge
+        self._observations = observations
+        self._max_actions = max(0, max_actions)
+        self._line_chars = line_chars
+        self._digest: dict = {}
+        self._actions: List[str] = []
+        self._facts: List[str] = []
+
+    async def add_message(self, message: LLMMessage) -> None:
+        await super().add_message(message)
+        if self._keep_last is not None and len(self._messages) >= self._keep_last + self._fold_every:
+            self._fold()
+
+    def _fold(self):
+        cut = len(self._messages) - self._keep_last
+        # 工具结果必须紧跟着它的调用，保留下来的部分不能以工具结果开头
+        while cut < len(self._messages) and isinstance(self._messages[cut], FunctionExecutionResultMessage):
+            cut += 1
+        folded, self._messages = self._messages[:cut], self._messages[cut:]
+        for message in folded:
+            if isinstance(message, UserMessage) and message.source == OBSERVATION_SOURCE:
+                self._facts.extend(message.content.splitlines()[1:])
+                continue
+            if isinstance(message, UserMessage):
+                note_speech(self._digest, message.source, message.content, self._line_chars)
+            elif isinstance(message, AssistantMessage) and isinstance(message.content, str):
+                note_speech(self._digest, SELF_SPEAKER, message.content, self._line_chars)
+            else:
+                action = summarize_action(message)
+                if action:
+                    self._actions.append(action)
+        self._actions = self._actions[-self._max_actions:] if self._max_actions else []
+
+    def _header(self) -> str:
+        parts = []
+        knowledge = self._knowledge() if self._knowledge else ""
+        if knowledge:
+            parts.append(f"【只有你知道】\n{knowledge}")
+        if self._facts:
+            parts.append("【已知事件】\n" + "\n".join(self._facts))
+        if self._digest:
+            parts.append("【更早的发言摘要】\n" + "\n".join(render_digest(self._digest)))
+        if self._actions:
+            parts.append("【你更早的行动】\n" + "\n".join(self._actions))
+        return "\n\n".join(parts)
+
+    async def get_messages(self) -> List[LLMMessage]:
+        news = self._observations() if self._observations else []
+        if news:
+            await self.add_message(UserMessage(content="\n".join([OBSERVATION_TITLE, *news]), source=OBSERVATION_SOURCE))
+        header = self._header()
+        head = [SystemMessage(content=header)] if header else []
+        return head + list(self._messages)
+
+    async def clear(self) -> None:
+        await super().clear()
+        self._digest = {}
+        self._actions = []
+        self._facts = []
+
+    async def save_state(self) -> Mapping[str, Any]:
+        state = dict(await super().save_state())
+        state["digest"] = {speaker: {**entry, "mentions": dict(entry["mentions"])} for speaker, entry in self._digest.items()}
+        state["actions"] = list(self._actions)
+        state["facts"] = list(self._facts)
+        return state
+
+    async def load_state(self, state: Mapping[str, Any]) -> None:
+        await super().load_state(state)
+        self._digest = {speaker: {**entry, "mentions": dict(entry["mentions"])} for speaker, entry in state.get("digest", {}).items()}
+        self._actions = list(state.get("actions", []))
+        self._facts = list(state.get("facts", []))
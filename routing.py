@@ -0,0 +1,144 @@
+"""按调用类别和身份把模型调用分给不同的客户端。
+
+每个具名客户端都是一个独立的 QueuedChatCompletionClient，有自己的端点、模型、并发和 RPM/TPM 预算。
+调用类别由标签推出：kind 标签显式给出时直接用（vote / selector / god），否则看阶段，
+白天辩论是公开发言 speech，其余阶段是夜晚行动 night_action。
+
+路由键按从具体到宽泛的顺序查：“身份:类别”（如 seer:night_action）、类别、身份（role_id），
+都没配置时走 default。短小的机械调用可以交给便宜的快模型，只有公开发言用贵的。
+"""
+import json
+from typing import Callable
+
+from endpoints import load_endpoint_specs
+
+DEFAULT_CLIENT = "default"
+CALL_KINDS = ("speech", "night_action", "vote", "selector", "god")
+
+
+def call_kind(tags: dict) -> str:
+    if tags.get("kind"):
+        return tags["kind"]
+    return "speech" if tags.get("phase") == "day_debate" else "night_action"
+
+
+def route_name(routes: dict, tags: dict) -> str:
+    """tags 对应的客户端名。"""
+    kind = call_kind(tags)
+    role = tags.get("role")
+    keys = [f"{role}:{kind}", kind, role] if role else [kind]
+    for key in keys:
+        if key in routes:
+            return routes[key]
+    return DEFAULT_CLIENT
+
+
+def _load_json(raw: str | None):
+    if not raw or not raw.strip():
+        return {}
+    raw = raw.strip()
+    if not raw.startswith("{"):
+        with open(raw, encoding="utf-8") as f:
+            raw = f.read()
+    return json.loads(raw)
+
+
+def load_model_specs(raw: str | None, defaults: dict) -> dict:
+    """解析 LLM_MODELS：{客户端名: 端点配置或端点配置列表}，字段与 LLM_ENDPOINTS 相同，缺省取全局配置。"""
+    models = {}
+    for name, value in _load_json(raw).items():
+        specs = value if isinstance(value, list) else [value]
+        specs = [
+            {"name": name if len(specs) == 1 else f"{name}{index + 1}", **spec}
+            for index, spec in enumerate(specs)
+        ]
+        models[name] = load_endpoint_specs(json.dumps(specs), defaults)
+    return models
+
+
+def load_routes(raw: str | None, clients, role_ids=()) -> dict:
+    """解析 LLM_ROUTES：{路由键: 客户端名}。类别、身份写错或客户端不存在时直接报错，不静默走 default。"""
+    routes = _load_json(raw)
+    for key, name in routes.items():
+        role, _, kind = key.rpartition(":")
+        if not role and kind not in CALL_KINDS and kind not in role_ids:
+            raise ValueError(f"LLM_ROUTES 里的 {key}：既不是调用类别（{', '.join(CALL_KINDS)}）也不是身份（{', '.join(role_ids)}）")
+        if role and role not in role_ids:
+            raise ValueError(f"LLM_ROUTES 里的 {key}：未知的身份 {role}，可选：{', '.join(role_ids)}")
+        if role and kind not in CALL_KINDS:
+            raise ValueError(f"LLM_ROUTES 里的 {key}：未知的调用类别 {kind}，可选：{', '.join(CALL_KINDS)}")
+        if name not in clients:
+            raise ValueError(f"LLM_ROUTES 里的 {key}：没有名为 {name} 的客户端，先在 LLM_MODELS 里定义")
+    return routes
+
+
+class ModelRouter:
+    """若干具名客户端 + 路由表，对外和单个 QueuedChatCompletionClient 的用法相同。
+
+    bind(agent=..., role=..., kind=...) 返回的视图在每次调用时按当时的标签（含 current_tags 里的阶段）选客户端，
+    调用记录的标签里补上 kind（调用类别）和 client（选中的客户端名）。
+    """
+
+    def __init__(self, clients: dict, routes: dict, current_tags: Callable[[], dict] = dict):
+        self._clients = dict(clients)
+        self._routes = dict(routes)
+        self._current_tags = current_tags
+
+    def __getattr__(self, name):
+        return getattr(self._clients[DEFAULT_CLIENT], name)
+
+    @property
+    def clients(self) -> dict:
+        return self._clients
+
+    @property
+    def endpoints(self) -> list:
+        return [endpoint for client in self._clients.values() for endpoint in client.endpoints]
+
+    def client_for(self, tags: dict):
+        """(客户端名, 调用类别, 客户端)。"""
+        tags = {**self._current_tags(), **tags}
+        name = route_name(self._routes, tags)
+        return name, call_kind(tags), self._clients[name]
+
+    def bind(self, **tags) -> "RoutedChatCompletionClient":
+        return RoutedChatCompletionClient(self, tags)
+
+    async def create(self, *args, **kwargs):
+        return await self.bind().create(*args, **kwargs)
+
+    def create_stream(self, *args, **kwargs):
+        return self.bind().create_stream(*args, **kwargs)
+
+    def add_listener(self, callback):
+        for client in self._clients.values():
+            client.add_listener(callback)
+
+    def remove_listener(self, callback):
+        for client in self._clients.values():
+            client.remove_listener(callback)
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.close()
+
+
+class RoutedChatCompletionClient:
+    """ModelRouter 的一个视图：固定的标签 + 每次调用时现选的客户端。"""
+
+    def __init__(self, router: ModelRouter, tags: dict):
+        self._router = router
+        self._tags = dict(tags)
+
+    def __getattr__(self, name):
+        return getattr(self._router, name)
+
+    def _target(self):
+        name, kind, client = self._router.client_for(self._tags)
+        return client.bind(**{**self._tags, "kind": kind, "client": name})
+
+    async def create(self, *args, **kwargs):
+        return await self._target().create(*args, **kwargs)
+
+    def create_stream(self, *args, **kwargs):
+        return self._target().create_stream(*args, **kwargs)
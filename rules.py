@@ -1,179 +1,349 @@
-from copy import deepcopy
-
-
-DEFAULT_RITUAL_STATE = {
-    "night_kill": "无",
-    "protected_target": "无",
-    "poison_target": "无",
-    "cursed_player": "无",
-    "laura_used_heal": False,
-    "laura_used_poison": False,
-    "how_died": {},
-    "alive_players": [],
-    "player_teams": {},
-    "votes": {},
-}
-
-
-RITUAL_STATE = deepcopy(DEFAULT_RITUAL_STATE)
+# 旧接口里“没有目标”的写法。GameState 内部用 None，night_kill 等兼容属性仍按这个字符串读写。
+NONE = "无"
+
+
+def _optional(value):
+    return None if value in (None, NONE) else value
+
+
+class GameState:
+    """一局游戏的全部仪式状态。同一进程内的多桌游戏各自持有一份，互不干扰。
+
+    座位在开局时编号，存活名单是一个整数位图，各阵营的存活人数随死亡增量维护，
+    is_alive / winner 都是 O(1)。alive_players 是按座位顺序的只读元组，只在有人出局时重建，读取不复制。
+    本夜目标与诅咒为 str | None；night_kill / protected_target / poison_target / cursed_player
+    是给旧调用方的兼容视图，没有目标时读出“无”。
+    """
+
+    __slots__ = (
+        "kill",
+        "protected",
+        "poisoned",
+        "cursed",
+        "laura_used_heal",
+        "laura_used_poison",
+        "how_died",
+        "votes",
+        "inspections",
+        "rejections",
+        "listeners",
+        "_teams",
+        "_seat_bits",
+        "_seats",
+        "_alive_mask",
+        "_alive_by_team",
+        "_alive_view",
+    )
+
+    def __init__(self, alive_players=None, player_teams=None):
+        self.kill: str | None = None
+        self.protected: str | None = None
+        self.poisoned: str | None = None
+        self.cursed: str | None = None
+        self.laura_used_heal = False
+        self.laura_used_poison = False
+        self.how_died = {}
+        self.votes = {}
+        # Ida 每次查验的 (目标, 阵营)，按时间顺序
+        self.inspections = []
+        # 被规则拒绝的行动次数，按行动分类
+        self.rejections = {}
+        # 状态转移的监听者，签名为 listener(kind, data)，见 events.EventFeed
+        self.listeners = []
+        self._teams = dict(player_teams or {})
+        self._index(list(alive_players or []))
+
+    def _index(self, alive):
+        """按存活名单的顺序给座位编号（不在名单里的已出局座位排在后面），重建位图和阵营计数。"""
+        seats = list(dict.fromkeys(alive)) + [seat for seat in self._teams if seat not in alive]
+        self._seats = tuple(seats)
+        self._seat_bits = {seat: 1 << index for index, seat in enumerate(seats)}
+        self._alive_mask = 0
+        self._alive_by_team = {}
+        for seat in dict.fromkeys(alive):
+            self._alive_mask |= self._seat_bits[seat]
+            team = self._teams.get(seat)
+            self._alive_by_team[team] = self._alive_by_team.get(team, 0) + 1
+        self._refresh_view()
+
+    def _refresh_view(self):
+        mask = self._alive_mask
+        self._alive_view = tuple(seat for seat in self._seats if mask & self._seat_bits[seat])
+
+    @property
+    def alive_players(self) -> tuple:
+        return self._alive_view
+
+    @alive_players.setter
+    def alive_players(self, alive):
+        self._index(list(alive))
+
+    @property
+    def player_teams(self) -> dict:
+        return self._teams
+
+    @player_teams.setter
+    def player_teams(self, teams):
+        alive = self.alive_players
+        self._teams = dict(teams)
+        self._index(list(alive))
+
+    @property
+    def night_kill(self) -> str:
+        return self.kill or NONE
+
+    @night_kill.setter
+    def night_kill(self, value):
+        self.kill = _optional(value)
+
+    @property
+    def protected_target(self) -> str:
+        return self.protected or NONE
+
+    @protected_target.setter
+    def protected_target(self, value):
+        self.protected = _optional(value)
+
+    @property
+    def poison_target(self) -> str:
+        return self.poisoned or NONE
+
+    @poison_target.setter
+    def poison_target(self, value):
+        self.poisoned = _optional(value)
+
+    @property
+    def cursed_player(self) -> str:
+        return self.cursed or NONE
+
+    @cursed_player.setter
+    def cursed_player(self, value):
+        self.cursed = _optional(value)
+
+
+def _emit(state: GameState, kind: str, **data):
+    for listener in state.listeners:
+        listener(kind, data)
+
+
+def _reject(state: GameState, action: str, target: str, msg: str):
+    state.rejections[action] = state.rejections.get(action, 0) + 1
+    _emit(state, "rejected", action=action, target=target, reason=msg)
+    return False, msg
+
+
+def start_night(state: GameState):
+    """清空本夜行动。"""
+    state.kill = None
+    state.protected = None
+    state.poisoned = None
 
 
-def reset_ritual_state(alive_players=None, player_teams=None):
-    """重置整局状态。"""
-    RITUAL_STATE.clear()
-    RITUAL_STATE.update(deepcopy(DEFAULT_RITUAL_STATE))
-    RITUAL_STATE["alive_players"] = list(alive_players or [])
-    RITUAL_STATE["player_teams"] = dict(player_teams or {})
+def start_day(state: GameState):
+    """清空本昼投票。"""
+    state.votes = {}
+    _emit(state, "day_started", cursed=state.cursed)
 
 
-def start_night():
-    """清空本夜行动。"""
-    RITUAL_STATE["night_kill"] = "无"
-    RITUAL_STATE["protected_target"] = "无"
-    RITUAL_STATE["poison_target"] = "无"
+def alive_players(state: GameState) -> tuple:
+    """按座位顺序的存活名单，只读元组，不复制。"""
+    return state._alive_view
 
 
-def start_day():
-    """清空本昼投票。"""
-    RITUAL_STATE["votes"] = {}
+def is_alive(state: GameState, target: str) -> bool:
+    return bool(state._alive_mask & state._seat_bits.get(target, 0))
 
 
-def alive_players():
-    return list(RITUAL_STATE["alive_players"])
+def alive_count(state: GameState, team: str | None = None) -> int:
+    """存活人数；给定 team 时只数该阵营。"""
+    if team is None:
+        return state._alive_mask.bit_count()
+    return state._alive_by_team.get(team, 0)
 
 
-def is_alive(target: str) -> bool:
-    return target in RITUAL_STATE["alive_players"]
+def _kill(state: GameState, target: str) -> bool:
+    """把 target 移出存活名单，同步位图和阵营计数；原本就不在名单里时返回 False。"""
+    if not is_alive(state, target):
+        return False
+    state._alive_mask &= ~state._seat_bits[target]
+    state._alive_by_team[state._teams.get(target)] -= 1
+    state._refresh_view()
+    return True
 
 
-def validate_target(target: str, allow_dead: bool = False):
+def validate_target(state: GameState, target: str, allow_dead: bool = False):
     if not target:
         return False, "目标不能为空。"
-    if target not in RITUAL_STATE["player_teams"]:
+    if target not in state.player_teams:
         return False, f"{target} 不在这场仪式中。"
-    if not allow_dead and not is_alive(target):
+    if not allow_dead and not is_alive(state, target):
         return False, f"{target} 已不在存活名单中。"
     return True, ""
 
 
-def _record_death(target: str, cause: str):
-    previous = RITUAL_STATE["how_died"].get(target)
+def _record_death(state: GameState, target: str, cause: str):
+    previous = state.how_died.get(target)
     if not previous:
-        RITUAL_STATE["how_died"][target] = cause
+        state.how_died[target] = cause
     elif cause not in previous.split("+"):
-        RITUAL_STATE["how_died"][target] = f"{previous}+{cause}"
+        state.how_died[target] = f"{previous}+{cause}"
+
+
+# 各行动的合法目标，与下面对应 set_* 函数的校验一致。seat 为行动者，只有投票需要。
+LEGAL_TARGETS = {
+    "night_kill": lambda state, seat: [n for n in state._alive_view if state._teams.get(n) != "dark"],
+    "heal": lambda state, seat: [state.kill] if state.kill and not state.laura_used_heal else [],
+    "poison": lambda state, seat: [] if state.laura_used_poison else list(state._alive_view),
+    "inspect": lambda state, seat: list(state._alive_view),
+    "curse": lambda state, seat: list(state._alive_view),
+    "vote": lambda state, seat: list(state._alive_view) if seat is None or is_alive(state, seat) else [],
+}
 
 
-def set_night_kill(target: str):
-    ok, msg = validate_target(target)
+def legal_targets(state: GameState, action: str, seat: str | None = None):
+    """当前状态下 action 的合法目标列表；空列表表示这个行动现在做不了。"""
+    return LEGAL_TARGETS[action](state, seat)
+
+
+def legal_moves(state: GameState, seat: str | None = None, actions=None):
+    """{行动: 合法目标}，只列出当前有合法目标的行动。"""
+    moves = {action: legal_targets(state, action, seat) for action in (actions or LEGAL_TARGETS)}
+    return {action: targets for action, targets in moves.items() if targets}
+
+
+def set_night_kill(state: GameState, target: str):
+    ok, msg = validate_target(state, target)
     if not ok:
-        return False, msg
-    if RITUAL_STATE["player_teams"].get(target) == "dark":
-        return False, "黑暗不会吞噬自己的倒影。请选择好人。"
-    RITUAL_STATE["night_kill"] = target
+        return _reject(state, "night_kill", target, msg)
+    if state.player_teams.get(target) == "dark":
+        return _reject(state, "night_kill", target, "黑暗不会吞噬自己的倒影。请选择好人。")
+    state.kill = target
+    _emit(state, "night_kill", target=target)
     return True, target
 
 
-def set_protected_target(target: str):
-    if RITUAL_STATE["laura_used_heal"]:
-        return False, "药水已枯竭。"
-    if target != RITUAL_STATE["night_kill"]:
-        return False, "白光只能照向今夜被献祭的人。"
-    RITUAL_STATE["protected_target"] = target
-    RITUAL_STATE["laura_used_heal"] = True
+def set_protected_target(state: GameState, target: str):
+    if state.laura_used_heal:
+        return _reject(state, "heal", target, "药水已枯竭。")
+    if state.kill is None or target != state.kill:
+        return _reject(state, "heal", target, "白光只能照向今夜被献祭的人。")
+    state.protected = target
+    state.laura_used_heal = True
+    _emit(state, "protect", target=target)
     return True, target
 
 
-def set_poison_target(target: str):
-    if RITUAL_STATE["laura_used_poison"]:
-        return False, "药水已枯竭。"
-    ok, msg = validate_target(target)
+def set_poison_target(state: GameState, target: str):
+    if state.laura_used_poison:
+        return _reject(state, "poison", target, "药水已枯竭。")
+    ok, msg = validate_target(state, target)
     if not ok:
-        return False, msg
-    RITUAL_STATE["poison_target"] = target
-    RITUAL_STATE["laura_used_poison"] = True
+        return _reject(state, "poison", target, msg)
+    state.poisoned = target
+    state.laura_used_poison = True
+    _emit(state, "poison", target=target)
     return True, target
 
 
-def inspect_team(target: str):
-    ok, msg = validate_target(target)
+def inspect_team(state: GameState, target: str):
+    ok, msg = validate_target(state, target)
     if not ok:
-        return False, msg
-    return True, RITUAL_STATE["player_teams"].get(target, "unknown")
+        return _reject(state, "inspect", target, msg)
+    team = state.player_teams.get(target, "unknown")
+    state.inspections.append((target, team))
+    _emit(state, "inspection", target=target, team=team)
+    return True, team
 
 
-def set_cursed_player(target: str):
-    ok, msg = validate_target(target)
+def set_cursed_player(state: GameState, target: str):
+    ok, msg = validate_target(state, target)
     if not ok:
-        return False, msg
-    RITUAL_STATE["cursed_player"] = target
+        return _reject(state, "curse", target, msg)
+    state.cursed = target
+    _emit(state, "curse", target=target)
     return True, target
 
 
-def record_vote(voter: str, target: str):
-    ok, msg = validate_target(voter)
+def record_vote(state: GameState, voter: str, target: str):
+    ok, msg = validate_target(state, voter)
     if not ok:
-        return False, f"投票无效：{msg}"
-    ok, msg = validate_target(target)
+        return _reject(state, "vote", target, f"投票无效：{msg}")
+    ok, msg = validate_target(state, target)
     if not ok:
-        return False, f"投票无效：{msg}"
-    RITUAL_STATE["votes"][voter] = target
+        return _reject(state, "vote", target, f"投票无效：{msg}")
+    state.votes[voter] = target
+    _emit(state, "vote", voter=voter, target=target)
     return True, target
 
 
-def resolve_night():
+def resolve_night(state: GameState):
     """结算夜晚死亡。"""
     deaths = []
-    night_kill = RITUAL_STATE["night_kill"]
-    protected = RITUAL_STATE["protected_target"]
-    poison_target = RITUAL_STATE["poison_target"]
+    night_kill = state.kill
+    poison_target = state.poisoned
 
-    if night_kill != "无" and night_kill != protected:
+    if night_kill is not None and night_kill != state.protected:
         deaths.append(night_kill)
-        _record_death(night_kill, "wolf")
+        _record_death(state, night_kill, "wolf")
 
-    if poison_target != "无":
+    if poison_target is not None:
         if poison_target not in deaths:
             deaths.append(poison_target)
-        _record_death(poison_target, "poison")
+        _record_death(state, poison_target, "poison")
 
     for target in deaths:
-        if target in RITUAL_STATE["alive_players"]:
-            RITUAL_STATE["alive_players"].remove(target)
+        _kill(state, target)
 
+    _emit(state, "night_resolved", deaths=list(deaths), alive=list(state._alive_view))
     return deaths
 
 
-def resolve_day():
+def resolve_day(state: GameState):
     """结算白天放逐。乌鸦诅咒为目标追加一票。"""
     tally = {}
-    for target in RITUAL_STATE["votes"].values():
+    for target in state.votes.values():
         tally[target] = tally.get(target, 0) + 1
 
-    cursed = RITUAL_STATE["cursed_player"]
-    if cursed != "无" and cursed in RITUAL_STATE["alive_players"]:
+    cursed = state.cursed
+    if cursed is not None and is_alive(state, cursed):
         tally[cursed] = tally.get(cursed, 0) + 1
 
-    if not tally:
-        RITUAL_STATE["cursed_player"] = "无"
-        return None, tally
-
-    top_votes = max(tally.values())
+    eliminated = None
+    top_votes = max(tally.values(), default=0)
     top_targets = [target for target, count in tally.items() if count == top_votes]
-    if len(top_targets) != 1:
-        RITUAL_STATE["cursed_player"] = "无"
-        return None, tally
+    if len(top_targets) == 1:
+        eliminated = top_targets[0]
+        if _kill(state, eliminated):
+            _record_death(state, eliminated, "vote")
 
-    eliminated = top_targets[0]
-    if eliminated in RITUAL_STATE["alive_players"]:
-        RITUAL_STATE["alive_players"].remove(eliminated)
-        _record_death(eliminated, "vote")
-
-    RITUAL_STATE["cursed_player"] = "无"
+    state.cursed = None
+    _emit(state, "day_resolved", tally=dict(tally), eliminated=eliminated)
     return eliminated, tally
 
 
-def victory_state():
-    dark_alive = [n for n in RITUAL_STATE["alive_players"] if RITUAL_STATE["player_teams"].get(n) == "dark"]
-    light_alive = [n for n in RITUAL_STATE["alive_players"] if RITUAL_STATE["player_teams"].get(n) == "light"]
+def speaking_order(state: GameState):
+    """白天发言顺序：按座位轮转，从最近一位出局者的下一个座位开始，只含存活者。"""
+    seats = list(state.player_teams)
+    start = 0
+    if state.how_died:
+        last_out = list(state.how_died)[-1]
+        start = seats.index(last_out) + 1 if last_out in seats else 0
+    return [seat for seat in seats[start:] + seats[:start] if is_alive(state, seat)]
+
+
+def victory_state(state: GameState):
+    """两个阵营各自的存活座位。只要人数时用 alive_count。"""
+    teams = state.player_teams
+    dark_alive = [n for n in state.alive_players if teams.get(n) == "dark"]
+    light_alive = [n for n in state.alive_players if teams.get(n) == "light"]
     return dark_alive, light_alive
+
+
+def winner(state: GameState):
+    """返回获胜阵营 light / dark，尚未分出胜负时返回 None。"""
+    dark = alive_count(state, "dark")
+    if not dark:
+        return "light"
+    if dark >= alive_count(state, "light"):
+        return "dark"
+    return None
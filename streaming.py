@@ -0,0 +1,116 @@
+"""AI 发言的流式输出。
+
+AssistantAgent 打开 model_client_stream 后，run_stream 里先出现一串 ModelClientStreamingChunkEvent，
+最后才是整条 TextMessage；分片的 full_message_id 与整条消息的 id 相同。
+- SpeechPrinter 把分片边到边打到终端，整条发言到达时只补一个换行；整条与已打出的不一致
+  （中途断流后重新生成、回合超时改成兜底发言）时，先标注“中断”，再由调用方整条重打；
+  其他旁白要在半行里插进来时先换行。
+- StreamingAgent 处理断流：分片已经给出去后，QueuedChatCompletionClient 不会替它重试，
+  这里改为重新生成整次发言。重新生成的分片带新的 full_message_id，终端据此知道前一段作废。
+"""
+import sys
+from typing import AsyncGenerator, Callable, Sequence
+
+from autogen_agentchat.agents import BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage, ModelClientStreamingChunkEvent
+from autogen_core import CancellationToken
+
+from config import FAILOVER_ERRORS
+
+ABORTED_MARK = "……（中断）"
+
+
+def _stdout_write(text: str):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+class SpeechPrinter:
+    """终端上一次只有一条正在流式打印的发言。"""
+
+    def __init__(self, write: Callable[[str], None] | None = None):
+        self._write = write or _stdout_write
+        # [source, full_message_id, 已打出的文字]
+        self._open = None
+
+    def _abort(self):
+        self._write(f"{ABORTED_MARK}\n")
+        self._open = None
+
+    def break_line(self):
+        """别的输出要插进来：先结束正在打的这一行。这条发言到达时会整条重打。"""
+        if self._open is not None:
+            self._write("\n")
+            self._open = None
+
+    def chunk(self, prefix: str, event: ModelClientStreamingChunkEvent, spaced: bool = False):
+        if self._open and self._open[1] != event.full_message_id:
+            self._abort()
+        if self._open is None:
+            lead = "\n" if spaced else ""
+            self._write(f"{lead}{prefix} {event.source}: ")
+            self._open = [event.source, event.full_message_id, ""]
+        self._open[2] += event.content
+        self._write(event.content)
+
+    def finish(self, message: BaseChatMessage) -> bool:
+        """整条消息到达。它正是刚才流式打完的那条时补换行并返回 True；否则返回 False，由调用方整条打印。"""
+        if self._open is None:
+            return False
+        source, message_id, text = self._open
+        if message.source == source and message.id == message_id and message.to_text() == text:
+            self._write("\n")
+            self._open = None
+            return True
+        self._abort()
+        return False
+
+
+class StreamingAgent(BaseChatAgent):
+    """包住一个开了 model_client_stream 的 Agent：分片已经给出后断流，就重新生成整次发言，至多 max_restarts 次。
+
+    还没给出分片就失败的请求已经由 QueuedChatCompletionClient 重试过，这里原样抛出。
+    """
+
+    def __init__(self, agent: BaseChatAgent, max_restarts: int = 2):
+        super().__init__(name=agent.name, description=agent.description)
+        self._agent = agent
+        self._max_restarts = max(0, max_restarts)
+        self.restarts = 0
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return self._agent.produced_message_types
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        response = None
+        async for item in self.on_messages_stream(messages, cancellation_token):
+            if isinstance(item, Response):
+                response = item
+        return response
+
+    async def on_messages_stream(
+        self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken
+    ) -> AsyncGenerator[BaseAgentEvent | BaseChatMessage | Response, None]:
+        for attempt in range(self._max_restarts + 1):
+            streamed = False
+            try:
+                # 新消息在第一次尝试时已经写进上下文，重新生成时不再重复传入
+                async for item in self._agent.on_messages_stream(messages if attempt == 0 else [], cancellation_token):
+                    streamed = streamed or isinstance(item, ModelClientStreamingChunkEvent)
+                    yield item
+                return
+            except FAILOVER_ERRORS:
+                if not streamed or attempt >= self._max_restarts:
+                    raise
+                self.restarts += 1
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        await self._agent.on_reset(cancellation_token)
+
+    async def save_state(self):
+        return await self._agent.save_state()
+
+    async def load_state(self, state) -> None:
+        await self._agent.load_state(state)
@@ -0,0 +1,169 @@
+"""模型调用的观测数据导出。
+
+QueuedChatCompletionClient 每次调用结束产出一条记录（见 config.py），这里提供两个监听器：
+- JsonlExporter：逐条追加写进 JSON Lines 文件，多进程同时追加也不会交错；
+- PrometheusMetrics：按阶段 / Agent 聚合成计数器和直方图，定期写成 Prometheus 文本格式，
+  可以交给 node_exporter 的 textfile collector，也可以直接打开看。
+
+文件路径里的 {pid} 会替换成进程号，批量对局的多个进程各写各的文件。
+
+    python telemetry.py calls.jsonl            # 按阶段汇总
+    python telemetry.py calls.jsonl --by agent # 按 Agent 汇总
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+METRIC_PREFIX = "werewolf_llm"
+# 秒；覆盖从本地替身的几毫秒到慢模型的一分钟
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _expand(path: str) -> str:
+    return path.replace("{pid}", str(os.getpid()))
+
+
+class JsonlExporter:
+    """把每条调用记录追加写成一行 JSON。"""
+
+    def __init__(self, path: str):
+        self.path = _expand(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def __call__(self, record: dict):
+        line = json.dumps({"t": round(time.time(), 3), **record}, ensure_ascii=False, default=str)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _labels(**labels) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class PrometheusMetrics:
+    """调用记录的聚合：调用/尝试/重试/token 计数器，排队、占槽、总耗时、首分片耗时直方图。"""
+
+    COUNTERS = {
+        "calls_total": "模型调用次数",
+        "attempts_total": "含重试在内的请求尝试次数",
+        "retries_total": "失败并触发重试或放弃的尝试，按错误类型",
+        "tokens_total": "token 用量，kind 为 prompt / cached_prompt / completion",
+    }
+    HISTOGRAMS = {
+        "queue_wait_seconds": "等待并发槽和 RPM/TPM 预算的时长",
+        "hold_seconds": "占用并发槽的时长",
+        "latency_seconds": "一次调用从发起到结束的总时长",
+        "ttft_seconds": "流式请求收到首个分片的时长",
+    }
+
+    def __init__(self, path: str | None = None, buckets=LATENCY_BUCKETS, interval: float = 5.0):
+        self.path = _expand(path) if path else None
+        self._buckets = tuple(buckets)
+        self._interval = interval
+        self._last_dump = 0.0
+        self._counters = {}
+        self._histograms = {}
+
+    def _inc(self, name: str, labels: tuple, value: float = 1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name: str, labels: tuple, value: float):
+        # [各桶计数..., 总和, 次数]
+        slot = self._histograms.setdefault((name, labels), [0] * len(self._buckets) + [0.0, 0])
+        for index, bound in enumerate(self._buckets):
+            if value <= bound:
+                slot[index] += 1
+        slot[-2] += value
+        slot[-1] += 1
+
+    def __call__(self, record: dict):
+        tags = record["tags"]
+        phase, agent = tags.get("phase", "untagged"), tags.get("agent", "unknown")
+        self._inc("calls_total", _labels(phase=phase, agent=agent, endpoint=record["endpoint"], ok=str(record["ok"]).lower()))
+        self._inc("attempts_total", _labels(phase=phase, agent=agent), record["attempts"])
+        for reason in record["retry_reasons"]:
+            self._inc("retries_total", _labels(phase=phase, reason=reason))
+        for kind, field in (("prompt", "prompt_tokens"), ("cached_prompt", "cached_prompt_tokens"), ("completion", "completion_tokens")):
+            self._inc("tokens_total", _labels(phase=phase, agent=agent, kind=kind), record[field])
+        by_phase = _labels(phase=phase)
+        self._observe("queue_wait_seconds", by_phase, record["queue_wait"])
+        self._observe("hold_seconds", by_phase, record["hold_time"])
+        self._observe("latency_seconds", by_phase, record["latency"])
+        if record["ttft"] is not None:
+            self._observe("ttft_seconds", by_phase, record["ttft"])
+        if self.path and time.monotonic() - self._last_dump >= self._interval:
+            self.dump()
+
+    def render(self) -> str:
+        lines = []
+        for name, help_text in self.COUNTERS.items():
+            series = sorted((labels, value) for (metric, labels), value in self._counters.items() if metric == name)
+            lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} counter"]
+            lines += [f"{METRIC_PREFIX}_{name}{_format_labels(labels)} {value}" for labels, value in series]
+        for name, help_text in self.HISTOGRAMS.items():
+            series = sorted((labels, slot) for (metric, labels), slot in self._histograms.items() if metric == name)
+            lines += [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} histogram"]
+            for labels, slot in series:
+                for bound, count in zip(self._buckets, slot):
+                    lines.append(f"{METRIC_PREFIX}_{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{METRIC_PREFIX}_{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {slot[-1]}")
+                lines.append(f"{METRIC_PREFIX}_{name}_sum{_format_labels(labels)} {round(slot[-2], 6)}")
+                lines.append(f"{METRIC_PREFIX}_{name}_count{_format_labels(labels)} {slot[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str | None = None):
+        path = _expand(path) if path else self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+        self._last_dump = time.monotonic()
+
+
+def summarize_records(records, key: str = "phase") -> dict:
+    """按某个标签分组汇总调用次数、token 和耗时，按输入 token 从多到少排列。"""
+    groups = {}
+    for record in records:
+        groups.setdefault(str(record["tags"].get(key, "untagged")), []).append(record)
+    summary = {}
+    for name, group in groups.items():
+        ttfts = [r["ttft"] for r in group if r.get("ttft") is not None]
+        summary[name] = {
+            "calls": len(group),
+            "attempts": sum(r["attempts"] for r in group),
+            "retries": sum(len(r.get("retry_reasons", ())) for r in group),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in group),
+            "cached_prompt_tokens": sum(r["cached_prompt_tokens"] for r in group),
+            "completion_tokens": sum(r["completion_tokens"] for r in group),
+            "queue_wait": round(sum(r["queue_wait"] for r in group), 4),
+            "hold_time": round(sum(r.get("hold_time", 0.0) for r in group), 4),
+            "latency_mean": round(statistics.fmean(r["latency"] for r in group), 4),
+            "ttft_mean": round(statistics.fmean(ttfts), 4) if ttfts else None,
+        }
+    return dict(sorted(summary.items(), key=lambda item: -item[1]["prompt_tokens"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="汇总 LLM_METRICS_JSONL 导出的调用记录")
+    parser.add_argument("path", help="JSON Lines 文件")
+    parser.add_argument("--by", default="phase", help="分组标签：phase / agent / round / game；配置了模型分流时还有 client / kind / role")
+    args = parser.parse_args(argv)
+    with open(args.path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    print(json.dumps(summarize_records(records, args.by), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
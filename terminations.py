@@ -0,0 +1,83 @@
+"""夜晚小组的提前终止条件。
+
+阶段要做的事一旦写进 GameState（NIGHT_PHASES 里声明的 writes 字段发生变化），小组立刻结束；
+行动者回复 PASS 表示放弃本夜行动，同样结束。没有改动状态的工具调用（目标非法、用错工具）
+和既没调工具也没 PASS 的发言都消耗重试额度，额度用完也结束，不再等到 max_turns。
+"""
+import copy
+from typing import Sequence
+
+from autogen_agentchat.base import TerminatedException, TerminationCondition
+from autogen_agentchat.messages import BaseAgentEvent, BaseChatMessage, StopMessage, TextMessage, ToolCallExecutionEvent
+
+import rules
+
+PASS_WORD = "PASS"
+
+# 行动者在一个阶段里最多能失误几次
+DEFAULT_RETRY_BUDGET = 1
+
+
+def phase_max_turns(actors: int, retry_budget: int = DEFAULT_RETRY_BUDGET) -> int:
+    """行动者和主持人轮流发言时，用完重试额度所需的最多轮数，作为兜底上限。"""
+    return (retry_budget + 1) * (actors + 1)
+
+
+class PhaseCommitTermination(TerminationCondition):
+    """fields 中任一字段变化即结束；actors 回复 PASS 或失误超过 retry_budget 次也结束。
+
+    count_text 为假时行动者的普通发言不算失误，用于允许先商量再动手的狼人密谈。
+    """
+
+    def __init__(
+        self,
+        state: rules.GameState,
+        fields: Sequence[str],
+        actors: Sequence[str],
+        retry_budget: int = DEFAULT_RETRY_BUDGET,
+        count_text: bool = True,
+    ):
+        self._state = state
+        self._fields = tuple(fields)
+        self._actors = set(actors)
+        self._retry_budget = max(0, retry_budget)
+        self._count_text = count_text
+        self._terminated = False
+        self._before = self._snapshot()
+        self.misses = 0
+
+    def _snapshot(self):
+        return tuple(copy.copy(getattr(self._state, field)) for field in self._fields)
+
+    @property
+    def terminated(self) -> bool:
+        return self._terminated
+
+    def _stop(self, reason: str) -> StopMessage:
+        self._terminated = True
+        return StopMessage(content=reason, source="PhaseCommitTermination")
+
+    async def __call__(self, messages: Sequence[BaseAgentEvent | BaseChatMessage]) -> StopMessage | None:
+        if self._terminated:
+            raise TerminatedException("Termination condition has already been reached")
+        if self._snapshot() != self._before:
+            return self._stop("committed")
+        for message in messages:
+            if message.source not in self._actors:
+                continue
+            if isinstance(message, TextMessage):
+                if PASS_WORD in message.content.upper():
+                    return self._stop("passed")
+                if self._count_text:
+                    self.misses += 1
+            elif isinstance(message, ToolCallExecutionEvent):
+                # 工具执行了但状态没变：目标非法或者用错了工具
+                self.misses += 1
+        if self.misses > self._retry_budget:
+            return self._stop("retry_budget_exhausted")
+        return None
+
+    async def reset(self) -> None:
+        self._terminated = False
+        self._before = self._snapshot()
+        self.misses = 0
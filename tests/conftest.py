@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# 仓库的模块都在根目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rules
+
+SEATS = ("P1", "P2", "P3", "P4", "P5", "P6")
+TEAMS = {"P1": "dark", "P2": "light", "P3": "light", "P4": "light", "P5": "dark", "P6": "light"}
+
+
+@pytest.fixture
+def state():
+    """6 人桌：P1、P5 是狼人，其余是好人。"""
+    return rules.GameState(alive_players=SEATS, player_teams=TEAMS)
@@ -0,0 +1,58 @@
+"""快照往返与事件日志。"""
+import json
+
+import checkpoint
+import rules
+
+
+def _played(state):
+    """走一个夜晚和一次投票，让快照里的字段都不是初始值。"""
+    rules.start_night(state)
+    rules.set_night_kill(state, "P2")
+    rules.inspect_team(state, "P5")
+    rules.set_cursed_player(state, "P3")
+    rules.set_poison_target(state, "P1")
+    rules.set_poison_target(state, "P1")  # 毒药已用，记一次拒绝
+    rules.resolve_night(state)
+    rules.start_day(state)
+    rules.record_vote(state, "P3", "P5")
+    return state
+
+
+def test_snapshot_restore_round_trip(state):
+    snapshot = checkpoint.snapshot_state(_played(state))
+    restored = rules.GameState()
+    checkpoint.restore_state(restored, json.loads(json.dumps(snapshot)))
+
+    for field in checkpoint.STATE_FIELDS:
+        assert getattr(restored, field) == getattr(state, field), field
+    assert restored.inspections == [("P5", "dark")]
+    assert restored.rejections == state.rejections != {}
+    assert rules.alive_players(restored) == rules.alive_players(state)
+    assert rules.alive_count(restored, "dark") == rules.alive_count(state, "dark")
+    assert rules.alive_count(restored, "light") == rules.alive_count(state, "light")
+    assert not rules.is_alive(restored, "P2")
+
+
+def test_save_load_checkpoint(tmp_path, state):
+    path = tmp_path / checkpoint.CHECKPOINT_NAME
+    snapshot = checkpoint.snapshot_state(_played(state))
+    checkpoint.save_checkpoint(str(path), snapshot)
+    assert not (tmp_path / f"{checkpoint.CHECKPOINT_NAME}.tmp").exists()
+    assert checkpoint.load_checkpoint(str(path)) == json.loads(json.dumps(snapshot))
+
+
+def test_event_log_as_listener(tmp_path, state):
+    path = tmp_path / "run" / checkpoint.EVENT_LOG_NAME
+    log = checkpoint.EventLog(str(path))
+    state.listeners.append(log)
+    rules.start_night(state)
+    rules.set_night_kill(state, "P4")
+    log.append("checkpoint", phase="night")
+    log.sync()
+    log.close()
+    log.close()  # 重复关闭不报错
+
+    events = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [event["kind"] for event in events][-1] == "checkpoint"
+    assert any(event.get("target") == "P4" for event in events)
@@ -0,0 +1,101 @@
+"""GameState 的存活位图、阵营计数和兼容属性。"""
+import pytest
+
+import rules
+from conftest import SEATS
+
+
+def test_initial_counters(state):
+    assert rules.alive_players(state) == SEATS
+    assert rules.alive_count(state) == 6
+    assert rules.alive_count(state, "dark") == 2
+    assert rules.alive_count(state, "light") == 4
+    assert rules.winner(state) is None
+    assert not rules.is_alive(state, "P9")
+
+
+def test_kill_updates_mask_and_counters(state):
+    rules.start_night(state)
+    rules.set_night_kill(state, "P2")
+    assert rules.resolve_night(state) == ["P2"]
+    assert not rules.is_alive(state, "P2")
+    assert rules.alive_players(state) == ("P1", "P3", "P4", "P5", "P6")
+    assert rules.alive_count(state, "light") == 3
+    assert state.how_died == {"P2": "wolf"}
+    # 已出局的座位再死一次不改计数
+    assert rules._kill(state, "P2") is False
+    assert rules.alive_count(state) == 5
+
+
+def test_winner_follows_counters(state):
+    for seat in ("P2", "P3"):
+        rules._kill(state, seat)
+    assert rules.winner(state) == "dark"
+
+    other = rules.GameState(alive_players=SEATS, player_teams=state.player_teams)
+    for seat in ("P1", "P5"):
+        rules._kill(other, seat)
+    assert rules.winner(other) == "light"
+
+
+def test_day_vote_eliminates_and_counts(state):
+    rules.start_day(state)
+    for voter in ("P2", "P3", "P4"):
+        rules.record_vote(state, voter, "P5")
+    rules.record_vote(state, "P5", "P2")
+    eliminated, tally = rules.resolve_day(state)
+    assert (eliminated, tally) == ("P5", {"P5": 3, "P2": 1})
+    assert rules.alive_count(state, "dark") == 1
+    assert state.how_died["P5"] == "vote"
+
+
+def test_revive_by_reassigning_alive_players(state):
+    rules._kill(state, "P3")
+    rules._kill(state, "P5")
+    state.alive_players = SEATS
+    assert rules.alive_players(state) == SEATS
+    assert rules.is_alive(state, "P5")
+    assert (rules.alive_count(state, "dark"), rules.alive_count(state, "light")) == (2, 4)
+
+
+def test_dead_seats_keep_bits_after_reindex(state):
+    # 续跑时存活名单里没有已出局的座位，它们仍要有编号，校验和结算才认得
+    state.alive_players = ("P2", "P4", "P5")
+    assert rules.alive_count(state) == 3
+    assert not rules.is_alive(state, "P1")
+    assert rules.validate_target(state, "P1", allow_dead=True) == (True, "")
+
+
+def test_player_teams_setter_recounts(state):
+    state.player_teams = {**state.player_teams, "P2": "dark"}
+    assert rules.alive_count(state, "dark") == 3
+    assert rules.alive_count(state, "light") == 3
+    assert rules.winner(state) == "dark"
+
+
+@pytest.mark.parametrize(
+    "compat, field",
+    [
+        ("night_kill", "kill"),
+        ("protected_target", "protected"),
+        ("poison_target", "poisoned"),
+        ("cursed_player", "cursed"),
+    ],
+)
+def test_compat_properties_round_trip(state, compat, field):
+    assert getattr(state, field) is None
+    assert getattr(state, compat) == rules.NONE
+    setattr(state, compat, "P3")
+    assert getattr(state, field) == "P3"
+    assert getattr(state, compat) == "P3"
+    setattr(state, compat, rules.NONE)
+    assert getattr(state, field) is None
+    setattr(state, field, "P4")
+    assert getattr(state, compat) == "P4"
+    setattr(state, compat, None)
+    assert getattr(state, compat) == rules.NONE
+
+
+def test_slots_reject_unknown_fields(state):
+    with pytest.raises(AttributeError):
+        state.night_target = "P2"
@@ -0,0 +1,100 @@
+"""合法目标表与规则函数一致：表里的目标都能通过，表外的目标被拒绝并计数。"""
+import pytest
+
+import regis
+import rules
+
+SETTERS = {
+    "night_kill": rules.set_night_kill,
+    "heal": rules.set_protected_target,
+    "poison": rules.set_poison_target,
+    "inspect": rules.inspect_team,
+    "curse": rules.set_cursed_player,
+}
+
+
+def _night(state):
+    rules.start_night(state)
+    rules.set_night_kill(state, "P3")
+    return state
+
+
+@pytest.mark.parametrize("action", sorted(SETTERS))
+def test_legal_targets_are_accepted(state, action):
+    _night(state)
+    for target in rules.legal_targets(state, action):
+        assert SETTERS[action](state, target)[0], (action, target)
+        # 一次性的药水用掉后换一局再试
+        state.laura_used_heal = state.laura_used_poison = False
+    assert state.rejections == {}
+
+
+def test_legal_votes_are_accepted(state):
+    rules.start_day(state)
+    for target in rules.legal_targets(state, "vote", "P2"):
+        assert rules.record_vote(state, "P2", target)[0]
+    assert state.rejections == {}
+
+
+@pytest.mark.parametrize(
+    "action, target, prepare",
+    [
+        ("night_kill", "P5", None),
+        ("heal", "P4", None),
+        ("heal", "P3", lambda s: setattr(s, "laura_used_heal", True)),
+        ("poison", "P6", lambda s: rules._kill(s, "P6")),
+        ("poison", "P2", lambda s: setattr(s, "laura_used_poison", True)),
+        ("inspect", "P9", None),
+        ("curse", "P9", None),
+    ],
+)
+def test_illegal_targets_are_rejected_and_counted(state, action, target, prepare):
+    _night(state)
+    if prepare:
+        prepare(state)
+    assert target not in rules.legal_targets(state, action)
+    ok, msg = SETTERS[action](state, target)
+    assert not ok and msg
+    assert state.rejections == {action: 1}
+
+
+def test_dead_voter_has_no_legal_targets(state):
+    rules._kill(state, "P2")
+    rules.start_day(state)
+    assert rules.legal_targets(state, "vote", "P2") == []
+    assert "vote" not in rules.legal_moves(state, "P2")
+    assert rules.record_vote(state, "P2", "P5")[0] is False
+    assert state.rejections == {"vote": 1}
+    assert state.votes == {}
+
+
+def test_legal_moves_drop_spent_potions(state):
+    _night(state)
+    state.laura_used_heal = state.laura_used_poison = True
+    moves = rules.legal_moves(state, actions=("heal", "poison", "inspect"))
+    assert list(moves) == ["inspect"]
+
+
+@pytest.mark.parametrize("mode", regis.SCHEMA_MODES)
+def test_laura_schema_modes(monkeypatch, state, mode):
+    monkeypatch.setattr(regis, "_schema_mode", mode)
+    _night(state)
+    params = regis.build_laura_shift_tool(state).schema["parameters"]
+    target = params["properties"]["target"]
+    if mode == "off":
+        assert "enum" not in target and "oneOf" not in params
+        return
+    assert target["enum"] == ["P3", "P1", "P2", "P4", "P5", "P6"]
+    assert params["properties"]["form"]["enum"] == ["heal", "poison"]
+    if mode == "enum":
+        assert "oneOf" not in params
+        return
+    heal, poison = params["oneOf"]
+    assert heal["properties"] == {"form": {"enum": ["heal"]}, "target": {"enum": ["P3"]}}
+    assert poison["properties"]["target"]["enum"] == rules.legal_targets(state, "poison")
+
+
+def test_unknown_schema_mode():
+    with pytest.raises(ValueError):
+        regis.set_schema_mode("strict")
+    assert regis.schema_mode() in regis.SCHEMA_MODES
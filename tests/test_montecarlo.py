@@ -0,0 +1,13 @@
+"""NumPy 批量引擎与标量 rules 的逐局交叉校验。"""
+import montecarlo
+
+
+def test_cross_check_matches_rules():
+    report = montecarlo.cross_check(games=500, seed=7)
+    assert report["checks"]["night"] > 0 and report["checks"]["day"] > 0
+    assert report["mismatches"] == 0, report["examples"]
+
+
+def test_cross_check_matches_rules_without_curse():
+    report = montecarlo.cross_check(games=200, seed=11, curse=False)
+    assert report["mismatches"] == 0, report["examples"]
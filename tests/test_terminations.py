@@ -0,0 +1,80 @@
+"""夜晚小组的提前终止条件。"""
+import asyncio
+
+import pytest
+from autogen_agentchat.base import TerminatedException
+from autogen_agentchat.messages import TextMessage, ToolCallExecutionEvent
+from autogen_core.models import FunctionExecutionResult
+
+import rules
+from terminations import PhaseCommitTermination, phase_max_turns
+
+
+def _text(source, content):
+    return TextMessage(source=source, content=content)
+
+
+def _tool_result(source, content="目标无效"):
+    result = FunctionExecutionResult(content=content, call_id="call-1", name="extract_memory_tool", is_error=False)
+    return ToolCallExecutionEvent(source=source, content=[result])
+
+
+def _run(termination, *batches):
+    """依次把每批消息交给终止条件，返回最后一次的结果。"""
+    stop = None
+    for batch in batches:
+        stop = asyncio.run(termination(list(batch)))
+    return stop
+
+
+def test_commit_stops_phase(state):
+    termination = PhaseCommitTermination(state, ["kill"], ["P1"])
+    assert _run(termination, [_text("P1", "我想想")]) is None
+    rules.set_night_kill(state, "P2")
+    stop = _run(termination, [_tool_result("P1", "P2")])
+    assert stop.content == "committed"
+    assert termination.terminated
+
+
+def test_pass_stops_phase(state):
+    termination = PhaseCommitTermination(state, ["kill"], ["P1"])
+    assert _run(termination, [_text("P1", "今晚 pass")]).content == "passed"
+
+
+def test_retry_budget_exhausted(state):
+    termination = PhaseCommitTermination(state, ["kill"], ["P1"], retry_budget=1)
+    assert _run(termination, [_text("P1", "选谁呢")]) is None
+    assert termination.misses == 1
+    assert _run(termination, [_tool_result("P1")]).content == "retry_budget_exhausted"
+    assert termination.misses == 2
+
+
+def test_text_not_counted_when_disabled(state):
+    termination = PhaseCommitTermination(state, ["kill"], ["P1", "P5"], retry_budget=0, count_text=False)
+    assert _run(termination, [_text("P1", "刀 P2？"), _text("P5", "同意")]) is None
+    assert termination.misses == 0
+    assert _run(termination, [_tool_result("P5")]).content == "retry_budget_exhausted"
+
+
+def test_non_actor_messages_ignored(state):
+    termination = PhaseCommitTermination(state, ["kill"], ["P1"], retry_budget=0)
+    assert _run(termination, [_text("god", "请选择目标。PASS 表示放弃。"), _tool_result("P5")]) is None
+    assert termination.misses == 0
+
+
+def test_call_after_stop_raises_and_reset_rearms(state):
+    termination = PhaseCommitTermination(state, ["kill"], ["P1"])
+    rules.set_night_kill(state, "P2")
+    assert _run(termination, []).content == "committed"
+    with pytest.raises(TerminatedException):
+        _run(termination, [])
+
+    asyncio.run(termination.reset())
+    assert not termination.terminated and termination.misses == 0
+    # reset 以当前状态为基线，已写入的击杀不再触发
+    assert _run(termination, []) is None
+
+
+def test_phase_max_turns_covers_budget():
+    assert phase_max_turns(1) == 4
+    assert phase_max_turns(2, retry_budget=0) == 3
@@ -0,0 +1,169 @@
+"""无人值守的批量对局。
+
+每个座位由 AI 或脚本策略接管，N 局分散到进程池里，每个进程内再并发若干局。
+逐局结果以 JSON Lines 写出：胜方、回合数、死因（how_died）和每天的票型（resolve_day）。
+
+    python tournament.py --games 40 --workers 4 --per-worker 5 --scripted-seats P1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 确保导入本地模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from roles import TABLE_LAYOUTS
+
+
+def _silent(_: str = "") -> None:
+    pass
+
+
+async def play_one(game_id: int, seed: int, options: dict):
+    import main
+    from policies import ScriptedPolicy
+
+    table = main.build_table(
+        player_count=options["player_count"],
+        my_no=None,
+        scripted_seats=options["scripted_seats"],
+        policy=ScriptedPolicy(seed),
+        rng=random.Random(seed),
+        announce=_silent,
+        llm_god=options["llm_god"],
+        debate_mode=options["debate_mode"],
+        turn_timeout=options["turn_timeout"],
+        phase_timeout=options["phase_timeout"],
+        debate_group_size=options["debate_group_size"],
+        transcript_window=options["transcript_window"],
+        day_token_budget=options["day_token_budget"],
+    )
+    started = time.perf_counter()
+    try:
+        result = await main.play_game(table)
+    except Exception as e:
+        result = {
+            "winner": None,
+            "rounds": main.rounds_played(table),
+            "roles": {no: char["role_name"] for no, char in table["players"].items()},
+            "how_died": dict(table["state"].how_died),
+            "days": table["history"],
+            "error": f"{type(e).__name__}: {e}",
+        }
+    result["game_id"] = game_id
+    result["seed"] = seed
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+async def _run_batch(games, options: dict):
+    from config import model_client
+
+    try:
+        return await asyncio.gather(*(play_one(game_id, seed, options) for game_id, seed in games))
+    finally:
+        await model_client.close()
+
+
+def run_batch(games, options: dict):
+    """进程池入口：在一个事件循环里并发跑完这一批对局。"""
+    return asyncio.run(_run_batch(games, options))
+
+
+def parse_scripted_seats(raw: str, player_count: int):
+    if raw.strip().lower() == "all":
+        return [f"P{i}" for i in range(1, player_count + 1)]
+    return [seat.strip().upper() for seat in raw.split(",") if seat.strip()]
+
+
+def summarize(results, elapsed: float):
+    finished = [r for r in results if r.get("winner")]
+    wins = {"light": 0, "dark": 0}
+    for r in finished:
+        wins[r["winner"]] += 1
+    return {
+        "games": len(results),
+        "finished": len(finished),
+        "errors": len(results) - len(finished),
+        "wins": wins,
+        "timeouts": sum(sum(r.get("timeouts", {}).values()) for r in finished),
+        "rejections": sum(sum(r.get("rejections", {}).values()) for r in finished),
+        "budget_stops": sum(r.get("budget_stops", 0) for r in finished),
+        "avg_tokens": round(
+            sum(r["usage"]["prompt_tokens"] + r["usage"]["completion_tokens"] for r in finished) / len(finished)
+        ) if finished else 0,
+        "avg_rounds": round(sum(r["rounds"] for r in finished) / len(finished), 2) if finished else 0,
+        "elapsed_seconds": round(elapsed, 2),
+        "games_per_hour": round(len(results) / elapsed * 3600, 1) if elapsed > 0 else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="锈湖狼人杀无人值守批量对局")
+    parser.add_argument("--games", type=int, default=10, help="总对局数")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程数")
+    parser.add_argument("--per-worker", type=int, default=4, help="每个进程内并发的对局数")
+    parser.add_argument("--players", type=int, choices=sorted(TABLE_LAYOUTS), default=6, help="每桌人数")
+    parser.add_argument(
+        "--scripted-seats",
+        default="P1",
+        help="由脚本策略接管的座位，逗号分隔；all 表示整桌脚本，空字符串表示整桌 AI",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="第 i 局使用 seed + i")
+    parser.add_argument("--llm-god", action="store_true", help="由模型扮演上帝做叙事主持")
+    parser.add_argument(
+        "--debate-mode",
+        choices=("ordered", "selector"),
+        default="ordered",
+        help="白天发言调度：ordered 按座位轮转，selector 由模型挑选下一位发言者",
+    )
+    parser.add_argument("--turn-timeout", type=float, help="AI 每次发言或投票的时限秒数，超时按兜底行动处理")
+    parser.add_argument("--phase-timeout", type=float, help="每个阶段的时限秒数，超时提交兜底行动")
+    parser.add_argument("--debate-group-size", type=int, help="辩论每组人数，0 表示不分组；默认按桌型")
+    parser.add_argument("--transcript-window", type=int, help="后续发言组和投票能看到的最近发言条数，0 表示全部；默认按桌型")
+    parser.add_argument("--day-token-budget", type=int, help="每天辩论的 token 预算，用尽直接投票，0 表示不限；默认按桌型")
+    parser.add_argument("--out", default="tournament_results.jsonl", help="逐局结果输出路径")
+    args = parser.parse_args(argv)
+
+    options = {
+        "player_count": args.players,
+        "scripted_seats": parse_scripted_seats(args.scripted_seats, args.players),
+        "llm_god": args.llm_god,
+        "debate_mode": args.debate_mode,
+        "turn_timeout": args.turn_timeout,
+        "phase_timeout": args.phase_timeout,
+        "debate_group_size": args.debate_group_size,
+        "transcript_window": args.transcript_window,
+        "day_token_budget": args.day_token_budget,
+    }
+    games = [(i, args.seed + i) for i in range(args.games)]
+    per_worker = max(1, args.per_worker)
+    batches = [games[i:i + per_worker] for i in range(0, len(games), per_worker)]
+
+    results = []
+    started = time.perf_counter()
+    with open(args.out, "w", encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=max(1, args.workers),
+        # 每批对局用一个新进程：模型客户端和它的信号量都绑定在创建时的事件循环上
+        max_tasks_per_child=1,
+    ) as pool:
+        futures = [pool.submit(run_batch, batch, options) for batch in batches]
+        for future in as_completed(futures):
+            for result in future.result():
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                results.append(result)
+            print(f"✅ 已完成 {len(results)}/{len(games)} 局")
+
+    summary = summarize(results, time.perf_counter() - started)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main()